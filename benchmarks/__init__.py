@@ -0,0 +1,2 @@
+"""Bancs d'essai des chemins critiques : ingestion, dernières positions,
+historique et diffusion WebSocket (voir benchmarks/run.py)."""
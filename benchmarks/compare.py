@@ -0,0 +1,63 @@
+# benchmarks/compare.py
+"""Compare deux rapports de benchmarks/run.py.
+
+    python -m benchmarks.compare base.json head.json --threshold 0.1
+
+Les mesures sont appariées par nom et paramètres. Une régression est une
+latence médiane (p50) ou un débit dégradé de plus de --threshold ; le code de
+sortie vaut alors 1.
+"""
+import argparse
+import json
+import sys
+
+# Mesure suivie pour chaque résultat, et sens de l'amélioration
+METRICS = (("positions_per_s", True), ("p50_ms", False))
+
+
+def result_key(result):
+    return result["name"], json.dumps(result["params"], sort_keys=True)
+
+
+def compare(base, head, threshold):
+    """Lignes (nom, paramètres, mesure, avant, après, variation, régression)"""
+    base_results = {result_key(result): result for result in base["results"]}
+    rows = []
+    for result in head["results"]:
+        before = base_results.get(result_key(result))
+        if before is None:
+            continue
+        for metric, higher_is_better in METRICS:
+            if metric not in result or not before.get(metric):
+                continue
+            change = (result[metric] - before[metric]) / before[metric]
+            regression = -change > threshold if higher_is_better else change > threshold
+            rows.append((result["name"], result["params"], metric, before[metric], result[metric],
+                         change, regression))
+            break
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare deux rapports de bancs d'essai")
+    parser.add_argument("base", help="Rapport de référence")
+    parser.add_argument("head", help="Rapport à comparer")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="Dégradation tolérée, en fraction (défaut: 0.1)")
+    args = parser.parse_args(argv)
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.head) as f:
+        head = json.load(f)
+
+    rows = compare(base, head, args.threshold)
+    for name, params, metric, before, after, change, regression in rows:
+        flag = "RÉGRESSION" if regression else ""
+        print(f"{name:8} {json.dumps(params, sort_keys=True):70} {metric:15} "
+              f"{before:>12} {after:>12} {change:+8.1%} {flag}")
+    if any(row[-1] for row in rows):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
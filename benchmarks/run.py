@@ -0,0 +1,337 @@
+# benchmarks/run.py
+"""Bancs d'essai reproductibles des chemins critiques.
+
+Mesures :
+
+- ingest : débit de POST /api/positions/ (vues synchrone et asynchrone,
+  position unique et lots) ;
+- latest : latence de `get_latest_positions` (cache) et de la lecture de
+  `latest_positions` en fonction de la taille de l'historique ;
+- history : latence d'une page de `get_livreur_positions` (première page,
+  page suivante par clé, plage horaire) en fonction de la taille de l'historique ;
+- fanout : latence de diffusion d'une position à N clients `TrackingConsumer`
+  via le channel layer en mémoire.
+
+Mongo est remplacé par mongomock (--backend memory, par défaut) ou par un
+mongod local (--backend mongod, --mongo-uri) pour les historiques de plusieurs
+millions de points. Les résultats sont écrits en JSON (--output) et
+comparables entre deux commits avec benchmarks/compare.py.
+
+    python -m benchmarks.run --history-sizes 10000,100000 --output bench.json
+    python -m benchmarks.run --backend mongod --history-sizes 10000,1000000,10000000
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "benchmarks.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from channels.routing import URLRouter  # noqa: E402
+from channels.testing import WebsocketCommunicator  # noqa: E402
+from django.test import AsyncRequestFactory, RequestFactory  # noqa: E402
+from tracking import async_views, mongodb, routing, views  # noqa: E402
+from tracking.broadcast import publish_position  # noqa: E402
+from tracking.models import LatestPosition, Position, assign_sequence, get_driver_cache  # noqa: E402
+from simulation.fleet import Fleet  # noqa: E402
+from simulation.stats import LatencyRecorder  # noqa: E402
+
+SEED_CHUNK_SIZE = 10000
+
+logger = logging.getLogger(__name__)
+
+
+def timed(function, repeat, warmup=3):
+    """Exécute `function` et retourne le résumé de ses latences"""
+    for _ in range(warmup):
+        function()
+    recorder = LatencyRecorder()
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        recorder.add(time.perf_counter() - started)
+    return recorder.summary()
+
+
+def connect(backend, mongo_uri):
+    if backend == "memory":
+        try:
+            import mongomock
+        except ImportError:
+            sys.exit("mongomock est requis pour --backend memory (pip install -r benchmarks/requirements.txt)")
+        client = mongomock.MongoClient()
+    else:
+        import pymongo
+        client = pymongo.MongoClient(mongo_uri, **mongodb.client_options())
+    mongodb.set_client(client)
+    reset_database()
+    for name, error in create_indexes():
+        logger.warning(f"Index {name} non créé: {error}")
+
+
+def create_indexes():
+    """Crée les index du projet ; mongomock ne gère pas tous les types d'index"""
+    failures = []
+    for collection, keys, options in mongodb.INDEXES:
+        try:
+            collection.create_index(keys, **options)
+        except Exception as e:
+            failures.append((f"{collection.name}.{keys}", e))
+    return failures
+
+
+def reset_database():
+    client = mongodb.get_client()
+    client.drop_database(mongodb.get_db().name)
+    LatestPosition.cache.invalidate()
+    get_driver_cache().invalidate()
+
+
+class History:
+    """Historique de test, agrandi par paliers successifs"""
+
+    def __init__(self, drivers, interval=5, seed=0):
+        self.fleet = Fleet(drivers, seed=seed)
+        self.interval = interval
+        self.size = 0
+        self.end = datetime.datetime.now().replace(microsecond=0)
+
+    def grow(self, size):
+        """Ajoute des positions jusqu'à `size`, en remontant le temps tick par
+        tick (un point par livreur et par intervalle)"""
+        drivers = len(self.fleet)
+        while self.size < size:
+            count = min(SEED_CHUNK_SIZE, size - self.size)
+            chunk = []
+            for offset in range(self.size, self.size + count):
+                index = offset % drivers
+                if index == 0:
+                    self.fleet.step()
+                timestamp = self.end - datetime.timedelta(seconds=self.interval * (offset // drivers))
+                chunk.append(Position.build(
+                    self.fleet.ids[index], self.fleet.lat[index], self.fleet.lng[index], timestamp
+                ))
+            assign_sequence(chunk)
+            Position.write_many(chunk)
+            self.size += count
+
+
+def bench_ingest(requests, batch_sizes, drivers):
+    results = []
+    fleet = Fleet(drivers, prefix="ING", seed=1)
+    factory = RequestFactory()
+    async_factory = AsyncRequestFactory()
+
+    def body(batch_size):
+        indices = [random.randrange(drivers) for _ in range(batch_size)]
+        fleet.step(indices)
+        points = [
+            {"livreur_id": fleet.ids[i], "latitude": float(fleet.lat[i]), "longitude": float(fleet.lng[i])}
+            for i in indices
+        ]
+        if batch_size == 1:
+            return json.dumps({"livreur": points[0]["livreur_id"], "latitude": points[0]["latitude"],
+                               "longitude": points[0]["longitude"]})
+        return json.dumps(points)
+
+    for batch_size in batch_sizes:
+        bodies = [body(batch_size) for _ in range(requests)]
+
+        started = time.perf_counter()
+        for payload in bodies:
+            response = views.positions_view(
+                factory.post("/api/positions/", payload, content_type="application/json"))
+            assert response.status_code == 200, response.content
+        elapsed = time.perf_counter() - started
+        results.append(throughput_result("ingest", "sync", batch_size, requests, elapsed))
+
+        async def post_all():
+            for payload in bodies:
+                response = await async_views.positions_view(
+                    async_factory.post("/api/positions/", payload, content_type="application/json"))
+                assert response.status_code == 200, response.content
+
+        started = time.perf_counter()
+        asyncio.run(post_all())
+        elapsed = time.perf_counter() - started
+        results.append(throughput_result("ingest", "async", batch_size, requests, elapsed))
+    return results
+
+
+def throughput_result(name, view, batch_size, requests, elapsed):
+    return {
+        "name": name,
+        "params": {"view": view, "batch_size": batch_size, "requests": requests},
+        "requests_per_s": round(requests / elapsed, 1),
+        "positions_per_s": round(requests * batch_size / elapsed, 1),
+        "avg_ms": round(elapsed / requests * 1000, 3),
+    }
+
+
+def bench_reads(history, sizes, repeat, page_size):
+    results = []
+    for size in sizes:
+        started = time.perf_counter()
+        history.grow(size)
+        logger.info(f"Historique de {size} positions prêt ({time.perf_counter() - started:.1f} s)")
+        params = {"history_size": size, "drivers": len(history.fleet)}
+
+        results.append({"name": "latest", "params": {**params, "source": "cache"},
+                         **timed(Position.get_latest_positions, repeat)})
+        results.append({"name": "latest", "params": {**params, "source": "mongo"},
+                         **timed(LatestPosition.load_all, repeat)})
+
+        livreur_ids = history.fleet.ids
+        first_page = {"livreur_id": None}
+
+        def page():
+            livreur_id = random.choice(livreur_ids)
+            positions = Position.get_livreur_positions(livreur_id, limit=page_size)
+            first_page["livreur_id"], first_page["positions"] = livreur_id, positions
+
+        def next_page():
+            last = first_page["positions"][-1]
+            Position.get_livreur_positions(first_page["livreur_id"], limit=page_size,
+                                           after=(last["timestamp"], last["position_id"]))
+
+        def time_range():
+            end = history.end - datetime.timedelta(seconds=history.interval * random.randrange(10))
+            Position.get_livreur_positions(random.choice(livreur_ids), limit=page_size,
+                                           start=end - datetime.timedelta(hours=1), end=end)
+
+        results.append({"name": "history", "params": {**params, "page": "first", "page_size": page_size},
+                        **timed(page, repeat)})
+        if first_page["positions"]:
+            results.append({"name": "history", "params": {**params, "page": "next", "page_size": page_size},
+                            **timed(next_page, repeat)})
+        results.append({"name": "history", "params": {**params, "page": "range", "page_size": page_size},
+                        **timed(time_range, repeat)})
+    return results
+
+
+async def bench_fanout(subscriber_counts, repeat):
+    """Latence entre la publication d'une position et sa réception par le
+    premier et le dernier des N clients connectés"""
+    application = URLRouter(routing.websocket_urlpatterns)
+    results = []
+    for count in subscriber_counts:
+        clients = [WebsocketCommunicator(application, "/ws/tracking/?rate=0&snapshot=false")
+                   for _ in range(count)]
+        for client in clients:
+            connected, _ = await client.connect()
+            assert connected
+
+        first = LatencyRecorder()
+        last = LatencyRecorder()
+        for round_index in range(repeat):
+            position = Position.build("FAN000", 48.85 + round_index * 1e-5, 2.35)
+            assign_sequence([position])
+            received = []
+
+            async def receive(client):
+                await client.receive_from(timeout=10)
+                received.append(time.perf_counter())
+
+            started = time.perf_counter()
+            await publish_position(position)
+            await asyncio.gather(*(receive(client) for client in clients))
+            first.add(min(received) - started)
+            last.add(max(received) - started)
+
+        for client in clients:
+            await client.disconnect()
+        results.append({"name": "fanout", "params": {"subscribers": count, "delivery": "first"}, **first.summary()})
+        results.append({"name": "fanout", "params": {"subscribers": count, "delivery": "last"}, **last.summary()})
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def int_list(value):
+    return [int(item) for item in value.split(",") if item]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Bancs d'essai de l'API de suivi GPS")
+    parser.add_argument("--backend", choices=["memory", "mongod"], default="memory",
+                        help="mongomock (memory) ou serveur Mongo local (mongod)")
+    parser.add_argument("--mongo-uri", default="mongodb://localhost:27017/", help="URI du mongod local")
+    parser.add_argument("--only", type=lambda value: value.split(","),
+                        default=["ingest", "latest", "fanout"],
+                        help="Bancs à exécuter : ingest, latest (dernières positions et historique), fanout")
+    parser.add_argument("--history-sizes", type=int_list, default=[10000, 100000],
+                        help="Tailles d'historique, séparées par des virgules (ex. 10000,1000000,10000000)")
+    parser.add_argument("--drivers", type=int, default=1000, help="Nombre de livreurs de l'historique")
+    parser.add_argument("--ingest-requests", type=int, default=500, help="Requêtes par mesure d'ingestion")
+    parser.add_argument("--batch-sizes", type=int_list, default=[1, 100], help="Tailles de lot d'ingestion")
+    parser.add_argument("--subscribers", type=int_list, default=[1, 10, 100, 500],
+                        help="Nombres de clients WebSocket")
+    parser.add_argument("--repeat", type=int, default=50, help="Répétitions par mesure de latence")
+    parser.add_argument("--page-size", type=int, default=100, help="Taille d'une page d'historique")
+    parser.add_argument("--seed", type=int, default=0, help="Graine du générateur aléatoire")
+    parser.add_argument("--output", help="Fichier où écrire les résultats JSON")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s',
+                        datefmt='%H:%M:%S')
+    args = parse_args(argv)
+    random.seed(args.seed)
+    connect(args.backend, args.mongo_uri)
+
+    results = []
+    try:
+        if "ingest" in args.only:
+            logger.info("Banc ingest...")
+            results += bench_ingest(args.ingest_requests, args.batch_sizes, args.drivers)
+            reset_database()
+        if "latest" in args.only:
+            logger.info("Bancs latest et history...")
+            history = History(args.drivers, seed=args.seed)
+            results += bench_reads(history, sorted(args.history_sizes), args.repeat, args.page_size)
+            reset_database()
+        if "fanout" in args.only:
+            logger.info("Banc fanout...")
+            results += asyncio.run(bench_fanout(args.subscribers, args.repeat))
+    finally:
+        mongodb.get_client().drop_database(mongodb.get_db().name)
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "date": datetime.datetime.now().isoformat(timespec="seconds"),
+            "backend": args.backend,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "args": {key: value for key, value in vars(args).items() if key != "output"},
+        },
+        "results": results,
+    }
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    return report
+
+
+if __name__ == "__main__":
+    main()
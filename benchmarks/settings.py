@@ -0,0 +1,25 @@
+# benchmarks/settings.py
+"""Réglages des bancs d'essai : ceux du projet, avec un channel layer en
+mémoire et une base Mongo dédiée (supprimée au début et à la fin de chaque
+exécution)."""
+import os
+from livraison_gps.settings import *  # noqa: F401,F403
+
+# Seules les applications nécessaires aux chemins mesurés sont chargées
+INSTALLED_APPS = [
+    "django.contrib.contenttypes",
+    "django.contrib.auth",
+    "channels",
+    "tracking",
+]
+
+CHANNEL_LAYERS = {
+    "default": {
+        "BACKEND": "channels.layers.InMemoryChannelLayer",
+        "CONFIG": {"capacity": 10000},
+    },
+}
+
+TRACKING_MONGO_DB = os.environ.get("BENCHMARK_MONGODB_DB", "livreurs_gps_bench")
+TRACKING_WRITE_BEHIND = False
+TRACKING_DRIVER_CACHE_INVALIDATION = False
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -46,6 +47,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'tracking.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -101,6 +103,75 @@ CHANNEL_LAYERS = {
     },
 }
 
+# Configuration du suivi GPS
+# Connexion MongoDB, établie à la première requête (tracking/mongodb.py)
+TRACKING_MONGO_URI = os.environ.get("MONGODB_URI", "mongodb://localhost:27017/")
+TRACKING_MONGO_DB = os.environ.get("MONGODB_DB", "livreurs_gps_db")
+TRACKING_MONGO_MAX_POOL_SIZE = 100
+TRACKING_MONGO_MIN_POOL_SIZE = 0
+TRACKING_MONGO_CONNECT_TIMEOUT_MS = 5000
+TRACKING_MONGO_SERVER_SELECTION_TIMEOUT_MS = 5000
+TRACKING_MONGO_SOCKET_TIMEOUT_MS = None           # None : pas de limite
+TRACKING_MONGO_WAIT_QUEUE_TIMEOUT_MS = None       # attente d'une connexion libre du pool
+TRACKING_MONGO_READ_PREFERENCE = "primary"        # ex. "secondaryPreferred" pour les lectures
+TRACKING_MONGO_WRITE_CONCERN = 1                  # ex. "majority"
+TRACKING_MONGO_HEALTH_TIMEOUT_MS = 1000           # délai du ping de /api/health/ready/
+# Nombre maximal de positions acceptées dans un envoi par lot (POST /api/positions/)
+TRACKING_MAX_BATCH_SIZE = 1000
+# Écart toléré (secondes) entre l'horodatage fourni par un client et l'heure du
+# serveur : vers le futur, puis vers le passé (None : pas de limite)
+TRACKING_MAX_FUTURE_SKEW = 60
+TRACKING_MAX_TIMESTAMP_AGE = 24 * 3600
+# Intervalle (secondes) entre deux lectures incrémentales de latest_positions par le
+# cache des dernières positions
+TRACKING_LATEST_CACHE_TTL = 2
+# Écriture différée : les positions sont mises en tampon et écrites par lots en tâche de fond
+TRACKING_WRITE_BEHIND = False
+TRACKING_WRITE_BEHIND_MAX_SIZE = 10000       # positions en attente au maximum
+TRACKING_WRITE_BEHIND_BATCH_SIZE = 500       # taille d'un insert_many
+TRACKING_WRITE_BEHIND_FLUSH_INTERVAL = 0.5   # secondes entre deux écritures au plus
+TRACKING_WRITE_BEHIND_MAX_ATTEMPTS = 8       # échecs d'un lot avant de l'écarter
+# Vues asynchrones (ASGI) pour l'API ; False pour revenir aux vues synchrones
+TRACKING_ASYNC_VIEWS = True
+# Taille du pool de threads qui exécute les requêtes Mongo des vues asynchrones
+TRACKING_DB_EXECUTOR_WORKERS = 32
+# Fréquence (Hz) d'envoi des trames WebSocket fusionnées, modifiable par chaque client
+TRACKING_WS_DEFAULT_RATE = 2
+TRACKING_WS_MAX_RATE = 10
+# Nombre maximal de cellules de grille par abonnement à une zone (au-delà : flux complet)
+TRACKING_WS_MAX_VIEWPORT_CELLS = 64
+# Délai (s) au-delà duquel une écriture de latest_positions encore déclarée en
+# cours (worker arrêté pendant l'écriture) ne retient plus le curseur de ?since=
+TRACKING_SYNC_INFLIGHT_TIMEOUT = 30
+# Cache des fiches livreurs (LRU) : taille, durée de validité (s) et
+# invalidation des autres workers via le channel layer
+TRACKING_DRIVER_CACHE_SIZE = 10000
+TRACKING_DRIVER_CACHE_TTL = 300
+TRACKING_DRIVER_CACHE_INVALIDATION = True
+# Recherche de proximité : index spatial en mémoire (False : index 2dsphere de Mongo)
+TRACKING_SPATIAL_INDEX = True
+TRACKING_NEARBY_MAX_RADIUS = 50000    # mètres
+TRACKING_NEARBY_MAX_RESULTS = 1000
+# Nombre maximal de points bruts lus pour produire un historique simplifié
+TRACKING_HISTORY_MAX_RAW_POINTS = 20000
+# Taille de page maximale de l'historique paginé (paramètre `limit`)
+TRACKING_HISTORY_MAX_PAGE_SIZE = 1000
+# Stockage de l'historique : "documents" (un document par position) ou "buckets"
+# (un document par livreur et par tranche de TRACKING_BUCKET_MINUTES minutes)
+TRACKING_POSITION_STORAGE = "documents"
+TRACKING_BUCKET_MINUTES = 10
+TRACKING_BUCKET_MAX_SIZE = 1000   # positions par bucket avant ouverture d'un bucket de débordement
+# Rétention de l'historique (commande compact_positions) : positions brutes,
+# puis une position par minute, puis résumés journaliers conservés sans limite
+TRACKING_RETENTION_RAW_DAYS = 7
+TRACKING_RETENTION_MINUTE_DAYS = 90
+# Nombre d'éléments encodés par morceau dans les réponses JSON/NDJSON diffusées
+TRACKING_STREAM_CHUNK_SIZE = 500
+# Statistiques de trajet par livreur et par jour, tenues à jour à l'ingestion
+TRACKING_TRIP_STATS = True
+# Métriques Prometheus sur /metrics (requêtes, commandes Mongo, channel layer, WebSocket)
+TRACKING_METRICS = False
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
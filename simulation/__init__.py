@@ -0,0 +1,7 @@
+# simulation/__init__.py
+"""Outils de simulation et de charge pour l'API de suivi GPS.
+
+- `fleet` : modèle de déplacement d'une flotte de livreurs ;
+- `loadgen` : générateur de charge asyncio (HTTP + WebSocket) ;
+- `stats` : mesures de latence (percentiles).
+"""
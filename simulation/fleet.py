@@ -0,0 +1,86 @@
+# simulation/fleet.py
+import numpy as np
+
+# Points de départ dans différentes zones de Paris
+ZONES = {
+    "Nord Paris": {"lat": 48.882, "lng": 2.350, "radius": 0.01},
+    "Sud Paris": {"lat": 48.830, "lng": 2.355, "radius": 0.01},
+    "Est Paris": {"lat": 48.855, "lng": 2.390, "radius": 0.01},
+    "Ouest Paris": {"lat": 48.856, "lng": 2.310, "radius": 0.01},
+    "Centre Paris": {"lat": 48.856, "lng": 2.352, "radius": 0.008}
+}
+
+# Rayon moyen de la Terre en mètres
+EARTH_RADIUS = 6371000
+
+# Pas de déplacement (en degrés), identiques à `simulate_movement`
+WANDER_STEP = 0.0005
+RETURN_STEP = 0.0008
+RETURN_JITTER = 0.0002
+
+
+def haversine(lat1, lng1, lat2, lng2):
+    """Distance en mètres entre deux points ou deux tableaux de points (degrés)"""
+    lat1, lng1, lat2, lng2 = map(np.radians, (lat1, lng1, lat2, lng2))
+    a = (np.sin((lat2 - lat1) / 2) ** 2
+         + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2)
+    return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(a))
+
+
+class Fleet:
+    """Flotte simulée dont l'état tient dans des tableaux NumPy : positions,
+    caps et centres de zone. Chaque livreur erre autour du centre de sa zone
+    et y revient lorsqu'il s'en éloigne de plus de deux rayons (même règle que
+    `simulate_movement` dans tracking/serializers.py) ; un pas fait avancer
+    toute la flotte, ou une partie, en une seule opération vectorisée."""
+
+    def __init__(self, size, zones=ZONES, prefix="SIM", seed=None):
+        self.random = np.random.default_rng(seed)
+        self.zone_names = list(zones)
+        zone_list = [zones[name] for name in self.zone_names]
+        self.ids = [f"{prefix}{index:06d}" for index in range(size)]
+        self.zone_index = np.arange(size) % len(zone_list)
+        self.center_lat = np.array([zone["lat"] for zone in zone_list])[self.zone_index]
+        self.center_lng = np.array([zone["lng"] for zone in zone_list])[self.zone_index]
+        self.radius = np.array([zone["radius"] for zone in zone_list])[self.zone_index]
+        self.lat = self.center_lat + self.random.uniform(-1, 1, size) * self.radius
+        self.lng = self.center_lng + self.random.uniform(-1, 1, size) * self.radius
+        # Cap du dernier déplacement, en degrés (0 = nord, 90 = est)
+        self.heading = np.zeros(size)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def zone(self, index):
+        return self.zone_names[self.zone_index[index]]
+
+    def step(self, indices=None):
+        """Fait avancer d'un pas les livreurs désignés (tous par défaut :
+        tableau d'indices, slice ou masque) ; retourne la distance parcourue
+        par chacun, en mètres"""
+        if indices is None:
+            indices = slice(None)
+        lat = self.lat[indices]
+        lng = self.lng[indices]
+        delta_lat = self.center_lat[indices] - lat
+        delta_lng = self.center_lng[indices] - lng
+        distance = np.hypot(delta_lat, delta_lng)
+        returning = distance > self.radius[indices] * 2
+
+        # Errance aléatoire, remplacée par un retour vers le centre (avec un
+        # peu d'aléatoire) pour ceux qui sont sortis de leur zone
+        jitter = np.where(returning, RETURN_JITTER, WANDER_STEP)
+        step_lat = self.random.uniform(-1, 1, lat.shape) * jitter
+        step_lng = self.random.uniform(-1, 1, lng.shape) * jitter
+        if returning.any():
+            scale = RETURN_STEP / distance[returning]
+            step_lat[returning] += delta_lat[returning] * scale
+            step_lng[returning] += delta_lng[returning] * scale
+
+        new_lat = lat + step_lat
+        new_lng = lng + step_lng
+        travelled = haversine(lat, lng, new_lat, new_lng)
+        self.lat[indices] = new_lat
+        self.lng[indices] = new_lng
+        self.heading[indices] = np.degrees(np.arctan2(step_lng, step_lat)) % 360
+        return travelled
@@ -0,0 +1,260 @@
+# simulation/loadgen.py
+"""Générateur de charge asyncio pour l'API de suivi.
+
+Les requêtes partent à la cadence visée (--rate positions/s) sans attendre
+les réponses précédentes (boucle ouverte) : un serveur saturé ne ralentit pas
+la charge, et la latence HTTP, mesurée depuis l'heure d'envoi prévue, fait
+apparaître les files d'attente dans les percentiles. Les connexions HTTP sont
+réutilisées (pool de --connections). Des spectateurs WebSocket (--viewers)
+mesurent la latence entre l'envoi et la diffusion, à partir de l'horodatage
+(UTC) porté par chaque position. Le serveur le renvoie en heure locale
+naïve : --server-timezone indique laquelle (TIME_ZONE du serveur, UTC par
+défaut).
+
+    python -m simulation.loadgen --drivers 10000 --rate 2000 --batch-size 50 --viewers 20 --duration 60
+"""
+import argparse
+import asyncio
+import json
+import logging
+import random
+import time
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo
+import aiohttp
+import numpy as np
+from .fleet import Fleet
+from .stats import LatencyRecorder
+
+DEFAULT_BASE_URL = "http://localhost:8000/api"
+
+logger = logging.getLogger(__name__)
+
+
+def websocket_url(base_url):
+    """URL du flux WebSocket déduite de l'URL de l'API"""
+    root = base_url.rstrip("/")
+    if root.endswith("/api"):
+        root = root[:-len("/api")]
+    return root.replace("http", "ws", 1) + "/ws/tracking/?rate=0&snapshot=false"
+
+
+class LoadGenerator:
+    def __init__(self, base_url=DEFAULT_BASE_URL, drivers=1000, rate=100, duration=30,
+                 batch_size=1, viewers=0, connections=100, max_in_flight=1000,
+                 create_drivers=False, seed=None, server_timezone="UTC"):
+        self.base_url = base_url.rstrip("/")
+        self.rate = rate
+        self.duration = duration
+        self.batch_size = max(1, batch_size)
+        self.viewers = viewers
+        self.connections = connections
+        self.max_in_flight = max_in_flight
+        self.create_drivers = create_drivers
+        self.server_timezone = ZoneInfo(server_timezone)
+        self.fleet = Fleet(drivers, seed=seed)
+        self.next_driver = 0
+
+        self.http_latency = LatencyRecorder()
+        self.broadcast_latency = LatencyRecorder()
+        self.requests = 0
+        self.failed = 0
+        self.positions = 0
+        self.skipped = 0
+        self.broadcast_messages = 0
+        self._in_flight = set()
+
+    def next_points(self):
+        """Points du prochain envoi : les livreurs sont servis à tour de rôle"""
+        indices = (self.next_driver + np.arange(self.batch_size)) % len(self.fleet)
+        self.next_driver = int(indices[-1] + 1) % len(self.fleet)
+        self.fleet.step(indices)
+        # Heure d'envoi avec son fuseau : la latence de diffusion en est déduite
+        timestamp = datetime.now(timezone.utc).isoformat(timespec="milliseconds")
+        return [
+            {"livreur_id": self.fleet.ids[index], "latitude": latitude,
+             "longitude": longitude, "timestamp": timestamp}
+            for index, latitude, longitude in zip(
+                indices.tolist(), self.fleet.lat[indices].tolist(), self.fleet.lng[indices].tolist()
+            )
+        ]
+
+    async def register_drivers(self, session):
+        """Crée les livreurs simulés (les doublons sont sans effet pour la charge)"""
+        semaphore = asyncio.Semaphore(self.connections)
+
+        async def create(livreur_id):
+            async with semaphore:
+                try:
+                    async with session.post(f"{self.base_url}/livreurs/", json={
+                        "livreur_id": livreur_id,
+                        "nom": f"Livreur {livreur_id}",
+                        "telephone": f"06{random.randint(10000000, 99999999)}",
+                        "actif": True,
+                    }) as response:
+                        await response.read()
+                except aiohttp.ClientError as e:
+                    logger.warning(f"Création de {livreur_id} impossible: {e}")
+
+        logger.info(f"Création de {len(self.fleet)} livreurs...")
+        await asyncio.gather(*(create(livreur_id) for livreur_id in self.fleet.ids))
+
+    async def send(self, session, scheduled, points):
+        loop = asyncio.get_running_loop()
+        # Format unitaire historique, ou lot JSON (timestamp fourni par le client)
+        if self.batch_size == 1:
+            payload = {"livreur": points[0]["livreur_id"], "latitude": points[0]["latitude"],
+                       "longitude": points[0]["longitude"], "timestamp": points[0]["timestamp"]}
+        else:
+            payload = points
+        try:
+            async with session.post(f"{self.base_url}/positions/", json=payload) as response:
+                await response.read()
+                ok = response.status in (200, 201)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.debug(f"Échec d'envoi: {e}")
+            ok = False
+        self.http_latency.add(loop.time() - scheduled)
+        self.requests += 1
+        if ok:
+            self.positions += len(points)
+        else:
+            self.failed += 1
+
+    async def schedule(self, session):
+        """Lance les envois aux instants prévus, quel que soit l'état des précédents"""
+        loop = asyncio.get_running_loop()
+        interval = self.batch_size / self.rate
+        total = int(self.duration * self.rate / self.batch_size)
+        start = loop.time()
+        sent = 0
+        while sent < total:
+            due = min(total, int((loop.time() - start) / interval) + 1)
+            while sent < due:
+                scheduled = start + sent * interval
+                sent += 1
+                if len(self._in_flight) >= self.max_in_flight:
+                    # Le client lui-même est saturé : l'envoi est compté comme perdu
+                    self.skipped += 1
+                    continue
+                task = asyncio.create_task(self.send(session, scheduled, self.next_points()))
+                self._in_flight.add(task)
+                task.add_done_callback(self._in_flight.discard)
+            await asyncio.sleep(max(0, start + sent * interval - loop.time()))
+        if self._in_flight:
+            await asyncio.gather(*self._in_flight)
+
+    async def viewer(self, session):
+        """Spectateur WebSocket : mesure le délai entre l'horodatage d'une
+        position (son heure d'envoi) et sa réception"""
+        try:
+            async with session.ws_connect(websocket_url(self.base_url)) as ws:
+                async for message in ws:
+                    if message.type != aiohttp.WSMsgType.TEXT:
+                        continue
+                    received = time.time()
+                    data = json.loads(message.data)
+                    if isinstance(data, dict):
+                        data = data.get("positions", [data])
+                    for position in data:
+                        if "timestamp" not in position:
+                            continue
+                        self.broadcast_messages += 1
+                        self.broadcast_latency.add(received - self.sent_at(position["timestamp"]))
+        except aiohttp.ClientError as e:
+            logger.warning(f"Spectateur WebSocket déconnecté: {e}")
+
+    def sent_at(self, value):
+        """Heure d'envoi (epoch) d'une position diffusée ; un horodatage naïf est
+        en heure locale du serveur"""
+        timestamp = datetime.fromisoformat(value)
+        if timestamp.tzinfo is None:
+            timestamp = timestamp.replace(tzinfo=self.server_timezone)
+        return timestamp.timestamp()
+
+    async def run(self):
+        connector = aiohttp.TCPConnector(limit=self.connections)
+        timeout = aiohttp.ClientTimeout(total=30)
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+            if self.create_drivers:
+                await self.register_drivers(session)
+
+            viewers = [asyncio.create_task(self.viewer(session)) for _ in range(self.viewers)]
+            if viewers:
+                await asyncio.sleep(1)
+
+            logger.info(f"Charge: {self.rate} positions/s pendant {self.duration} s "
+                        f"({len(self.fleet)} livreurs, lots de {self.batch_size})")
+            started = time.perf_counter()
+            await self.schedule(session)
+            elapsed = time.perf_counter() - started
+
+            if viewers:
+                # Laisse arriver les dernières diffusions
+                await asyncio.sleep(1)
+                for task in viewers:
+                    task.cancel()
+                await asyncio.gather(*viewers, return_exceptions=True)
+        return self.report(elapsed)
+
+    def report(self, elapsed):
+        return {
+            "duration_s": round(elapsed, 3),
+            "drivers": len(self.fleet),
+            "target_positions_per_s": self.rate,
+            "batch_size": self.batch_size,
+            "requests": self.requests,
+            "failed_requests": self.failed,
+            "skipped_requests": self.skipped,
+            "positions": self.positions,
+            "requests_per_s": round(self.requests / elapsed, 1) if elapsed else 0.0,
+            "positions_per_s": round(self.positions / elapsed, 1) if elapsed else 0.0,
+            "http_latency": self.http_latency.summary(),
+            "viewers": self.viewers,
+            "broadcast_messages": self.broadcast_messages,
+            "broadcast_latency": self.broadcast_latency.summary(),
+        }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Générateur de charge pour l'API de suivi GPS")
+    parser.add_argument("--url", dest="base_url", default=DEFAULT_BASE_URL,
+                        help=f"URL de base de l'API (défaut: {DEFAULT_BASE_URL})")
+    parser.add_argument("--drivers", type=int, default=1000, help="Nombre de livreurs simulés")
+    parser.add_argument("--rate", type=float, default=100, help="Positions envoyées par seconde")
+    parser.add_argument("--duration", type=float, default=30, help="Durée de la charge en secondes")
+    parser.add_argument("--batch-size", type=int, default=1,
+                        help="Positions par requête (1 : format unitaire, sinon envoi par lot)")
+    parser.add_argument("--viewers", type=int, default=0, help="Nombre de spectateurs WebSocket")
+    parser.add_argument("--connections", type=int, default=100, help="Taille du pool de connexions HTTP")
+    parser.add_argument("--max-in-flight", type=int, default=1000,
+                        help="Requêtes simultanées au-delà desquelles les envois sont abandonnés")
+    parser.add_argument("--create-drivers", action="store_true", help="Crée les livreurs avant la charge")
+    parser.add_argument("--seed", type=int, default=None, help="Graine du générateur aléatoire")
+    parser.add_argument("--server-timezone", default="UTC",
+                        help="Fuseau des horodatages diffusés par le serveur (son TIME_ZONE, défaut: UTC)")
+    parser.add_argument("--output", help="Fichier où écrire le rapport JSON")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s',
+                        datefmt='%H:%M:%S')
+    args = parse_args(argv)
+    generator = LoadGenerator(
+        base_url=args.base_url, drivers=args.drivers, rate=args.rate, duration=args.duration,
+        batch_size=args.batch_size, viewers=args.viewers, connections=args.connections,
+        max_in_flight=args.max_in_flight, create_drivers=args.create_drivers, seed=args.seed,
+        server_timezone=args.server_timezone,
+    )
+    report = asyncio.run(generator.run())
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    return report
+
+
+if __name__ == "__main__":
+    main()
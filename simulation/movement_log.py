@@ -0,0 +1,63 @@
+# simulation/movement_log.py
+"""Journal des déplacements en NDJSON, en ajout seul.
+
+Chaque enregistrement est une ligne JSON compacte écrite dans un tampon :
+le coût d'écriture est constant quelle que soit la taille du fichier. Le
+tampon est vidé au-delà de `buffer_size` octets et le fichier synchronisé sur
+disque (fsync) au plus toutes les `fsync_interval` secondes ; une coupure ne
+perd donc que les dernières secondes. `read_movements` relit le journal ligne
+à ligne sans le charger en mémoire.
+"""
+import json
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class MovementLogWriter:
+    def __init__(self, path, buffer_size=64 * 1024, fsync_interval=5.0):
+        self.path = path
+        self.fsync_interval = fsync_interval
+        self.file = open(path, "a", encoding="utf-8", buffering=buffer_size)
+        self.last_sync = time.monotonic()
+        self.count = 0
+
+    def write(self, record):
+        self.file.write(json.dumps(record, separators=(",", ":"), default=str))
+        self.file.write("\n")
+        self.count += 1
+        if time.monotonic() - self.last_sync >= self.fsync_interval:
+            self.sync()
+
+    def sync(self):
+        """Vide le tampon et force l'écriture sur disque"""
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.last_sync = time.monotonic()
+
+    def close(self):
+        if self.file.closed:
+            return
+        self.sync()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_movements(path):
+    """Relit un journal enregistrement par enregistrement ; une dernière ligne
+    tronquée (arrêt brutal pendant l'écriture) est ignorée"""
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                logger.warning(f"{path}:{number}: ligne illisible ignorée")
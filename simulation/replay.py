@@ -0,0 +1,247 @@
+# simulation/replay.py
+"""Rejeu de traces enregistrées contre l'API d'ingestion.
+
+Sources acceptées (format détecté par enregistrement) :
+
+- journal du simulateur (`mouvements_*.ndjson`, ou l'ancien `mouvements_*.json`) ;
+- export Mongo de `positions` (`mongoexport`, NDJSON ou --jsonArray) ;
+- export Mongo de `position_buckets` (un bucket produit toutes ses positions).
+
+Les écarts entre enregistrements sont conservés, divisés par --speed
+(0 : au plus vite). Les positions dues dans une même fenêtre (--window) sont
+envoyées en un lot. Le rapport donne le débit obtenu et le retard (lag) de
+chaque position sur son heure prévue. Les traces doivent être triées par
+horodatage (`mongoexport --sort '{timestamp: 1}'`) ; sinon, --sort les trie
+en mémoire.
+
+    python -m simulation.replay positions.json --speed 10 --batch-size 200
+"""
+import argparse
+import asyncio
+import json
+import logging
+from datetime import datetime, timedelta, timezone
+import aiohttp
+from .loadgen import DEFAULT_BASE_URL
+from .movement_log import read_movements
+from .stats import LatencyRecorder
+
+EPOCH = datetime(1970, 1, 1)
+
+logger = logging.getLogger(__name__)
+
+
+def parse_trace_timestamp(value):
+    """Horodatage naïf depuis une chaîne ISO ou une date étendue Mongo.
+
+    Mongo conserve tel quel l'horodatage naïf écrit par l'application : il est
+    relu sans conversion de fuseau."""
+    if isinstance(value, dict):
+        value = value.get("$date", value)
+        if isinstance(value, dict):
+            value = int(value["$numberLong"])
+    if isinstance(value, (int, float)):
+        return EPOCH + timedelta(milliseconds=value)
+    timestamp = datetime.fromisoformat(value)
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return timestamp
+
+
+def trace_points(doc):
+    """Positions (timestamp, livreur_id, latitude, longitude) d'un enregistrement"""
+    if "current_position" in doc:
+        # Journal du simulateur
+        yield (parse_trace_timestamp(doc["timestamp"]), doc["livreur_id"],
+               doc["current_position"]["lat"], doc["current_position"]["lng"])
+    elif "debut" in doc and "t" in doc:
+        # Bucket de positions
+        start = parse_trace_timestamp(doc["debut"])
+        for offset, latitude, longitude in zip(doc["t"], doc["lat"], doc["lng"]):
+            yield start + timedelta(milliseconds=offset), doc["livreur_id"], latitude, longitude
+    else:
+        yield (parse_trace_timestamp(doc["timestamp"]), doc["livreur_id"],
+               doc["latitude"], doc["longitude"])
+
+
+def read_trace(path):
+    """Lit une trace en flux (NDJSON) ou d'un bloc (tableau JSON)"""
+    with open(path, encoding="utf-8") as f:
+        head = f.read(1)
+        while head.isspace():
+            head = f.read(1)
+        if head == "[":
+            f.seek(0)
+            docs = json.load(f)
+        else:
+            docs = None
+    if docs is None:
+        docs = read_movements(path)
+    for doc in docs:
+        yield from trace_points(doc)
+
+
+class TraceReplayer:
+    def __init__(self, base_url=DEFAULT_BASE_URL, speed=1.0, batch_size=100, window=0.05,
+                 connections=50, max_in_flight=200, original_timestamps=False):
+        self.base_url = base_url.rstrip("/")
+        self.speed = speed
+        self.batch_size = max(1, batch_size)
+        self.window = window
+        self.connections = connections
+        self.original_timestamps = original_timestamps
+        self.slots = asyncio.Semaphore(max_in_flight)
+
+        self.lag = LatencyRecorder()
+        self.http_latency = LatencyRecorder()
+        self.requests = 0
+        self.failed = 0
+        self.positions = 0
+        self.rejected = 0
+        self.first_timestamp = None
+        self.last_timestamp = None
+        self._in_flight = set()
+
+    def payload(self, points):
+        now = datetime.now().isoformat(timespec="milliseconds")
+        if self.batch_size == 1:
+            _, livreur_id, latitude, longitude = points[0]
+            return {"livreur": livreur_id, "latitude": latitude, "longitude": longitude}
+        return [
+            {
+                "livreur_id": livreur_id,
+                "latitude": latitude,
+                "longitude": longitude,
+                "timestamp": timestamp.isoformat() if self.original_timestamps else now,
+            }
+            for timestamp, livreur_id, latitude, longitude in points
+        ]
+
+    async def send(self, session, batch):
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        for due, _ in batch:
+            self.lag.add(max(0.0, started - due))
+        points = [point for _, point in batch]
+        try:
+            async with session.post(f"{self.base_url}/positions/", json=self.payload(points)) as response:
+                status = response.status
+                # Un lot partiellement accepté (207) indique le nombre de rejets
+                rejected = (await response.json())["rejected"] if status == 207 else 0
+                await response.read()
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError, KeyError) as e:
+            logger.debug(f"Échec d'envoi: {e}")
+            status, rejected = None, 0
+        finally:
+            self.slots.release()
+        self.http_latency.add(loop.time() - started)
+        self.requests += 1
+        if status not in (200, 201, 207):
+            self.failed += 1
+            return
+        self.rejected += rejected
+        self.positions += len(points) - rejected
+
+    async def flush(self, session, batch):
+        if not batch:
+            return
+        # Contre-pression : au-delà de max_in_flight, l'attente devient du retard mesuré
+        await self.slots.acquire()
+        task = asyncio.create_task(self.send(session, list(batch)))
+        self._in_flight.add(task)
+        task.add_done_callback(self._in_flight.discard)
+        batch.clear()
+
+    async def run(self, points):
+        loop = asyncio.get_running_loop()
+        connector = aiohttp.TCPConnector(limit=self.connections)
+        timeout = aiohttp.ClientTimeout(total=30)
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+            start = loop.time()
+            batch = []
+            for point in points:
+                timestamp = point[0]
+                if self.first_timestamp is None:
+                    self.first_timestamp = timestamp
+                self.last_timestamp = timestamp
+                due = start
+                if self.speed:
+                    due += (timestamp - self.first_timestamp).total_seconds() / self.speed
+                if batch and (len(batch) >= self.batch_size or due - batch[0][0] >= self.window):
+                    await self.flush(session, batch)
+                delay = due - loop.time()
+                if delay > 0:
+                    if batch and delay > self.window:
+                        await self.flush(session, batch)
+                    await asyncio.sleep(delay)
+                batch.append((due, point))
+            await self.flush(session, batch)
+            if self._in_flight:
+                await asyncio.gather(*self._in_flight)
+            elapsed = loop.time() - start
+        return self.report(elapsed)
+
+    def report(self, elapsed):
+        span = (self.last_timestamp - self.first_timestamp).total_seconds() if self.first_timestamp else 0.0
+        return {
+            "duration_s": round(elapsed, 3),
+            "trace_span_s": round(span, 3),
+            "speed": self.speed or "max",
+            "achieved_speedup": round(span / elapsed, 2) if elapsed else None,
+            "requests": self.requests,
+            "failed_requests": self.failed,
+            "positions": self.positions,
+            "rejected_positions": self.rejected,
+            "positions_per_s": round(self.positions / elapsed, 1) if elapsed else 0.0,
+            "lag": self.lag.summary(),
+            "http_latency": self.http_latency.summary(),
+        }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Rejeu de traces GPS enregistrées contre l'API")
+    parser.add_argument("paths", nargs="+", help="Journaux du simulateur ou exports Mongo, dans l'ordre")
+    parser.add_argument("--url", dest="base_url", default=DEFAULT_BASE_URL,
+                        help=f"URL de base de l'API (défaut: {DEFAULT_BASE_URL})")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="Facteur d'accélération (1 : temps réel, 10 : dix fois plus vite, 0 : au plus vite)")
+    parser.add_argument("--batch-size", type=int, default=100,
+                        help="Positions maximum par requête (1 : format unitaire)")
+    parser.add_argument("--window", type=float, default=0.05,
+                        help="Fenêtre de regroupement en secondes (défaut: 0.05)")
+    parser.add_argument("--connections", type=int, default=50, help="Taille du pool de connexions HTTP")
+    parser.add_argument("--max-in-flight", type=int, default=200, help="Requêtes simultanées maximum")
+    parser.add_argument("--original-timestamps", action="store_true",
+                        help="Envoie les horodatages d'origine au lieu de l'heure du rejeu")
+    parser.add_argument("--sort", action="store_true", help="Trie les traces en mémoire avant le rejeu")
+    parser.add_argument("--output", help="Fichier où écrire le rapport JSON")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s',
+                        datefmt='%H:%M:%S')
+    args = parse_args(argv)
+    points = (point for path in args.paths for point in read_trace(path))
+    if args.sort:
+        points = sorted(points, key=lambda point: point[0])
+
+    async def replay():
+        replayer = TraceReplayer(
+            base_url=args.base_url, speed=args.speed, batch_size=args.batch_size, window=args.window,
+            connections=args.connections, max_in_flight=args.max_in_flight,
+            original_timestamps=args.original_timestamps,
+        )
+        return await replayer.run(points)
+
+    report = asyncio.run(replay())
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+# simulation/stats.py
+import math
+
+
+def percentile(sorted_values, fraction):
+    """Percentile (0 <= fraction <= 1) d'une liste triée, par interpolation linéaire"""
+    if not sorted_values:
+        return None
+    position = (len(sorted_values) - 1) * fraction
+    lower = math.floor(position)
+    upper = math.ceil(position)
+    if lower == upper:
+        return sorted_values[lower]
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+class LatencyRecorder:
+    """Accumule des latences (secondes) et les résume en millisecondes"""
+
+    def __init__(self):
+        self.values = []
+
+    def add(self, seconds):
+        self.values.append(seconds)
+
+    def summary(self):
+        values = sorted(self.values)
+        if not values:
+            return {"count": 0}
+
+        def ms(seconds):
+            return round(seconds * 1000, 3)
+
+        return {
+            "count": len(values),
+            "min_ms": ms(values[0]),
+            "p50_ms": ms(percentile(values, 0.50)),
+            "p95_ms": ms(percentile(values, 0.95)),
+            "p99_ms": ms(percentile(values, 0.99)),
+            "max_ms": ms(values[-1]),
+            "avg_ms": ms(sum(values) / len(values)),
+        }
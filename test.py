@@ -4,9 +4,10 @@ import random
 import logging
 import argparse
 from datetime import datetime
-from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List, Any
-import json
+from simulation.fleet import haversine
+from simulation.movement_log import MovementLogWriter
+from simulation.stats import LatencyRecorder
 
 # Configuration du logging
 logging.basicConfig(
@@ -52,6 +53,8 @@ class DeliverySimulator:
         }
         self._initialize_positions()
         self.session = requests.Session()  # Utilisation d'une session pour optimiser les connexions
+        self.movement_log = None  # Journal des déplacements, ouvert au premier mouvement
+        self.latency = LatencyRecorder()  # Durée des envois de position
     
     def _initialize_positions(self) -> None:
         """Initialise les positions de départ des livreurs."""
@@ -108,6 +111,7 @@ class DeliverySimulator:
             self.positions[livreur["id"]] = self.generate_random_position(livreur["id"])
             
             # Envoyer la nouvelle position
+            started = time.perf_counter()
             response = self.session.post(
                 f"{self.base_url}/positions/", 
                 json={
@@ -118,6 +122,7 @@ class DeliverySimulator:
                 },
                 timeout=5
             )
+            self.latency.add(time.perf_counter() - started)
             
             current_pos = self.positions[livreur["id"]]
             prev_pos = self.previous_positions[livreur["id"]]
@@ -137,22 +142,8 @@ class DeliverySimulator:
             self.stats["failed_updates"] += 1
     
     def calculate_distance(self, pos1: Dict[str, float], pos2: Dict[str, float]) -> float:
-        """Calcule la distance approximative entre deux positions en mètres."""
-        # Conversion en radians
-        lat1, lon1 = pos1["lat"] * (3.14159/180), pos1["lng"] * (3.14159/180)
-        lat2, lon2 = pos2["lat"] * (3.14159/180), pos2["lng"] * (3.14159/180)
-        
-        # Rayon de la Terre en mètres
-        R = 6371000
-        
-        # Formule haversine
-        dlon = lon2 - lon1
-        dlat = lat2 - lat1
-        a = (pow(pow(dlat, 2), 0.5)) + pow(pow(dlon * pow(dlon, 2), 0.5), 0.5)
-        c = 2 * pow(pow(a/2, 2), 0.5)
-        distance = R * c
-        
-        return distance
+        """Calcule la distance entre deux positions en mètres (formule haversine)."""
+        return float(haversine(pos1["lat"], pos1["lng"], pos2["lat"], pos2["lng"]))
     
     def display_movement(self, livreur: Dict[str, str], prev_pos: Dict[str, float], 
                         current_pos: Dict[str, float], distance: float) -> None:
@@ -181,7 +172,7 @@ class DeliverySimulator:
     
     def save_movement_to_file(self, livreur: Dict[str, str], prev_pos: Dict[str, float],
                              current_pos: Dict[str, float], distance: float) -> None:
-        """Enregistre les déplacements dans un fichier JSON pour visualisation ultérieure."""
+        """Ajoute le déplacement au journal NDJSON du jour pour visualisation ultérieure."""
         try:
             movement_data = {
                 "timestamp": datetime.now().isoformat(),
@@ -193,26 +184,23 @@ class DeliverySimulator:
                 "distance": distance
             }
             
-            # Nom du fichier basé sur la date
-            filename = f"mouvements_{datetime.now().strftime('%Y%m%d')}.json"
-            
-            # Charger le fichier existant ou créer une nouvelle liste
-            try:
-                with open(filename, 'r') as f:
-                    data = json.load(f)
-            except (FileNotFoundError, json.JSONDecodeError):
-                data = []
-            
-            # Ajouter le nouveau mouvement
-            data.append(movement_data)
+            # Nom du fichier basé sur la date : changement de fichier à minuit
+            filename = f"mouvements_{datetime.now().strftime('%Y%m%d')}.ndjson"
+            if self.movement_log is None or self.movement_log.path != filename:
+                self.close_movement_log()
+                self.movement_log = MovementLogWriter(filename)
             
-            # Sauvegarder le fichier
-            with open(filename, 'w') as f:
-                json.dump(data, f, indent=2)
+            self.movement_log.write(movement_data)
                 
         except Exception as e:
             logger.error(f"Erreur lors de l'enregistrement du mouvement: {e}")
     
+    def close_movement_log(self) -> None:
+        """Vide et ferme le journal des déplacements."""
+        if self.movement_log is not None:
+            self.movement_log.close()
+            self.movement_log = None
+    
     def display_stats(self) -> None:
         """Affiche les statistiques de la simulation."""
         total_attempts = self.stats["successful_updates"] + self.stats["failed_updates"]
@@ -223,6 +211,10 @@ class DeliverySimulator:
         logger.info(f"Mises à jour réussies: {self.stats['successful_updates']}")
         logger.info(f"Mises à jour échouées: {self.stats['failed_updates']}")
         logger.info(f"Taux de réussite: {success_rate:.1f}%")
+        latency = self.latency.summary()
+        if latency["count"]:
+            logger.info(f"Latence des envois: p50 {latency['p50_ms']:.1f} ms, "
+                        f"p95 {latency['p95_ms']:.1f} ms, max {latency['max_ms']:.1f} ms")
         logger.info("-----------------------------\n")
     
     def run(self) -> None:
@@ -259,7 +251,9 @@ class DeliverySimulator:
         except KeyboardInterrupt:
             logger.info("\nSimulation terminée.")
             self.display_stats()
-            logger.info(f"Les données de mouvement ont été enregistrées dans le fichier mouvements_{datetime.now().strftime('%Y%m%d')}.json")
+            if self.movement_log is not None:
+                logger.info(f"Les données de mouvement ont été enregistrées dans le fichier {self.movement_log.path}")
+            self.close_movement_log()
     
     @staticmethod
     def add_command_line_args():
@@ -271,11 +265,22 @@ class DeliverySimulator:
                             default=DeliverySimulator.DEFAULT_UPDATE_INTERVAL,
                             help=f"Intervalle entre les mises à jour en secondes (défaut: {DeliverySimulator.DEFAULT_UPDATE_INTERVAL})")
         parser.add_argument("--debug", action="store_true", help="Active le mode debug avec plus de logs")
-        return parser.parse_args()
+        parser.add_argument("--load", action="store_true",
+                            help="Lance le générateur de charge asyncio (options: python -m simulation.loadgen --help)")
+        return parser.parse_known_args()
 
 def main():
     # Traitement des arguments de ligne de commande
-    args = DeliverySimulator.add_command_line_args()
+    args, extra_args = DeliverySimulator.add_command_line_args()
+
+    # Mode charge : délégué au générateur asyncio
+    if args.load:
+        from simulation.loadgen import main as load_main
+        load_main(["--url", args.base_url] + extra_args)
+        return
+    if extra_args:
+        logger.error(f"Arguments non reconnus: {' '.join(extra_args)}")
+        return
     
     # Configuration du niveau de log selon le mode debug
     if args.debug:
@@ -0,0 +1,115 @@
+# tracking/aio.py
+"""Accès asynchrone aux données de suivi.
+
+PyMongo étant bloquant, les appels sont exécutés dans un pool de threads
+borné (TRACKING_DB_EXECUTOR_WORKERS) : la boucle asyncio n'est jamais
+bloquée et le nombre de connexions Mongo simultanées reste maîtrisé.
+"""
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from .models import Livreur, Position, LatestPosition
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def get_db_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'TRACKING_DB_EXECUTOR_WORKERS', 32),
+                thread_name_prefix="tracking-db",
+            )
+    return _executor
+
+async def run_in_db_executor(func, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_db_executor(), functools.partial(func, *args, **kwargs))
+
+async def iterate_in_db_executor(iterator):
+    """Itère un itérateur bloquant (curseur, morceaux encodés) depuis le pool
+    de threads ; sert aux réponses diffusées des vues asynchrones"""
+    iterator = iter(iterator)
+    done = object()
+    while True:
+        item = await run_in_db_executor(next, iterator, done)
+        if item is done:
+            return
+        yield item
+
+
+class AsyncLivreur:
+    @staticmethod
+    async def create(livreur_id, nom, telephone, actif=True, flotte=None):
+        return await run_in_db_executor(Livreur.create, livreur_id, nom, telephone, actif, flotte)
+
+    @staticmethod
+    async def get_all():
+        return await run_in_db_executor(Livreur.get_all)
+
+    @staticmethod
+    async def get_by_id(livreur_id):
+        return await run_in_db_executor(Livreur.get_by_id, livreur_id)
+
+    @staticmethod
+    async def get_fleets(livreur_ids):
+        return await run_in_db_executor(Livreur.get_fleets, livreur_ids)
+
+    @staticmethod
+    async def update(livreur_id, data):
+        return await run_in_db_executor(Livreur.update, livreur_id, data)
+
+
+class AsyncPosition:
+    @staticmethod
+    async def create(livreur_id, latitude, longitude, timestamp=None):
+        return await run_in_db_executor(Position.create, livreur_id, latitude, longitude, timestamp)
+
+    @staticmethod
+    async def create_many(points):
+        return await run_in_db_executor(Position.create_many, points)
+
+    @staticmethod
+    async def get_latest_positions():
+        return await run_in_db_executor(Position.get_latest_positions)
+
+    @staticmethod
+    async def get_changed_positions(since):
+        return await run_in_db_executor(Position.get_changed_positions, since)
+
+    @staticmethod
+    async def get_livreur_positions(livreur_id, limit=100, start=None, end=None, after=None):
+        return await run_in_db_executor(Position.get_livreur_positions, livreur_id, limit, start, end, after)
+
+    @staticmethod
+    async def get_daily_summaries(livreur_id, start=None, end=None):
+        return await run_in_db_executor(Position.get_daily_summaries, livreur_id, start, end)
+
+    @staticmethod
+    async def get_trip_stats(livreur_id, day):
+        return await run_in_db_executor(Position.get_trip_stats, livreur_id, day)
+
+    @staticmethod
+    async def get_trip_stats_range(livreur_id, start, end):
+        return await run_in_db_executor(Position.get_trip_stats_range, livreur_id, start, end)
+
+
+class AsyncLatestPosition:
+    @staticmethod
+    async def nearby(latitude, longitude, radius, k=10, max_age=None):
+        return await run_in_db_executor(LatestPosition.nearby, latitude, longitude, radius, k, max_age)
+
+    @staticmethod
+    async def within(bbox, max_age=None):
+        return await run_in_db_executor(LatestPosition.within, bbox, max_age)
+
+    @staticmethod
+    async def load_all():
+        return await run_in_db_executor(LatestPosition.load_all)
+
+    @staticmethod
+    async def updated_since(seq):
+        return await run_in_db_executor(LatestPosition.updated_since, seq)
@@ -0,0 +1,167 @@
+# tracking/async_views.py
+# Versions asynchrones des vues de tracking/views.py (TRACKING_ASYNC_VIEWS = True).
+# Les accès Mongo passent par le pool borné de tracking/aio.py et la diffusion
+# appelle group_send directement, sans async_to_sync.
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods
+import json
+from .aio import AsyncLivreur, AsyncPosition, AsyncLatestPosition, iterate_in_db_executor, run_in_db_executor
+from .encoding import mongo_json_response, streaming_json_response
+from .models import Livreur
+from . import mongodb
+from .buffer import WriteBufferFull
+from .broadcast import publish_position, publish_positions
+from .views import (
+    parse_positions_payload, check_batch_size, validate_position_point,
+    validate_positions_batch, complete_positions_batch, write_buffer_stats_view,
+    driver_cache_stats_view, health_live_view, readiness_response,
+    parse_nearby_query, parse_within_query, parse_history_query, history_response,
+    parse_summaries_query, parse_trip_stats_query, parse_since, latest_positions_response,
+    changed_positions_response,
+)
+
+@csrf_exempt
+@require_http_methods(["GET", "POST"])
+async def livreurs_view(request):
+    if request.method == "GET":
+        return streaming_json_response(request, Livreur.iter_all(), wrap=iterate_in_db_executor)
+
+    elif request.method == "POST":
+        data = json.loads(request.body)
+        livreur = await AsyncLivreur.create(
+            data.get('livreur_id'),
+            data.get('nom'),
+            data.get('telephone'),
+            data.get('actif', True),
+            data.get('flotte')
+        )
+        return mongo_json_response(livreur, safe=False)
+
+@csrf_exempt
+@require_http_methods(["GET", "PUT", "DELETE"])
+async def livreur_detail_view(request, livreur_id):
+    if request.method == "GET":
+        livreur = await AsyncLivreur.get_by_id(livreur_id)
+        if livreur:
+            return mongo_json_response(livreur, safe=False)
+        return JsonResponse({"error": "Livreur non trouvé"}, status=404)
+
+    elif request.method == "PUT":
+        data = json.loads(request.body)
+        livreur = await AsyncLivreur.update(livreur_id, data)
+        return mongo_json_response(livreur, safe=False)
+
+async def positions_batch_response(points):
+    too_large = check_batch_size(points)
+    if too_large:
+        return too_large
+
+    results, valid_points, valid_indexes = validate_positions_batch(points)
+    positions, errors = await AsyncPosition.create_many(valid_points)
+    accepted, response = complete_positions_batch(results, valid_indexes, positions, errors)
+
+    if accepted:
+        fleets = await AsyncLivreur.get_fleets({p["livreur_id"] for p in accepted})
+        await publish_positions(accepted, fleets)
+    return response
+
+@csrf_exempt
+@require_http_methods(["GET", "POST"])
+async def positions_view(request):
+    if request.method == "GET":
+        if 'since' in request.GET:
+            try:
+                since = parse_since(request.GET['since'])
+            except ValueError as e:
+                return JsonResponse({"error": str(e)}, status=400)
+            positions, cursor = await AsyncPosition.get_changed_positions(since)
+            return changed_positions_response(request, positions, cursor)
+        if request.GET.get('latest') == 'true':
+            positions = await AsyncPosition.get_latest_positions()
+            return latest_positions_response(request, positions, wrap=iterate_in_db_executor)
+        return streaming_json_response(request, [], wrap=iterate_in_db_executor)
+
+    elif request.method == "POST":
+        try:
+            data, is_batch = parse_positions_payload(request)
+        except ValueError:
+            return JsonResponse({"error": "Corps JSON invalide"}, status=400)
+        if is_batch:
+            return await positions_batch_response(data)
+
+        try:
+            point = validate_position_point(data)
+        except ValueError as e:
+            return JsonResponse({"error": str(e)}, status=400)
+        try:
+            position = await AsyncPosition.create(
+                point['livreur_id'],
+                point['latitude'],
+                point['longitude'],
+                point['timestamp']
+            )
+        except WriteBufferFull as e:
+            return JsonResponse({"error": str(e)}, status=503)
+
+        fleets = await AsyncLivreur.get_fleets([position["livreur_id"]])
+        await publish_position(position, fleets)
+
+        return mongo_json_response(position, safe=False)
+
+@require_http_methods(["GET"])
+async def nearby_positions_view(request):
+    try:
+        query = parse_nearby_query(request.GET)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    positions = await AsyncLatestPosition.nearby(**query)
+    return mongo_json_response(positions, safe=False)
+
+@require_http_methods(["GET"])
+async def within_positions_view(request):
+    try:
+        query = parse_within_query(request.GET)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    positions = await AsyncLatestPosition.within(**query)
+    return mongo_json_response(positions, safe=False)
+
+@csrf_exempt
+@require_http_methods(["GET"])
+async def livreur_positions_view(request, livreur_id):
+    try:
+        query, simplify = parse_history_query(request.GET)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    positions = await AsyncPosition.get_livreur_positions(livreur_id, **{**query, "limit": query["limit"] + 1})
+    return history_response(request, positions, query["limit"], simplify, wrap=iterate_in_db_executor)
+
+@csrf_exempt
+@require_http_methods(["GET"])
+async def livreur_summaries_view(request, livreur_id):
+    try:
+        query = parse_summaries_query(request.GET)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    summaries = await AsyncPosition.get_daily_summaries(livreur_id, **query)
+    return mongo_json_response(summaries, safe=False)
+
+@csrf_exempt
+@require_http_methods(["GET"])
+async def livreur_trip_stats_view(request, livreur_id):
+    try:
+        query = parse_trip_stats_query(request.GET)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    if "day" in query:
+        return mongo_json_response(await AsyncPosition.get_trip_stats(livreur_id, query["day"]))
+    stats = await AsyncPosition.get_trip_stats_range(livreur_id, query["start"], query["end"])
+    return mongo_json_response(stats, safe=False)
+
+@require_http_methods(["GET"])
+async def health_ready_view(request):
+    try:
+        return readiness_response(latency=await run_in_db_executor(mongodb.ping))
+    except Exception as e:
+        return readiness_response(error=e)
@@ -0,0 +1,114 @@
+# tracking/binary.py
+"""Protocole WebSocket binaire, négocié avec le sous-protocole
+"tracking.binary.v1" ou `?format=binary`.
+
+Toutes les valeurs sont little-endian. Chaque trame commence par un octet de
+type :
+
+- dictionnaire (1) : u32 premier index, u32 nombre d'entrées, puis pour
+  chaque livreur u16 longueur + identifiant UTF-8. Les index se suivent à
+  partir du premier ; le dictionnaire est étendu au fil des nouveaux
+  livreurs, toujours avant la trame qui les utilise.
+- positions (2) : u32 nombre, i64 date de référence (ms depuis l'epoch),
+  i32 latitude et i32 longitude de référence (en 1e-6 degré), i64 numéro de
+  séquence de référence, puis un enregistrement de 20 octets par position :
+  u32 index du livreur, i32 écart de latitude, i32 écart de longitude, u32
+  écart en ms à la date de référence, u32 écart au numéro de référence plus
+  un (0 : position sans numéro de séquence). Les positions d'une trame sont
+  triées par date ; un lot dont les dates ou les numéros couvrent plus qu'un
+  u32 est réparti sur plusieurs trames de positions.
+"""
+import struct
+from datetime import datetime
+
+BINARY_SUBPROTOCOL = "tracking.binary.v1"
+
+DICTIONARY_FRAME = 1
+POSITIONS_FRAME = 2
+
+# 1e-6 degré, soit environ 11 cm
+COORD_SCALE = 1_000_000
+
+DICTIONARY_HEADER = struct.Struct("<BII")
+POSITIONS_HEADER = struct.Struct("<BIqiiq")
+POSITION_RECORD = struct.Struct("<IiiII")
+
+# Écart maximal (date en ms, ou numéro de séquence) codé dans un enregistrement
+MAX_OFFSET = 2 ** 32 - 1
+
+
+def epoch_ms(timestamp):
+    if isinstance(timestamp, str):
+        timestamp = datetime.fromisoformat(timestamp)
+    return round(timestamp.timestamp() * 1000)
+
+
+class BinaryEncoder:
+    """Encodeur propre à une connexion : il retient les index déjà transmis"""
+
+    def __init__(self):
+        self.indexes = {}
+
+    def dictionary_frame(self, livreur_ids):
+        """Trame ajoutant au dictionnaire les livreurs encore inconnus, ou None"""
+        first = len(self.indexes)
+        entries = []
+        for livreur_id in livreur_ids:
+            if livreur_id not in self.indexes:
+                self.indexes[livreur_id] = len(self.indexes)
+                encoded = livreur_id.encode()
+                entries.append(struct.pack("<H", len(encoded)) + encoded)
+        if not entries:
+            return None
+        return DICTIONARY_HEADER.pack(DICTIONARY_FRAME, first, len(entries)) + b"".join(entries)
+
+    def encode(self, positions):
+        """Trames (dictionnaire éventuel puis positions) d'un lot de positions"""
+        frames = []
+        dictionary = self.dictionary_frame(p["livreur_id"] for p in positions)
+        if dictionary:
+            frames.append(dictionary)
+
+        timed = sorted(((epoch_ms(p["timestamp"]), p) for p in positions), key=lambda item: item[0])
+        for chunk in self.split(timed):
+            frames.append(self.positions_frame(chunk))
+        return frames
+
+    @staticmethod
+    def split(timed):
+        """Découpe des couples (date, position) triés par date en groupes dont
+        les écarts de date et de numéro de séquence tiennent dans un u32"""
+        chunk, seqs = [], []
+        for time, position in timed:
+            seq = position.get("seq")
+            if chunk:
+                span = seqs + [seq] if seq is not None else seqs
+                # Le numéro est codé plus un : l'écart maximal est MAX_OFFSET - 1
+                if time - chunk[0][0] > MAX_OFFSET or (span and max(span) - min(span) >= MAX_OFFSET):
+                    yield chunk
+                    chunk, seqs = [], []
+            chunk.append((time, position))
+            if seq is not None:
+                seqs = [min(seqs + [seq]), max(seqs + [seq])]
+        if chunk:
+            yield chunk
+
+    def positions_frame(self, timed):
+        base_time = timed[0][0]
+        first = timed[0][1]
+        base_lat = round(first["latitude"] * COORD_SCALE)
+        base_lng = round(first["longitude"] * COORD_SCALE)
+        base_seq = min((p["seq"] for _, p in timed if p.get("seq") is not None), default=0)
+        records = [POSITIONS_HEADER.pack(
+            POSITIONS_FRAME, len(timed), base_time, base_lat, base_lng, base_seq
+        )]
+        for time, position in timed:
+            seq = position.get("seq")
+            records.append(POSITION_RECORD.pack(
+                self.indexes[position["livreur_id"]],
+                round(position["latitude"] * COORD_SCALE) - base_lat,
+                round(position["longitude"] * COORD_SCALE) - base_lng,
+                time - base_time,
+                0 if seq is None else seq - base_seq + 1,
+            ))
+        return b"".join(records)
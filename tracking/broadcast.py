@@ -0,0 +1,103 @@
+# tracking/broadcast.py
+import asyncio
+import hashlib
+import re
+import time
+from collections import defaultdict
+from channels.layers import get_channel_layer
+from . import metrics
+from .spatial import position_groups
+
+# Groupe des clients qui reçoivent toutes les positions
+TRACKING_GROUP = "tracking_updates"
+
+# Caractères et longueur acceptés dans un nom de groupe du channel layer
+VALID_GROUP_SUFFIX = re.compile(r"^[A-Za-z0-9_.-]{1,64}$")
+
+
+def topic_group(prefix, value):
+    # Les identifiants non conformes sont remplacés par leur empreinte
+    if not VALID_GROUP_SUFFIX.match(value):
+        value = hashlib.sha1(value.encode()).hexdigest()
+    return f"{prefix}_{value}"
+
+
+def livreur_group(livreur_id):
+    return topic_group("tracking_livreur", livreur_id)
+
+
+def fleet_group(fleet):
+    return topic_group("tracking_flotte", fleet)
+
+
+def position_payload(position, fleet=None):
+    """Champs d'une position transmis aux clients WebSocket"""
+    payload = {
+        "livreur_id": position["livreur_id"],
+        "latitude": position["latitude"],
+        "longitude": position["longitude"],
+        "timestamp": position["timestamp"].isoformat(),
+    }
+    if position.get("seq") is not None:
+        payload["seq"] = position["seq"]
+    if fleet:
+        payload["flotte"] = fleet
+    return payload
+
+
+def target_groups(position, fleet=None):
+    """Groupes auxquels une position est publiée : flux complet, cellules de
+    la grille, groupe du livreur et, le cas échéant, groupe de sa flotte.
+    Les clients qui suivent des livreurs ou des flottes ne rejoignent que
+    ces groupes et ne reçoivent pas le flux complet."""
+    groups = [TRACKING_GROUP, livreur_group(position["livreur_id"])]
+    groups += position_groups(position["latitude"], position["longitude"])
+    if fleet:
+        groups.append(fleet_group(fleet))
+    return groups
+
+
+async def group_send(channel_layer, group, message):
+    """group_send, chronométré lorsque les métriques sont actives"""
+    if not metrics.ENABLED:
+        await channel_layer.group_send(group, message)
+        return
+    started = time.perf_counter()
+    await channel_layer.group_send(group, message)
+    metrics.channel_layer_send_duration.observe(time.perf_counter() - started, "group_send")
+
+
+async def publish_position(position, fleets=None):
+    """`fleets` associe un identifiant de livreur au nom de sa flotte"""
+    fleet = (fleets or {}).get(position["livreur_id"])
+    channel_layer = get_channel_layer()
+    message = {"type": "position_update", **position_payload(position, fleet)}
+    # Les envois vers les différents groupes sont indépendants : ils partent
+    # en parallèle plutôt que l'un après l'autre
+    await asyncio.gather(*(
+        group_send(channel_layer, group, message)
+        for group in target_groups(position, fleet)
+    ))
+
+
+async def publish_positions(positions, fleets=None):
+    """Diffuse un lot de positions avec un seul message par groupe concerné"""
+    if not positions:
+        return
+    fleets = fleets or {}
+    payloads_by_group = defaultdict(list)
+    for position in positions:
+        fleet = fleets.get(position["livreur_id"])
+        payload = position_payload(position, fleet)
+        for group in target_groups(position, fleet):
+            payloads_by_group[group].append(payload)
+
+    channel_layer = get_channel_layer()
+    await asyncio.gather(*(
+        group_send(
+            channel_layer,
+            group,
+            {"type": "positions_batch", "positions": payloads}
+        )
+        for group, payloads in payloads_by_group.items()
+    ))
@@ -0,0 +1,239 @@
+# tracking/buffer.py
+import atexit
+import logging
+import threading
+import time
+from collections import deque
+from pymongo.errors import ConnectionFailure
+
+logger = logging.getLogger(__name__)
+
+
+# Attente maximale entre deux tentatives d'écriture après des échecs répétés
+MAX_RETRY_DELAY = 30.0
+
+
+class WriteBufferFull(Exception):
+    """Levée lorsque le tampon d'écriture différée ne peut plus accepter de positions"""
+
+
+class WriteInterrupted(Exception):
+    """Échec d'une étape d'une écriture en plusieurs étapes ; `resume()`
+    reprend à l'étape en échec (`step`) sans rejouer les précédentes"""
+
+    def __init__(self, resume, step=0):
+        super().__init__("Écriture interrompue")
+        self.resume = resume
+        self.step = step
+
+
+def run_steps(steps, result, start=0):
+    """Exécute les étapes dans l'ordre puis retourne `result()` ; un échec
+    lève WriteInterrupted (l'exception d'origine en est la cause)"""
+    for index in range(start, len(steps)):
+        try:
+            steps[index]()
+        except Exception as e:
+            raise WriteInterrupted(lambda: run_steps(steps, result, index), index) from e
+    return result()
+
+
+class PositionWriteBuffer:
+    """Tampon d'écriture différée (write-behind) pour les positions.
+
+    Les positions sont placées dans une file bornée en mémoire ; un thread de
+    fond les écrit par lots via `writer` dès que `batch_size` positions sont
+    en attente ou que `flush_interval` secondes se sont écoulées. Lorsque la
+    file est pleine, les nouvelles positions sont refusées et comptées comme
+    perdues, de même que les positions rejetées par `writer` (qui retourne
+    les erreurs indexées par position dans le lot).
+
+    Un lot en échec est retenté avant tout autre, après une attente qui
+    double à chaque échec (de `flush_interval` à MAX_RETRY_DELAY). Si
+    `writer` lève WriteInterrupted, seule l'étape en échec est rejouée.
+    Après `max_attempts` échecs, le lot est réécrit position par position
+    pour isoler celles qui échouent ; une position en échec, ou un lot dont
+    l'écriture est déjà entamée ou qui échoue faute de connexion à Mongo,
+    est écarté (dead letter) pour ne pas bloquer les suivants.
+    """
+
+    def __init__(self, writer, max_size=10000, batch_size=500, flush_interval=0.5,
+                 max_attempts=8, dead_letter_size=1000):
+        self.writer = writer
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_attempts = max_attempts
+
+        self._queue = deque()
+        self._condition = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._stopping = False
+        # Lot en échec à retenter : (lot, appel, reprise d'une écriture entamée,
+        # nombre d'échecs), et échéance de la tentative
+        self._retry = None
+        self._retry_delay = 0.0
+        self._retry_at = None
+        # Dernières positions écartées après max_attempts échecs
+        self._dead_letters = deque(maxlen=dead_letter_size)
+
+        self._dead_lettered = 0
+        self._dropped = 0
+        self._flushed = 0
+        self._flushes = 0
+        self._failed_flushes = 0
+        self._last_flush_latency = 0.0
+        self._max_flush_latency = 0.0
+        self._total_flush_latency = 0.0
+
+    def start(self):
+        with self._condition:
+            if self._thread is not None:
+                return
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name="position-write-buffer", daemon=True)
+            self._thread.start()
+        atexit.register(self.stop)
+
+    def put_many(self, docs):
+        """Ajoute des positions à la file ; retourne le nombre de positions acceptées"""
+        if self._thread is None:
+            self.start()
+        with self._condition:
+            accepted = min(len(docs), self.max_size - len(self._queue))
+            accepted = max(accepted, 0)
+            self._queue.extend(docs[:accepted])
+            self._dropped += len(docs) - accepted
+            if len(self._queue) >= self.batch_size:
+                self._condition.notify()
+        return accepted
+
+    def flush(self):
+        """Écrit immédiatement tout le contenu de la file"""
+        while self._flush_batch():
+            pass
+
+    def stop(self):
+        """Arrête le thread de fond après avoir vidé la file"""
+        with self._condition:
+            thread = self._thread
+            self._stopping = True
+            self._condition.notify()
+        if thread is not None:
+            thread.join()
+        self.flush()
+        with self._condition:
+            self._thread = None
+
+    def dead_letters(self):
+        """Dernières positions écartées (au plus `dead_letter_size`)"""
+        return list(self._dead_letters)
+
+    def stats(self):
+        with self._condition:
+            depth = len(self._queue)
+        retry = self._retry
+        return {
+            "depth": depth + (len(retry[0]) if retry else 0),
+            "max_size": self.max_size,
+            "dropped": self._dropped,
+            "dead_lettered": self._dead_lettered,
+            "flushed": self._flushed,
+            "flushes": self._flushes,
+            "failed_flushes": self._failed_flushes,
+            "retry_delay_s": self._retry_delay,
+            "last_flush_latency_ms": round(self._last_flush_latency * 1000, 3),
+            "max_flush_latency_ms": round(self._max_flush_latency * 1000, 3),
+            "avg_flush_latency_ms": round(self._total_flush_latency * 1000 / self._flushes, 3) if self._flushes else 0.0,
+        }
+
+    def _run(self):
+        while True:
+            with self._condition:
+                if self._retry_at is not None:
+                    # Après un échec, attendre l'échéance même si la file se remplit
+                    remaining = self._retry_at - time.monotonic()
+                    while not self._stopping and remaining > 0:
+                        self._condition.wait(remaining)
+                        remaining = self._retry_at - time.monotonic()
+                elif not self._stopping and len(self._queue) < self.batch_size:
+                    self._condition.wait(self.flush_interval)
+                if self._stopping:
+                    return
+            self.flush()
+
+    def _flush_batch(self):
+        # Un seul lot en cours d'écriture à la fois pour conserver l'ordre
+        with self._flush_lock:
+            if self._retry is not None:
+                batch, call, resumed, failures = self._retry
+            else:
+                with self._condition:
+                    if not self._queue:
+                        return False
+                    batch = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+                resumed, failures = False, 0
+
+                def call():
+                    return self.writer(batch)
+
+            start = time.perf_counter()
+            try:
+                errors = call()
+            except Exception as e:
+                failures += 1
+                self._failed_flushes += 1
+                logger.exception("Échec de l'écriture différée de %d positions (tentative %d/%d)",
+                                 len(batch), failures, self.max_attempts)
+                self._retry_delay = min(max(self._retry_delay * 2, self.flush_interval), MAX_RETRY_DELAY)
+                if failures >= self.max_attempts:
+                    self._retry = None
+                    self._retry_delay = 0.0
+                    self._retry_at = None
+                    self._give_up(batch, resumed or getattr(e, "step", 0) > 0, e)
+                    return True
+                if isinstance(e, WriteInterrupted):
+                    call, resumed = e.resume, resumed or e.step > 0
+                self._retry = (batch, call, resumed, failures)
+                self._retry_at = time.monotonic() + self._retry_delay
+                return False
+
+            latency = time.perf_counter() - start
+            self._retry = None
+            self._retry_delay = 0.0
+            self._retry_at = None
+            self._flushes += 1
+            self._count_written(len(batch), errors)
+            self._last_flush_latency = latency
+            self._max_flush_latency = max(self._max_flush_latency, latency)
+            self._total_flush_latency += latency
+            return True
+
+    def _count_written(self, size, errors):
+        rejected = len(errors or {})
+        if rejected:
+            logger.warning("Écriture différée : %d positions rejetées", rejected)
+        self._flushed += size - rejected
+        self._dropped += rejected
+
+    def _give_up(self, batch, resumed, error):
+        """Après max_attempts échecs : réécrit le lot position par position si
+        c'est utile, et écarte les positions qui échouent encore"""
+        cause = error.__cause__ if isinstance(error, WriteInterrupted) else error
+        if resumed or len(batch) == 1 or isinstance(cause, ConnectionFailure):
+            # Écriture entamée (l'historique serait réinséré) ou Mongo injoignable
+            self._dead_letter(batch, cause)
+            return
+        for doc in batch:
+            try:
+                self._count_written(1, self.writer([doc]))
+            except Exception as e:
+                self._dead_letter([doc], e.__cause__ if isinstance(e, WriteInterrupted) else e)
+
+    def _dead_letter(self, docs, error):
+        logger.error("Écriture différée : %d positions écartées après %d tentatives (%s)",
+                     len(docs), self.max_attempts, error)
+        self._dead_letters.extend(docs)
+        self._dead_lettered += len(docs)
+        self._dropped += len(docs)
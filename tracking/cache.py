@@ -0,0 +1,201 @@
+# tracking/cache.py
+import threading
+import time
+from collections import OrderedDict
+from .spatial import SpatialIndex
+
+
+class LatestPositionCache:
+    """Cache en mémoire des dernières positions par livreur.
+
+    Le cache est alimenté à chaque ingestion du processus. Au-delà de `ttl`
+    secondes, il lit dans Mongo les positions écrites depuis son dernier
+    curseur (via `changes`, voir LatestPosition.changed_since), ce qui borne
+    le retard vis-à-vis des autres workers sans tout relire. Un seul appelant
+    rafraîchit à la fois ; les autres servent le contenu actuel. Un index
+    spatial en grille est tenu à jour en même temps pour les recherches de
+    proximité.
+    """
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._positions = {}
+        self._index = SpatialIndex()
+        self._loaded_at = None
+        # Curseur de `changes` atteint par le dernier rafraîchissement (None :
+        # jamais chargé)
+        self._cursor = None
+        # Incrémenté à chaque invalidation : un rafraîchissement en cours
+        # pendant une invalidation est abandonné
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+
+    def get_all(self, changes):
+        self._refresh(changes)
+        with self._lock:
+            return list(self._positions.values())
+
+    def nearby(self, changes, latitude, longitude, radius, k=None, predicate=None):
+        self._refresh(changes)
+        with self._lock:
+            return self._index.nearby(latitude, longitude, radius, k, predicate)
+
+    def within(self, changes, bbox, predicate=None):
+        self._refresh(changes)
+        with self._lock:
+            return self._index.within(bbox, predicate)
+
+    def update(self, positions):
+        """Fusionne des positions fraîchement ingérées (la plus récente l'emporte)"""
+        with self._lock:
+            self._merge(positions)
+
+    def invalidate(self):
+        with self._lock:
+            self._positions = {}
+            self._index.clear()
+            self._loaded_at = None
+            self._cursor = None
+            self._generation += 1
+
+    def _is_fresh(self):
+        return self._loaded_at is not None and time.monotonic() - self._loaded_at < self.ttl
+
+    def _refresh(self, changes):
+        with self._lock:
+            if self._is_fresh():
+                return
+            loaded = self._cursor is not None
+        # Premier chargement : les appelants attendent le chargement complet ;
+        # ensuite, un rafraîchissement déjà en cours n'est pas attendu
+        if not self._refresh_lock.acquire(blocking=not loaded):
+            return
+        try:
+            with self._lock:
+                if self._is_fresh():
+                    return
+                cursor = self._cursor or 0
+                generation = self._generation
+            positions, cursor = changes(cursor)
+            with self._lock:
+                if generation != self._generation:
+                    return
+                # Fusion sans vidage : une position plus récente reçue par
+                # update() pendant la lecture n'est pas écrasée
+                self._merge(positions)
+                self._cursor = cursor
+                self._loaded_at = time.monotonic()
+        finally:
+            self._refresh_lock.release()
+
+    def _merge(self, positions):
+        for position in positions:
+            current = self._positions.get(position["livreur_id"])
+            if current is None or current["timestamp"] <= position["timestamp"]:
+                self._positions[position["livreur_id"]] = position
+                self._index.update(position)
+
+
+class DriverCache:
+    """Cache LRU borné des fiches livreurs, avec expiration.
+
+    Chaque fiche est conservée au plus `ttl` secondes et les moins récemment
+    utilisées sont évincées au-delà de `max_size` entrées. Un livreur inconnu
+    est aussi mis en cache (valeur None) pour ne pas interroger Mongo à
+    chaque position d'un livreur non enregistré. La liste complète est gardée
+    tant qu'elle tient dans le cache. Les écritures invalident les entrées
+    (voir tracking/invalidation.py pour les autres workers).
+    """
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._all = None
+        self._all_expires_at = 0
+        # Incrémenté à chaque invalidation : une liste lue pendant une
+        # écriture n'est pas mise en cache
+        self._generation = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._invalidations = 0
+        self._lock = threading.Lock()
+
+    @property
+    def generation(self):
+        return self._generation
+
+    def get_many(self, livreur_ids):
+        """Retourne ({livreur_id: fiche ou None}, identifiants absents du cache)"""
+        now = time.monotonic()
+        found = {}
+        missing = []
+        with self._lock:
+            for livreur_id in livreur_ids:
+                entry = self._entries.get(livreur_id)
+                if entry is not None and entry[0] > now:
+                    self._entries.move_to_end(livreur_id)
+                    found[livreur_id] = entry[1]
+                    self._hits += 1
+                else:
+                    missing.append(livreur_id)
+                    self._misses += 1
+        return found, missing
+
+    def put_many(self, livreurs, generation=None):
+        """Enregistre {livreur_id: fiche ou None} lus à la génération `generation`"""
+        expires_at = time.monotonic() + self.ttl
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            for livreur_id, livreur in livreurs.items():
+                self._entries[livreur_id] = (expires_at, livreur)
+                self._entries.move_to_end(livreur_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def get_all(self):
+        """Liste complète des fiches, ou None si elle n'est pas en cache"""
+        with self._lock:
+            if self._all is not None and self._all_expires_at > time.monotonic():
+                self._hits += 1
+                return self._all
+            self._misses += 1
+            return None
+
+    def set_all(self, livreurs, generation):
+        if len(livreurs) > self.max_size:
+            return
+        self.put_many({livreur["livreur_id"]: livreur for livreur in livreurs}, generation)
+        with self._lock:
+            if generation == self._generation:
+                self._all = livreurs
+                self._all_expires_at = time.monotonic() + self.ttl
+
+    def invalidate(self, livreur_id=None):
+        """Invalide un livreur (et la liste complète), ou tout le cache"""
+        with self._lock:
+            if livreur_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(livreur_id, None)
+            self._all = None
+            self._generation += 1
+            self._invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / lookups, 4) if lookups else 0.0,
+                "evictions": self._evictions,
+                "invalidations": self._invalidations,
+            }
@@ -1,37 +1,302 @@
 # tracking/consumers.py
+import asyncio
 import json
+import time
+from urllib.parse import parse_qs
 from channels.generic.websocket import AsyncWebsocketConsumer
-from datetime import datetime
-from bson import ObjectId
-
-# Classe pour encoder les types MongoDB en JSON
-class MongoJSONEncoder(json.JSONEncoder):
-    def default(self, obj):
-        if isinstance(obj, ObjectId):
-            return str(obj)
-        if isinstance(obj, datetime):
-            return obj.isoformat()
-        return super().default(obj)
+from django.conf import settings
+from . import metrics
+from .aio import AsyncLatestPosition, AsyncLivreur
+from .binary import BINARY_SUBPROTOCOL, BinaryEncoder
+from .encoding import dumps
+from .broadcast import TRACKING_GROUP, livreur_group, fleet_group, position_payload
+from .spatial import BoundingBox, bbox_groups
 
 class TrackingConsumer(AsyncWebsocketConsumer):
+    """Diffuse les positions aux clients WebSocket.
+
+    Les mises à jour sont fusionnées par livreur (seule la plus récente est
+    conservée) puis envoyées en une trame (tableau JSON) à la fréquence
+    choisie par le client, via `?rate=<Hz>` ou le message
+    {"action": "set_rate", "rate": <Hz>}. Une fréquence de 0 désactive la
+    fusion : chaque événement est alors transmis immédiatement.
+
+    Par défaut le client reçoit toutes les positions. Il peut se limiter à la
+    zone affichée avec `?bbox=sud,ouest,nord,est` ou le message
+    {"action": "subscribe_bbox", "bbox": [sud, ouest, nord, est]} (à renvoyer
+    à chaque déplacement de la carte, qui reçoit en réponse un instantané de
+    la nouvelle zone), et revenir au flux complet avec {"action": "clear_bbox"}.
+
+    Le client peut aussi suivre des livreurs ou des flottes précis avec
+    `?livreur=<id>` / `?flotte=<nom>` ou les messages
+    {"action": "subscribe", "livreur_id": <id>} / {"action": "subscribe", "flotte": <nom>}
+    (et "unsubscribe"). Sans zone, un client abonné à des livreurs ou à des
+    flottes ne reçoit plus le flux complet.
+
+    Avec le sous-protocole "tracking.binary.v1" ou `?format=binary`, les
+    positions sont envoyées en trames binaires compactes (voir
+    tracking/binary.py) ; les messages de contrôle restent en JSON.
+
+    À la connexion, le client reçoit l'état courant des livreurs qu'il suit :
+    {"type": "snapshot", "seq": <n>, "positions": [...]}. Chaque mise à jour
+    porte un numéro de séquence `seq` ; un client qui se reconnecte avec
+    `?since=<dernier seq reçu>` ne reçoit que la dernière position des
+    livreurs mis à jour depuis ({"type": "replay", ...}), lue dans
+    latest_positions. `?snapshot=false` désactive l'envoi initial.
+    """
+
     async def connect(self):
-        await self.channel_layer.group_add(
-            "tracking_updates",
-            self.channel_name
-        )
-        await self.accept()
+        self.connected = False
+        self.pending = {}
+        self.flush_task = None
+        self.groups = set()
+        self.bbox = None
+        self.cell_groups = None
+        self.livreur_ids = set()
+        self.fleets = set()
+
+        query = parse_qs(self.scope.get("query_string", b"").decode())
+        self.rate = self.parse_rate(query.get("rate", [None])[0])
+        try:
+            self.bbox = BoundingBox.parse(query["bbox"][0]) if "bbox" in query else None
+        except ValueError:
+            self.bbox = None
+        self.livreur_ids.update(query.get("livreur", []))
+        self.fleets.update(query.get("flotte", []))
+
+        subprotocol = None
+        self.encoder = None
+        if BINARY_SUBPROTOCOL in self.scope.get("subprotocols", []):
+            subprotocol = BINARY_SUBPROTOCOL
+            self.encoder = BinaryEncoder()
+        elif query.get("format", [None])[0] == "binary":
+            self.encoder = BinaryEncoder()
+
+        try:
+            since = int(query["since"][0]) if "since" in query else None
+        except ValueError:
+            since = None
+        snapshot = query.get("snapshot", ["true"])[0].lower() not in ("0", "false")
+
+        # Les groupes sont rejoints avant de lire l'état initial : une mise à
+        # jour publiée entre-temps est reçue en direct, jamais perdue
+        await self.set_bbox(self.bbox)
+        await self.accept(subprotocol)
+        self.connected = True
+        if metrics.ENABLED:
+            metrics.websocket_connections.inc()
+        await self.send_initial_state(since, snapshot)
+
+    async def send_initial_state(self, since, snapshot):
+        """Envoie les mises à jour manquées depuis `since`, sinon un instantané
+        des dernières positions, lus dans latest_positions (communs à tous
+        les workers)"""
+        positions = await AsyncLatestPosition.updated_since(since) if since is not None else None
+        if positions is not None:
+            kind = "replay"
+            seq = max((p["seq"] for p in positions), default=since)
+        elif snapshot:
+            kind = "snapshot"
+            positions = await AsyncLatestPosition.load_all()
+            seq = max((p.get("seq") or 0 for p in positions), default=0)
+        else:
+            return
+        await self.send_state(kind, seq, positions)
+
+    async def send_viewport_snapshot(self):
+        """Instantané des livreurs de la nouvelle zone : ceux qui n'ont pas
+        bougé depuis ne seraient sinon jamais affichés"""
+        positions = await AsyncLatestPosition.within(self.bbox)
+        seq = max((p.get("seq") or 0 for p in positions), default=0)
+        await self.send_state("snapshot", seq, positions)
+
+    async def send_state(self, kind, seq, positions):
+        """Envoie un instantané ou un rejeu, limité à ce que suit le client"""
+        fleets = {}
+        if self.fleets and positions:
+            fleets = await AsyncLivreur.get_fleets([p["livreur_id"] for p in positions])
+        payloads = [position_payload(p, fleets.get(p["livreur_id"])) for p in positions]
+        payloads = [p for p in payloads if self.wants(p)]
+        if self.encoder is None:
+            await self.send(text_data=dumps({"type": kind, "seq": seq, "positions": payloads}))
+            return
+        await self.send(text_data=dumps({"type": kind, "seq": seq, "count": len(payloads)}))
+        if payloads:
+            await self.send_positions(payloads)
 
     async def disconnect(self, close_code):
-        await self.channel_layer.group_discard(
-            "tracking_updates",
-            self.channel_name
+        if metrics.ENABLED and getattr(self, "connected", False):
+            metrics.websocket_connections.dec()
+            self.connected = False
+        if self.flush_task:
+            self.flush_task.cancel()
+        await self.subscribe_groups(set())
+
+    async def send(self, text_data=None, bytes_data=None, close=False):
+        if not metrics.ENABLED:
+            await super().send(text_data, bytes_data, close)
+            return
+        started = time.perf_counter()
+        await super().send(text_data, bytes_data, close)
+        metrics.websocket_send_duration.observe(
+            time.perf_counter() - started, "text" if bytes_data is None else "binary"
         )
 
+    async def receive(self, text_data=None, bytes_data=None):
+        try:
+            message = json.loads(text_data or "")
+        except ValueError:
+            return
+        if not isinstance(message, dict):
+            return
+
+        action = message.get("action")
+        if action == "set_rate":
+            self.rate = self.parse_rate(message.get("rate"))
+            if self.rate == 0:
+                await self.flush()
+        elif action == "subscribe_bbox":
+            try:
+                bbox = BoundingBox.parse(message.get("bbox"))
+            except ValueError as e:
+                await self.send(text_data=json.dumps({"error": str(e)}))
+                return
+            await self.set_bbox(bbox)
+            await self.send_viewport_snapshot()
+        elif action == "clear_bbox":
+            await self.set_bbox(None)
+        elif action in ("subscribe", "unsubscribe"):
+            livreur_id = message.get("livreur_id")
+            fleet = message.get("flotte")
+            if not isinstance(livreur_id, str) and not isinstance(fleet, str):
+                await self.send(text_data=json.dumps({"error": "Champ 'livreur_id' ou 'flotte' attendu"}))
+                return
+            update = set.add if action == "subscribe" else set.discard
+            if isinstance(livreur_id, str):
+                update(self.livreur_ids, livreur_id)
+            if isinstance(fleet, str):
+                update(self.fleets, fleet)
+            await self.refresh_groups()
+
+    async def set_bbox(self, bbox):
+        """Abonne le client aux cellules de la grille qui couvrent sa zone ;
+        une zone trop étendue revient au flux complet"""
+        self.bbox = bbox
+        self.cell_groups = None
+        if bbox is not None:
+            max_cells = getattr(settings, 'TRACKING_WS_MAX_VIEWPORT_CELLS', 64)
+            self.cell_groups = bbox_groups(bbox, max_cells)
+        await self.refresh_groups()
+
+    async def refresh_groups(self):
+        topic_groups = {livreur_group(livreur_id) for livreur_id in self.livreur_ids}
+        topic_groups |= {fleet_group(fleet) for fleet in self.fleets}
+
+        if self.cell_groups is not None:
+            view_groups = self.cell_groups
+        elif self.bbox is not None or not topic_groups:
+            view_groups = {TRACKING_GROUP}
+        else:
+            # Abonné à des livreurs ou à des flottes, sans zone : pas de flux complet
+            view_groups = set()
+
+        await self.subscribe_groups(view_groups | topic_groups)
+        # Les positions en attente qui ne concernent plus le client sont abandonnées
+        self.pending = {
+            livreur_id: position for livreur_id, position in self.pending.items()
+            if self.wants(position)
+        }
+
+    async def subscribe_groups(self, groups):
+        for group in self.groups - groups:
+            await self.channel_layer.group_discard(group, self.channel_name)
+        for group in groups - self.groups:
+            await self.channel_layer.group_add(group, self.channel_name)
+        self.groups = set(groups)
+
+    def wants(self, position):
+        if position['livreur_id'] in self.livreur_ids or position.get('flotte') in self.fleets:
+            return True
+        if self.bbox is not None:
+            # Les cellules débordent de la zone : filtrage exact sur ses limites
+            return self.bbox.contains(position['latitude'], position['longitude'])
+        return not (self.livreur_ids or self.fleets)
+
+    def parse_rate(self, value):
+        """Borne la fréquence demandée par le client (en Hz)"""
+        default_rate = getattr(settings, 'TRACKING_WS_DEFAULT_RATE', 2)
+        max_rate = getattr(settings, 'TRACKING_WS_MAX_RATE', 10)
+        try:
+            rate = float(value)
+        except (TypeError, ValueError):
+            return default_rate
+        if rate <= 0:
+            return 0
+        return min(rate, max_rate)
+
     async def position_update(self, event):
-        # Envoie la mise à jour au client
-        await self.send(text_data=json.dumps({
+        if not self.wants(event):
+            return
+        if self.rate == 0 and self.encoder:
+            await self.send_positions([event])
+            return
+        if self.rate == 0:
+            # Envoie la mise à jour au client
+            await self.send(text_data=dumps(self.client_position(event)))
+            return
+        self.conflate([event])
+
+    async def positions_batch(self, event):
+        positions = [position for position in event['positions'] if self.wants(position)]
+        if not positions:
+            return
+        if self.rate == 0:
+            # Un lot de positions est envoyé au client en une seule trame
+            await self.send_positions(positions)
+            return
+        self.conflate(positions)
+
+    @staticmethod
+    def client_position(event):
+        position = {
             'livreur_id': event['livreur_id'],
             'latitude': event['latitude'],
             'longitude': event['longitude'],
             'timestamp': event['timestamp'],
-        }, cls=MongoJSONEncoder))
\ No newline at end of file
+        }
+        # `flotte` reste dans les positions en attente : `wants` en a besoin
+        # lorsque les abonnements du client changent avant l'envoi
+        for field in ('seq', 'flotte'):
+            if field in event:
+                position[field] = event[field]
+        return position
+
+    def conflate(self, positions):
+        # Un client lent ne garde que la dernière position de chaque livreur :
+        # la mémoire par connexion reste bornée par le nombre de livreurs.
+        for position in positions:
+            current = self.pending.get(position['livreur_id'])
+            if current is None or current['timestamp'] <= position['timestamp']:
+                self.pending[position['livreur_id']] = self.client_position(position)
+        if self.flush_task is None or self.flush_task.done():
+            self.flush_task = asyncio.create_task(self.flush_after_delay())
+
+    async def flush_after_delay(self):
+        if self.rate:
+            await asyncio.sleep(1 / self.rate)
+        await self.flush()
+
+    async def flush(self):
+        if not self.pending:
+            return
+        positions = list(self.pending.values())
+        self.pending = {}
+        await self.send_positions(positions)
+
+    async def send_positions(self, positions):
+        """Envoie un lot de positions : tableau JSON, ou trames binaires"""
+        if self.encoder is None:
+            await self.send(text_data=dumps(positions))
+            return
+        for frame in self.encoder.encode(positions):
+            await self.send(bytes_data=frame)
@@ -0,0 +1,74 @@
+# tracking/encoding.py
+"""Encodage JSON des documents MongoDB, partagé par l'API et le WebSocket.
+
+Les réponses sont encodées en une seule passe (datetime et ObjectId sont
+convertis par l'encodeur). Les grandes listes sont diffusées par morceaux
+avec StreamingHttpResponse, en tableau JSON ou en NDJSON
+(`Accept: application/x-ndjson` ou `?format=ndjson`), sans construire tout
+le corps en mémoire.
+"""
+import json
+from itertools import islice
+from datetime import datetime
+from bson import ObjectId
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
+
+NDJSON_CONTENT_TYPE = "application/x-ndjson"
+
+
+# Classe pour encoder les types MongoDB en JSON
+class MongoJSONEncoder(json.JSONEncoder):
+    def default(self, obj):
+        if isinstance(obj, ObjectId):
+            return str(obj)
+        if isinstance(obj, datetime):
+            return obj.isoformat()
+        return super().default(obj)
+
+# L'encodeur n'a pas d'état : une seule instance sert à tous les appels
+_encoder = MongoJSONEncoder()
+
+def dumps(data):
+    return _encoder.encode(data)
+
+# Fonction helper pour renvoyer des réponses JSON
+def mongo_json_response(data, **kwargs):
+    return JsonResponse(data, encoder=MongoJSONEncoder, **kwargs)
+
+def wants_ndjson(request):
+    return (request.GET.get('format') == 'ndjson'
+            or NDJSON_CONTENT_TYPE in request.headers.get('Accept', ''))
+
+def batched(items, size):
+    iterator = iter(items)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+def iter_json_chunks(items, ndjson=False, chunk_size=None):
+    """Encode `items` (liste, curseur ou générateur) en morceaux d'octets :
+    un tableau JSON, ou une ligne par élément en NDJSON"""
+    chunk_size = chunk_size or getattr(settings, 'TRACKING_STREAM_CHUNK_SIZE', 500)
+    if ndjson:
+        for chunk in batched(items, chunk_size):
+            yield "".join(dumps(item) + "\n" for item in chunk).encode()
+        return
+    yield b"["
+    prefix = ""
+    for chunk in batched(items, chunk_size):
+        yield (prefix + ", ".join(dumps(item) for item in chunk)).encode()
+        prefix = ", "
+    yield b"]"
+
+def streaming_json_response(request, items, wrap=None, **kwargs):
+    """Réponse diffusée par morceaux ; `wrap` transforme l'itérateur de
+    morceaux (par exemple en itérateur asynchrone pour les vues ASGI)"""
+    ndjson = wants_ndjson(request)
+    chunks = iter_json_chunks(items, ndjson)
+    if wrap is not None:
+        chunks = wrap(chunks)
+    content_type = NDJSON_CONTENT_TYPE if ndjson else "application/json"
+    return StreamingHttpResponse(chunks, content_type=content_type, **kwargs)
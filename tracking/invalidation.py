@@ -0,0 +1,93 @@
+# tracking/invalidation.py
+"""Invalidation du cache des livreurs entre workers, via le channel layer.
+
+Une écriture sur un livreur publie son identifiant dans le groupe
+DRIVER_CACHE_GROUP ; chaque processus écoute ce groupe depuis un thread
+dédié (avec sa propre boucle asyncio) et retire l'entrée de son cache. Si le
+channel layer est indisponible, l'expiration du cache borne le retard.
+"""
+import asyncio
+import logging
+import threading
+import uuid
+from asgiref.sync import async_to_sync
+from channels.layers import InMemoryChannelLayer, get_channel_layer
+
+DRIVER_CACHE_GROUP = "tracking_driver_cache"
+# Les groupes du channel layer expirent : l'abonnement est renouvelé régulièrement
+GROUP_REFRESH_INTERVAL = 3600
+
+# Identifie le processus pour ignorer ses propres messages
+ORIGIN = uuid.uuid4().hex
+
+logger = logging.getLogger(__name__)
+
+_listener = None
+_listener_lock = threading.Lock()
+remote_invalidations = 0
+
+
+def shared_channel_layer():
+    """Channel layer commun aux workers, ou None (la couche en mémoire est
+    propre au processus : il n'y a alors pas d'autre worker à prévenir)"""
+    channel_layer = get_channel_layer()
+    if channel_layer is None or isinstance(channel_layer, InMemoryChannelLayer):
+        return None
+    return channel_layer
+
+
+def publish_invalidation(livreur_id):
+    channel_layer = shared_channel_layer()
+    if channel_layer is None:
+        return
+    try:
+        async_to_sync(channel_layer.group_send)(DRIVER_CACHE_GROUP, {
+            "type": "driver.invalidate",
+            "livreur_id": livreur_id,
+            "origin": ORIGIN,
+        })
+    except Exception:
+        logger.exception("Échec de la diffusion de l'invalidation du livreur %s", livreur_id)
+
+
+def start_listener(cache):
+    """Démarre (une fois par processus) l'écoute des invalidations"""
+    global _listener
+    if shared_channel_layer() is None:
+        return
+    with _listener_lock:
+        if _listener is None:
+            _listener = threading.Thread(
+                target=lambda: asyncio.run(receive_invalidations(cache)),
+                name="tracking-driver-cache",
+                daemon=True,
+            )
+            _listener.start()
+
+
+async def receive_invalidations(cache):
+    global remote_invalidations
+    channel_layer = get_channel_layer()
+    channel = None
+    loop = asyncio.get_running_loop()
+    joined_at = None
+    while True:
+        try:
+            if channel is None:
+                channel = await channel_layer.new_channel()
+            if joined_at is None or loop.time() - joined_at > GROUP_REFRESH_INTERVAL:
+                await channel_layer.group_add(DRIVER_CACHE_GROUP, channel)
+                joined_at = loop.time()
+            message = await asyncio.wait_for(channel_layer.receive(channel), GROUP_REFRESH_INTERVAL)
+        except asyncio.TimeoutError:
+            continue
+        except Exception:
+            logger.exception("Écoute des invalidations du cache des livreurs interrompue")
+            # Des messages ont pu être perdus : repartir d'un cache vide
+            cache.invalidate()
+            joined_at = None
+            await asyncio.sleep(1)
+            continue
+        if message.get("origin") != ORIGIN:
+            remote_invalidations += 1
+            cache.invalidate(message.get("livreur_id"))
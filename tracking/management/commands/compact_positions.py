@@ -0,0 +1,26 @@
+# tracking/management/commands/compact_positions.py
+from django.core.management.base import BaseCommand
+from tracking.retention import compact
+
+
+class Command(BaseCommand):
+    help = "Compacte l'historique ancien (position par minute, puis résumé journalier) et purge les paliers expirés"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-chunks', type=int, default=None,
+                            help="Nombre maximal de morceaux (livreur, jour) traités par exécution")
+        parser.add_argument('--pause', type=float, default=0.0,
+                            help="Pause en secondes entre deux morceaux pour limiter la charge")
+
+    def handle(self, *args, **options):
+        report = compact(
+            max_chunks=options['max_chunks'],
+            pause=options['pause'],
+            log=self.stdout.write,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"{report['chunks']} morceaux compactés ({report['positions']} positions brutes), "
+            f"{report['minute_deleted']} positions par minute purgées"
+        ))
+        if not report['complete']:
+            self.stdout.write("Compactage incomplet : relancer la commande pour continuer")
@@ -0,0 +1,12 @@
+# tracking/management/commands/ensure_indexes.py
+from django.core.management.base import BaseCommand
+from tracking.mongodb import ensure_indexes
+
+
+class Command(BaseCommand):
+    help = "Crée les index MongoDB nécessaires au suivi (sans effet s'ils existent déjà)"
+
+    def handle(self, *args, **options):
+        for collection, index in ensure_indexes():
+            self.stdout.write(f"{collection}: {index}")
+        self.stdout.write(self.style.SUCCESS("Index à jour"))
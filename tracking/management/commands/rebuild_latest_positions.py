@@ -0,0 +1,12 @@
+# tracking/management/commands/rebuild_latest_positions.py
+from django.core.management.base import BaseCommand
+from tracking.models import LatestPosition
+
+
+class Command(BaseCommand):
+    help = "Recalcule la collection latest_positions à partir de l'historique des positions"
+
+    def handle(self, *args, **options):
+        self.stdout.write("Recalcul des dernières positions...")
+        count = LatestPosition.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"{count} livreurs dans latest_positions"))
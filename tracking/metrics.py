@@ -0,0 +1,191 @@
+# tracking/metrics.py
+"""Métriques au format d'exposition Prometheus.
+
+Registre minimal, propre à chaque processus (compteurs, jauges,
+histogrammes), exposé sur /metrics ; Prometheus agrège ensuite les workers.
+Désactivé par défaut (TRACKING_METRICS = False) : le middleware se retire
+alors de la chaîne, l'écouteur de commandes PyMongo n'est pas enregistré et
+les autres points de mesure se réduisent à un test de booléen.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from django.conf import settings
+
+ENABLED = getattr(settings, 'TRACKING_METRICS', False)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Bornes des histogrammes, en secondes et en octets
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (100, 1000, 10000, 100000, 1000000, 10000000)
+
+REGISTRY = []
+
+
+def escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_labels(names, values, extra=""):
+    labels = [f'{name}="{escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        labels.append(extra)
+    return "{" + ",".join(labels) + "}" if labels else ""
+
+
+def format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def samples(self):
+        """Couples (suffixe et étiquettes, valeur) à exposer"""
+        with self._lock:
+            return [(format_labels(self.labelnames, labels), value) for labels, value in self._values.items()]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines += [f"{self.name}{labels} {format_value(value)}" for labels, value in self.samples()]
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(Metric):
+    """Jauge mise à jour par le code, ou lue à l'exposition via `callback`
+    (fonction retournant {étiquettes: valeur})"""
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labelnames=(), callback=None):
+        super().__init__(name, documentation, labelnames)
+        self.callback = callback
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, value, *labels):
+        with self._lock:
+            self._values[labels] = value
+
+    def samples(self):
+        if self.callback is None:
+            return super().samples()
+        return [(format_labels(self.labelnames, labels), value) for labels, value in self.callback().items()]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                # Effectifs par intervalle (le dernier au-delà de la plus
+                # grande borne), somme et nombre d'observations
+                state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, *labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labels)
+
+    def render(self):
+        with self._lock:
+            values = [(labels, list(counts), total, count) for labels, (counts, total, count) in self._values.items()]
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for labels, counts, total, count in values:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = format_labels(self.labelnames, labels, f'le="{format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            suffix = format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{suffix} {format_value(total)}")
+            lines.append(f"{self.name}_count{suffix} {count}")
+        return lines
+
+
+def render():
+    """Toutes les métriques du processus, au format texte de Prometheus"""
+    lines = []
+    for metric in REGISTRY:
+        lines += metric.render()
+    return "\n".join(lines) + "\n"
+
+
+def mongo_pool_connections():
+    from .mongodb import pool_stats
+    snapshot = pool_stats.snapshot()
+    return {("open",): snapshot["open"], ("in_use",): snapshot["in_use"]}
+
+
+http_request_duration = Histogram(
+    "tracking_http_request_duration_seconds", "Durée de traitement des requêtes HTTP",
+    ("method", "route", "status"),
+)
+http_request_size = Histogram(
+    "tracking_http_request_size_bytes", "Taille du corps des requêtes HTTP",
+    ("method", "route"), SIZE_BUCKETS,
+)
+http_response_size = Histogram(
+    "tracking_http_response_size_bytes", "Taille du corps des réponses HTTP (hors réponses en flux)",
+    ("method", "route"), SIZE_BUCKETS,
+)
+mongo_command_duration = Histogram(
+    "tracking_mongodb_command_duration_seconds", "Durée des commandes MongoDB",
+    ("collection", "command"),
+)
+mongo_command_failures = Counter(
+    "tracking_mongodb_command_failures_total", "Commandes MongoDB en échec",
+    ("collection", "command"),
+)
+mongo_pool = Gauge(
+    "tracking_mongodb_pool_connections", "Connexions du pool MongoDB",
+    ("state",), callback=mongo_pool_connections,
+)
+channel_layer_send_duration = Histogram(
+    "tracking_channel_layer_send_duration_seconds", "Durée des envois au channel layer",
+    ("operation",),
+)
+websocket_send_duration = Histogram(
+    "tracking_websocket_send_duration_seconds", "Durée des envois aux clients WebSocket",
+    ("format",),
+)
+websocket_connections = Gauge(
+    "tracking_websocket_connections", "Connexions WebSocket ouvertes",
+)
@@ -0,0 +1,49 @@
+# tracking/middleware.py
+import time
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.core.exceptions import MiddlewareNotUsed
+from . import metrics
+
+
+class MetricsMiddleware:
+    """Durée, taille des requêtes et des réponses par route (TRACKING_METRICS).
+
+    La route est le motif d'URL résolu (ex. "api/livreurs/<str:livreur_id>/")
+    pour borner le nombre de séries. Pour une réponse en flux, la durée
+    s'arrête à l'envoi des en-têtes et la taille n'est pas mesurée. Sans
+    métriques, le middleware se retire de la chaîne au démarrage.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not metrics.ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        started = time.perf_counter()
+        response = self.get_response(request)
+        self.record(request, response, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        response = await self.get_response(request)
+        self.record(request, response, time.perf_counter() - started)
+        return response
+
+    @staticmethod
+    def record(request, response, duration):
+        match = request.resolver_match
+        route = match.route if match is not None else "unmatched"
+        method = request.method
+        metrics.http_request_duration.observe(duration, method, route, str(response.status_code))
+        metrics.http_request_size.observe(int(request.META.get("CONTENT_LENGTH") or 0), method, route)
+        if not response.streaming:
+            metrics.http_response_size.observe(len(response.content), method, route)
@@ -1,8 +1,146 @@
 # tracking/models.py
-from .mongodb import livreurs_collection, positions_collection
+from .mongodb import livreurs_collection, latest_positions_collection, counters_collection
+from .cache import DriverCache, LatestPositionCache
+from . import invalidation, mongodb, trips
+from .storage import get_position_storage
+from .buffer import PositionWriteBuffer, WriteBufferFull, run_steps
+from django.conf import settings
 import datetime
-import uuid
+import functools
+import logging
+import threading
 from bson import ObjectId
+from pymongo import ReplaceOne, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, WriteError
+
+logger = logging.getLogger(__name__)
+
+# Code d'erreur Mongo renvoyé lorsqu'un upsert heurte l'index unique
+DUPLICATE_KEY_ERROR = 11000
+
+_write_buffer = None
+_write_buffer_lock = threading.Lock()
+
+def get_write_buffer():
+    """Retourne le tampon d'écriture différée, ou None si ce mode est désactivé"""
+    global _write_buffer
+    if not getattr(settings, 'TRACKING_WRITE_BEHIND', False):
+        return None
+    with _write_buffer_lock:
+        if _write_buffer is None:
+            _write_buffer = PositionWriteBuffer(
+                functools.partial(Position.write_many, resumable=True),
+                max_size=getattr(settings, 'TRACKING_WRITE_BEHIND_MAX_SIZE', 10000),
+                batch_size=getattr(settings, 'TRACKING_WRITE_BEHIND_BATCH_SIZE', 500),
+                flush_interval=getattr(settings, 'TRACKING_WRITE_BEHIND_FLUSH_INTERVAL', 0.5),
+                max_attempts=getattr(settings, 'TRACKING_WRITE_BEHIND_MAX_ATTEMPTS', 8),
+            )
+    return _write_buffer
+
+_latest_index_lock = threading.Lock()
+_latest_index_db = None
+
+def ensure_latest_index():
+    """Crée au besoin l'index unique sur latest_positions.livreur_id, une fois
+    par processus (et par base) : sans lui, l'upsert conditionnel de
+    LatestPosition.upsert_many créerait un second document par livreur"""
+    global _latest_index_db
+    db = mongodb.get_db()
+    if _latest_index_db is db:
+        return
+    with _latest_index_lock:
+        if _latest_index_db is not db:
+            latest_positions_collection.create_index([("livreur_id", 1)], unique=True)
+            _latest_index_db = db
+
+def reserve_sequence(name, count):
+    """Réserve `count` numéros consécutifs du compteur `name` (un seul $inc) ;
+    retourne le premier"""
+    counter = counters_collection.find_one_and_update(
+        {"_id": name},
+        {"$inc": {"seq": count}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    return counter["seq"] - count + 1
+
+SYNC_COUNTER = "latest_positions"
+
+def begin_sync_write(count):
+    """Réserve `count` numéros sync_seq pour une écriture de latest_positions
+    et la déclare en cours ; retourne (premier numéro, jeton pour end_sync_write).
+
+    L'écriture en cours est inscrite sur le document du compteur avec une
+    borne inférieure de ses numéros (le compteur lu juste avant, qui ne fait
+    que croître) : changed_since ne distribue pas de curseur au-delà tant
+    qu'elle n'est pas terminée."""
+    counter = counters_collection.find_one({"_id": SYNC_COUNTER}, {"seq": 1})
+    token = ObjectId()
+    counter = counters_collection.find_one_and_update(
+        {"_id": SYNC_COUNTER},
+        {
+            "$inc": {"seq": count},
+            "$push": {"inflight": {
+                "token": token,
+                "first": (counter["seq"] if counter else 0) + 1,
+                "at": datetime.datetime.now(),
+            }},
+        },
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    return counter["seq"] - count + 1, token
+
+def end_sync_write(token):
+    counters_collection.update_one({"_id": SYNC_COUNTER}, {"$pull": {"inflight": {"token": token}}})
+
+def sync_watermark():
+    """Plus grand sync_seq sous lequel toutes les écritures de latest_positions
+    sont terminées. Une écriture en cours depuis plus de
+    TRACKING_SYNC_INFLIGHT_TIMEOUT secondes (worker arrêté en cours
+    d'écriture) n'est plus attendue."""
+    counter = counters_collection.find_one({"_id": SYNC_COUNTER})
+    if counter is None:
+        return 0
+    timeout = getattr(settings, 'TRACKING_SYNC_INFLIGHT_TIMEOUT', 30)
+    stale_before = datetime.datetime.now() - datetime.timedelta(seconds=timeout)
+    watermark = counter["seq"]
+    stale = False
+    for write in counter.get("inflight", []):
+        if write["at"] < stale_before:
+            stale = True
+        else:
+            watermark = min(watermark, write["first"] - 1)
+    if stale:
+        counters_collection.update_one(
+            {"_id": SYNC_COUNTER}, {"$pull": {"inflight": {"at": {"$lt": stale_before}}}}
+        )
+    return watermark
+
+def assign_sequence(positions):
+    """Numérote les positions dans l'ordre d'ingestion avec un compteur global
+    (un seul $inc par lot) ; retourne l'intervalle (premier, dernier)"""
+    first = reserve_sequence("positions", len(positions))
+    for offset, position in enumerate(positions):
+        position["seq"] = first + offset
+    return first, first + len(positions) - 1
+
+_driver_cache = None
+_driver_cache_lock = threading.Lock()
+
+def get_driver_cache():
+    """Cache des fiches livreurs du processus ; l'écoute des invalidations des
+    autres workers démarre avec lui (TRACKING_DRIVER_CACHE_INVALIDATION)"""
+    global _driver_cache
+    with _driver_cache_lock:
+        if _driver_cache is None:
+            _driver_cache = DriverCache(
+                max_size=getattr(settings, 'TRACKING_DRIVER_CACHE_SIZE', 10000),
+                ttl=getattr(settings, 'TRACKING_DRIVER_CACHE_TTL', 300),
+            )
+            if getattr(settings, 'TRACKING_DRIVER_CACHE_INVALIDATION', True):
+                invalidation.start_listener(_driver_cache)
+    return _driver_cache
 
 def sanitize_mongo_doc(doc):
     """Retire le champ _id et convertit les ObjectId en string"""
@@ -11,75 +149,425 @@ def sanitize_mongo_doc(doc):
     return doc
 
 class Livreur:
+    """Fiches livreurs, lues au travers du cache du processus (get_driver_cache)"""
+
     @staticmethod
-    def create(livreur_id, nom, telephone, actif=True):
+    def create(livreur_id, nom, telephone, actif=True, flotte=None):
         livreur = {
             "livreur_id": livreur_id,
             "nom": nom,
             "telephone": telephone,
             "actif": actif,
+            "flotte": flotte,
             "created_at": datetime.datetime.now()
         }
         result = livreurs_collection.insert_one(livreur)
+        Livreur.invalidate(livreur_id)
         return sanitize_mongo_doc(livreur)
     
     @staticmethod
     def get_all():
-        livreurs = list(livreurs_collection.find({}))
-        return [sanitize_mongo_doc(doc) for doc in livreurs]
+        return [dict(livreur) for livreur in Livreur.iter_all()]
+
+    @staticmethod
+    def iter_all(batch_size=500):
+        """Parcourt les livreurs sans charger toute la collection en mémoire ;
+        la liste est mise en cache si elle tient dans le cache"""
+        cache = get_driver_cache()
+        cached = cache.get_all()
+        if cached is not None:
+            yield from cached
+            return
+        generation = cache.generation
+        livreurs = []
+        for livreur in livreurs_collection.find({}, {"_id": 0}).batch_size(batch_size):
+            if len(livreurs) <= cache.max_size:
+                livreurs.append(livreur)
+            yield livreur
+        cache.set_all(livreurs, generation)
     
     @staticmethod
     def get_by_id(livreur_id):
-        livreur = livreurs_collection.find_one({"livreur_id": livreur_id})
-        return sanitize_mongo_doc(livreur) if livreur else None
+        livreur = Livreur.get_many([livreur_id]).get(livreur_id)
+        return dict(livreur) if livreur else None
+
+    @staticmethod
+    def get_many(livreur_ids):
+        """Retourne {livreur_id: fiche ou None} ; seuls les livreurs absents du
+        cache sont lus dans Mongo, en une seule requête"""
+        cache = get_driver_cache()
+        livreurs, missing = cache.get_many(set(livreur_ids))
+        if missing:
+            generation = cache.generation
+            loaded = dict.fromkeys(missing)
+            for livreur in livreurs_collection.find({"livreur_id": {"$in": missing}}, {"_id": 0}):
+                loaded[livreur["livreur_id"]] = livreur
+            cache.put_many(loaded, generation)
+            livreurs.update(loaded)
+        return livreurs
     
+    @staticmethod
+    def get_fleets(livreur_ids):
+        """Retourne {livreur_id: flotte} pour les livreurs rattachés à une flotte"""
+        return {
+            livreur_id: livreur["flotte"]
+            for livreur_id, livreur in Livreur.get_many(livreur_ids).items()
+            if livreur and livreur.get("flotte")
+        }
+
     @staticmethod
     def update(livreur_id, data):
-        livreurs_collection.update_one(
+        livreur = livreurs_collection.find_one_and_update(
             {"livreur_id": livreur_id},
-            {"$set": data}
+            {"$set": data},
+            projection={"_id": 0},
+            return_document=ReturnDocument.AFTER
         )
-        return Livreur.get_by_id(livreur_id)
+        Livreur.invalidate(livreur_id)
+        return livreur
+
+    @staticmethod
+    def invalidate(livreur_id):
+        """Retire un livreur du cache de ce processus et des autres workers"""
+        get_driver_cache().invalidate(livreur_id)
+        if getattr(settings, 'TRACKING_DRIVER_CACHE_INVALIDATION', True):
+            invalidation.publish_invalidation(livreur_id)
 
 class Position:
     @staticmethod
-    def create(livreur_id, latitude, longitude):
-        position = {
-            "position_id": str(uuid.uuid4()),
+    def build(livreur_id, latitude, longitude, timestamp=None):
+        timestamp = timestamp or datetime.datetime.now()
+        # Mongo conserve les dates à la milliseconde près
+        timestamp = timestamp.replace(microsecond=timestamp.microsecond // 1000 * 1000)
+        return {
+            "position_id": get_position_storage().new_position_id(livreur_id, timestamp),
             "livreur_id": livreur_id,
             "latitude": float(latitude),
             "longitude": float(longitude),
-            "timestamp": datetime.datetime.now()
+            "timestamp": timestamp
         }
-        result = positions_collection.insert_one(position)
-        return sanitize_mongo_doc(position)
-    
+
     @staticmethod
-    def get_latest_positions():
-        # Agrégation pour obtenir la dernière position de chaque livreur
-        pipeline = [
-            {"$sort": {"timestamp": -1}},
-            {"$group": {
-                "_id": "$livreur_id",
-                "position_id": {"$first": "$position_id"},
-                "latitude": {"$first": "$latitude"},
-                "longitude": {"$first": "$longitude"},
-                "timestamp": {"$first": "$timestamp"}
-            }},
-            {"$project": {
-                "_id": 0,
-                "livreur_id": "$_id",
-                "position_id": 1,
-                "latitude": 1,
-                "longitude": 1,
-                "timestamp": 1
-            }}
+    def create(livreur_id, latitude, longitude, timestamp=None):
+        position = Position.build(livreur_id, latitude, longitude, timestamp)
+        assign_sequence([position])
+
+        write_buffer = get_write_buffer()
+        if write_buffer is not None:
+            if not write_buffer.put_many([dict(position)]):
+                raise WriteBufferFull("Tampon d'écriture plein")
+            LatestPosition.cache.update([position])
+            return position
+
+        errors = Position.write_many([position])
+        if errors:
+            raise WriteError(errors[0])
+        return position
+
+    @staticmethod
+    def create_many(points):
+        """Insère un lot de positions.
+
+        `points` est une liste de dicts (livreur_id, latitude, longitude,
+        timestamp optionnel). Retourne (positions, erreurs) où `erreurs`
+        associe l'index dans le lot au message d'erreur. En mode écriture
+        différée, le lot est placé dans le tampon et écrit plus tard.
+        """
+        positions = [
+            Position.build(p["livreur_id"], p["latitude"], p["longitude"], p.get("timestamp"))
+            for p in points
         ]
-        return list(positions_collection.aggregate(pipeline))
+        if not positions:
+            return positions, {}
+        assign_sequence(positions)
+
+        write_buffer = get_write_buffer()
+        if write_buffer is not None:
+            accepted = write_buffer.put_many([dict(p) for p in positions])
+            LatestPosition.cache.update(positions[:accepted])
+            errors = {index: "Tampon d'écriture plein" for index in range(accepted, len(positions))}
+            return positions, errors
+
+        return positions, Position.write_many(positions)
+
+    @staticmethod
+    def write_many(positions, resumable=False):
+        """Écrit un lot dans le stockage de l'historique et met à jour les
+        statistiques de trajet et latest_positions ; retourne les erreurs
+        indexées par position dans le lot.
+
+        Avec `resumable`, l'échec d'une étape lève WriteInterrupted, qui
+        permet de reprendre à cette étape : l'historique déjà écrit n'est pas
+        réinséré et les statistiques ne sont pas comptées deux fois.
+        """
+        state = {}
+
+        def write_history():
+            state["errors"] = get_position_storage().insert_many(positions)
+            state["written"] = [p for i, p in enumerate(positions) if i not in state["errors"]]
+
+        def record_trips():
+            if getattr(settings, 'TRACKING_TRIP_STATS', True):
+                # Avant la mise à jour de latest_positions, qui donne la position précédente
+                trips.record(state["written"])
+
+        def update_latest():
+            LatestPosition.upsert_many(state["written"])
+
+        steps = [write_history, record_trips, update_latest]
+        if resumable:
+            return run_steps(steps, lambda: state["errors"])
+        for step in steps:
+            step()
+        return state["errors"]
+
+    @staticmethod
+    def get_latest_positions():
+        return LatestPosition.get_all()
+
+    @staticmethod
+    def get_changed_positions(since):
+        return LatestPosition.changed_since(since)
     
     @staticmethod
-    def get_livreur_positions(livreur_id, limit=100):
-        positions = positions_collection.find(
-            {"livreur_id": livreur_id}
-        ).sort("timestamp", -1).limit(limit)
-        return [sanitize_mongo_doc(doc) for doc in positions]
\ No newline at end of file
+    def get_livreur_positions(livreur_id, limit=100, start=None, end=None, after=None):
+        """Historique d'un livreur, du plus récent au plus ancien.
+
+        `start`/`end` bornent l'horodatage ; `after` est le couple
+        (timestamp, position_id) de la dernière position de la page
+        précédente. La pagination se fait par clé, jamais avec skip.
+
+        Au-delà de la limite de compactage, la lecture se poursuit dans le
+        palier à une position par minute (voir tracking/retention.py).
+        """
+        from .retention import compaction_boundary, minute_storage
+        positions = get_position_storage().find(livreur_id, limit, start, end, after)
+        boundary = compaction_boundary.get()
+        if boundary is None or len(positions) >= limit or (start is not None and start >= boundary):
+            return positions
+        older_end = boundary - datetime.timedelta(milliseconds=1)
+        if end is not None:
+            older_end = min(end, older_end)
+        return positions + minute_storage.find(livreur_id, limit - len(positions), start, older_end, after)
+
+    @staticmethod
+    def get_trip_stats(livreur_id, day):
+        return trips.get_trip_stats(livreur_id, day)
+
+    @staticmethod
+    def get_trip_stats_range(livreur_id, start, end):
+        return trips.get_trip_stats_range(livreur_id, start, end)
+
+    @staticmethod
+    def get_daily_summaries(livreur_id, start=None, end=None):
+        """Résumés journaliers de l'historique compacté, du plus récent au plus ancien"""
+        from .retention import get_daily_summaries
+        return get_daily_summaries(livreur_id, start, end)
+
+# Champs internes de latest_positions, jamais renvoyés aux clients
+PROJECTION = {"_id": 0, "location": 0, "sync_seq": 0, "updated_at": 0}
+
+class LatestPosition:
+    """Dernière position de chaque livreur, matérialisée dans `latest_positions`.
+
+    Le document d'un livreur est mis à jour (upsert) à chaque ingestion, ce qui
+    évite d'agréger tout l'historique de `positions` à chaque lecture.
+
+    `seq` est le numéro attribué à l'ingestion (flux WebSocket) ; `sync_seq`
+    est attribué au moment de l'écriture du document (begin_sync_write) et
+    sert de curseur à changed_since : une position restée dans le tampon
+    d'écriture reçoit un numéro supérieur aux curseurs déjà distribués.
+    """
+    FIELDS = ("livreur_id", "position_id", "latitude", "longitude", "timestamp", "seq")
+
+    cache = LatestPositionCache(ttl=getattr(settings, 'TRACKING_LATEST_CACHE_TTL', 2))
+
+    @staticmethod
+    def upsert_many(positions):
+        # Ne garder que la position la plus récente de chaque livreur du lot
+        latest = {}
+        for position in positions:
+            current = latest.get(position["livreur_id"])
+            if current is None or current["timestamp"] <= position["timestamp"]:
+                latest[position["livreur_id"]] = position
+        if not latest:
+            return
+
+        # Le filtre sur timestamp empêche un point ancien d'écraser un point
+        # plus récent ; l'upsert échoue alors sur l'index unique.
+        ensure_latest_index()
+        first, token = begin_sync_write(len(latest))
+        try:
+            LatestPosition.write_latest(latest, first)
+        finally:
+            end_sync_write(token)
+        LatestPosition.cache.update(
+            {field: position[field] for field in LatestPosition.FIELDS}
+            for position in latest.values()
+        )
+
+    @staticmethod
+    def write_latest(latest, first):
+        """Upsert conditionnel des positions `latest` ({livreur_id: position}),
+        numérotées (sync_seq) à partir de `first`"""
+        updated_at = datetime.datetime.now()
+        operations = [
+            (
+                {"livreur_id": livreur_id, "timestamp": {"$lte": position["timestamp"]}},
+                {"$set": {
+                    **{field: position[field] for field in LatestPosition.FIELDS},
+                    # Point GeoJSON pour l'index 2dsphere (recherche de proximité de secours)
+                    "location": {"type": "Point", "coordinates": [position["longitude"], position["latitude"]]},
+                    "sync_seq": first + offset,
+                    "updated_at": updated_at,
+                }},
+            )
+            for offset, (livreur_id, position) in enumerate(latest.items())
+        ]
+        try:
+            latest_positions_collection.bulk_write(
+                [UpdateOne(query, update, upsert=True) for query, update in operations], ordered=False
+            )
+        except BulkWriteError as e:
+            if e.details.get("writeConcernErrors"):
+                raise
+            write_errors = e.details.get("writeErrors", [])
+            duplicates = [err for err in write_errors if err.get("code") == DUPLICATE_KEY_ERROR]
+            for err in write_errors:
+                if err.get("code") != DUPLICATE_KEY_ERROR:
+                    # Les autres positions du lot (ordered=False) sont écrites :
+                    # lever ferait rejouer tout le lot sans fin
+                    logger.error("latest_positions : position de %s ignorée (%s)",
+                                 operations[err["index"]][0]["livreur_id"], err.get("errmsg"))
+            # Le document du livreur existe déjà : il est plus récent, ou un lot
+            # concurrent vient de le créer. La mise à jour conditionnelle est
+            # rejouée sans upsert et ne s'applique que si la position est plus récente.
+            if duplicates:
+                latest_positions_collection.bulk_write(
+                    [UpdateOne(*operations[err["index"]]) for err in duplicates], ordered=False
+                )
+
+    @staticmethod
+    def load_all():
+        return list(latest_positions_collection.find({}, PROJECTION))
+
+    @staticmethod
+    def updated_since(seq):
+        """Dernières positions de numéro (`seq`) supérieur à `seq`, rejouées à un
+        client WebSocket qui se reconnecte ; None si ce numéro n'a pas encore
+        été attribué (client d'une autre base) et qu'un instantané s'impose"""
+        counter = counters_collection.find_one({"_id": "positions"})
+        if seq > (counter["seq"] if counter else 0):
+            return None
+        return list(latest_positions_collection.find({"seq": {"$gt": seq}}, PROJECTION).sort("seq", 1))
+
+    @staticmethod
+    def changed_since(cursor):
+        """Dernières positions écrites après le curseur `cursor` (sync_seq),
+        dans l'ordre d'écriture, et le curseur de l'appel suivant.
+
+        Entre la réservation de son numéro et son écriture, une mise à jour
+        peut être dépassée par celle d'un autre worker : la lecture s'arrête
+        donc au plus petit numéro encore en cours d'écriture (sync_watermark),
+        et les suivantes sont lues à l'appel suivant.
+        """
+        # Le seuil est lu avant les positions : tout ce qui est en dessous est écrit
+        watermark = sync_watermark()
+        if watermark <= cursor:
+            return [], cursor
+        positions = list(latest_positions_collection.find(
+            {"sync_seq": {"$gt": cursor, "$lte": watermark}}, PROJECTION
+        ).sort("sync_seq", 1))
+        return positions, watermark
+
+    @staticmethod
+    def get_all():
+        return LatestPosition.cache.get_all(LatestPosition.changed_since)
+
+    @staticmethod
+    def nearby(latitude, longitude, radius, k=10, max_age=None):
+        """Livreurs à moins de `radius` mètres d'un point, les plus proches
+        d'abord ; chaque position porte sa `distance` en mètres.
+
+        Servi par l'index spatial en mémoire, ou par l'index 2dsphere de Mongo
+        si TRACKING_SPATIAL_INDEX est désactivé. `max_age` (secondes) écarte
+        les livreurs dont la dernière position est plus ancienne.
+        """
+        since = datetime.datetime.now() - datetime.timedelta(seconds=max_age) if max_age else None
+
+        if not getattr(settings, 'TRACKING_SPATIAL_INDEX', True):
+            stage = {
+                "near": {"type": "Point", "coordinates": [longitude, latitude]},
+                "distanceField": "distance",
+                "maxDistance": radius,
+                "spherical": True,
+            }
+            if since:
+                stage["query"] = {"timestamp": {"$gte": since}}
+            pipeline = [{"$geoNear": stage}, {"$limit": k}, {"$project": PROJECTION}]
+            return list(latest_positions_collection.aggregate(pipeline))
+
+        predicate = (lambda position: position["timestamp"] >= since) if since else None
+        results = LatestPosition.cache.nearby(
+            LatestPosition.changed_since, latitude, longitude, radius, k, predicate
+        )
+        return [{**position, "distance": distance} for distance, position in results]
+
+    @staticmethod
+    def within(bbox, max_age=None):
+        """Livreurs dont la dernière position est dans une zone (BoundingBox)"""
+        since = datetime.datetime.now() - datetime.timedelta(seconds=max_age) if max_age else None
+
+        if not getattr(settings, 'TRACKING_SPATIAL_INDEX', True):
+            rings = [
+                [[west, bbox.south], [east, bbox.south], [east, bbox.north], [west, bbox.north], [west, bbox.south]]
+                for west, east in bbox.longitude_ranges()
+            ]
+            query = {"$or": [
+                {"location": {"$geoWithin": {"$geometry": {"type": "Polygon", "coordinates": [ring]}}}}
+                for ring in rings
+            ]}
+            if since:
+                query["timestamp"] = {"$gte": since}
+            return list(latest_positions_collection.find(query, PROJECTION))
+
+        predicate = (lambda position: position["timestamp"] >= since) if since else None
+        return LatestPosition.cache.within(LatestPosition.changed_since, bbox, predicate)
+
+    @staticmethod
+    def rebuild(chunk_size=1000):
+        """Recalcule entièrement `latest_positions` à partir de l'historique ;
+        les positions reçoivent de nouveaux numéros de séquence"""
+        def write_chunk(positions):
+            assign_sequence(positions)
+            first, token = begin_sync_write(len(positions))
+            try:
+                write_rebuilt(positions, first)
+            finally:
+                end_sync_write(token)
+
+        def write_rebuilt(positions, first):
+            latest_positions_collection.bulk_write([
+                ReplaceOne(
+                    {"livreur_id": position["livreur_id"]},
+                    {
+                        **{field: position[field] for field in LatestPosition.FIELDS},
+                        "location": {"type": "Point", "coordinates": [position["longitude"], position["latitude"]]},
+                        "sync_seq": first + offset,
+                        "updated_at": datetime.datetime.now(),
+                    },
+                    upsert=True
+                )
+                for offset, position in enumerate(positions)
+            ], ordered=False)
+
+        chunk = []
+        for position in get_position_storage().latest_per_driver():
+            chunk.append(position)
+            if len(chunk) >= chunk_size:
+                write_chunk(chunk)
+                chunk = []
+        if chunk:
+            write_chunk(chunk)
+        LatestPosition.cache.invalidate()
+        return latest_positions_collection.count_documents({})
@@ -1,14 +1,224 @@
+# tracking/mongodb.py
+"""Connexion à MongoDB.
+
+Le client est créé à la première utilisation d'une collection, à partir des
+réglages TRACKING_MONGO_* : importer ce module (commandes manage.py, démarrage
+d'un worker) ne fait aucun accès réseau. Les index sont créés explicitement
+avec `python manage.py ensure_indexes`.
+"""
+import threading
+import time
+import pymongo
 from pymongo import MongoClient
+from pymongo.monitoring import CommandListener, ConnectionPoolListener
 from django.conf import settings
-import datetime
+from . import metrics
+
+
+class PoolStats(ConnectionPoolListener):
+    """Compteurs du pool de connexions, alimentés par les événements de PyMongo"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.created = 0
+        self.closed = 0
+        self.checked_out = 0
+        self.checkout_failures = 0
+        self.cleared = 0
+
+    def _add(self, counter, value=1):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + value)
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._add("cleared")
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self._add("created")
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._add("closed")
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        self._add("checkout_failures")
+
+    def connection_checked_out(self, event):
+        self._add("checked_out")
+
+    def connection_checked_in(self, event):
+        self._add("checked_out", -1)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "open": self.created - self.closed,
+                "in_use": self.checked_out,
+                "created": self.created,
+                "closed": self.closed,
+                "checkout_failures": self.checkout_failures,
+                "cleared": self.cleared,
+            }
+
+
+pool_stats = PoolStats()
+
+
+class CommandStats(CommandListener):
+    """Durée des commandes par collection et par opération (TRACKING_METRICS)"""
+
+    def __init__(self):
+        # Collection visée par chaque commande en cours ; seul l'événement
+        # de début porte le corps de la commande
+        self._collections = {}
+
+    @staticmethod
+    def collection(command_name, command):
+        if command_name == "getMore":
+            return command.get("collection", "")
+        target = command.get(command_name)
+        return target if isinstance(target, str) else ""
+
+    def started(self, event):
+        key = (event.connection_id, event.request_id)
+        self._collections[key] = self.collection(event.command_name, event.command)
+
+    def succeeded(self, event):
+        collection = self._collections.pop((event.connection_id, event.request_id), "")
+        metrics.mongo_command_duration.observe(event.duration_micros / 1e6, collection, event.command_name)
+
+    def failed(self, event):
+        collection = self._collections.pop((event.connection_id, event.request_id), "")
+        metrics.mongo_command_duration.observe(event.duration_micros / 1e6, collection, event.command_name)
+        metrics.mongo_command_failures.inc(collection, event.command_name)
+
+
+command_stats = CommandStats()
+
+_client = None
+_db = None
+_client_lock = threading.Lock()
+
+
+def client_options():
+    """Options du MongoClient, tirées des réglages TRACKING_MONGO_*"""
+    options = {
+        "maxPoolSize": getattr(settings, 'TRACKING_MONGO_MAX_POOL_SIZE', 100),
+        "minPoolSize": getattr(settings, 'TRACKING_MONGO_MIN_POOL_SIZE', 0),
+        "connectTimeoutMS": getattr(settings, 'TRACKING_MONGO_CONNECT_TIMEOUT_MS', 5000),
+        "serverSelectionTimeoutMS": getattr(settings, 'TRACKING_MONGO_SERVER_SELECTION_TIMEOUT_MS', 5000),
+        "socketTimeoutMS": getattr(settings, 'TRACKING_MONGO_SOCKET_TIMEOUT_MS', None),
+        "waitQueueTimeoutMS": getattr(settings, 'TRACKING_MONGO_WAIT_QUEUE_TIMEOUT_MS', None),
+        "readPreference": getattr(settings, 'TRACKING_MONGO_READ_PREFERENCE', 'primary'),
+        "w": getattr(settings, 'TRACKING_MONGO_WRITE_CONCERN', 1),
+        "appname": "livraison-gps",
+        "event_listeners": [pool_stats, command_stats] if metrics.ENABLED else [pool_stats],
+    }
+    return {key: value for key, value in options.items() if value is not None}
+
+
+def get_client():
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = MongoClient(
+                getattr(settings, 'TRACKING_MONGO_URI', 'mongodb://localhost:27017/'),
+                **client_options()
+            )
+        return _client
+
+
+def get_db():
+    global _db
+    if _db is None:
+        _db = get_client()[getattr(settings, 'TRACKING_MONGO_DB', 'livreurs_gps_db')]
+    return _db
+
+
+def set_client(client, db_name=None):
+    """Remplace le client (tests, bancs d'essai) ; None revient au client par défaut"""
+    global _client, _db
+    with _client_lock:
+        _client = client
+        _db = client[db_name or getattr(settings, 'TRACKING_MONGO_DB', 'livreurs_gps_db')] if client else None
+
+
+def ping():
+    """Aller-retour vers le serveur ; retourne la latence en millisecondes"""
+    started = time.perf_counter()
+    with pymongo.timeout(getattr(settings, 'TRACKING_MONGO_HEALTH_TIMEOUT_MS', 1000) / 1000):
+        get_client().admin.command("ping")
+    return round((time.perf_counter() - started) * 1000, 3)
+
+
+class LazyCollection:
+    """Collection résolue à la première utilisation, dans la base courante"""
+
+    def __init__(self, name):
+        self.name = name
+
+    def __getattr__(self, attribute):
+        return getattr(get_db()[self.name], attribute)
+
+    def __getitem__(self, key):
+        return get_db()[self.name][key]
+
+    def __repr__(self):
+        return f"LazyCollection({self.name!r})"
 
-# Connexion à MongoDB
-client = MongoClient('mongodb://localhost:27017/')
-db = client['livreurs_gps_db']  # Nom de votre base de données
 
 # Collections
-livreurs_collection = db['livreurs']
-positions_collection = db['positions']
+livreurs_collection = LazyCollection('livreurs')
+positions_collection = LazyCollection('positions')
+# Positions regroupées par livreur et par tranche de temps (TRACKING_POSITION_STORAGE = "buckets")
+position_buckets_collection = LazyCollection('position_buckets')
+# Dernière position connue de chaque livreur (un document par livreur)
+latest_positions_collection = LazyCollection('latest_positions')
+# Paliers de rétention : une position par minute, puis un résumé par livreur et par jour
+positions_minute_collection = LazyCollection('positions_minute')
+positions_daily_collection = LazyCollection('positions_daily')
+# Statistiques de trajet par livreur et par jour, tenues à jour à l'ingestion
+trip_stats_collection = LazyCollection('trip_stats')
+# Compteurs (numéro de séquence des mises à jour de positions)
+counters_collection = LazyCollection('counters')
+# Avancement du compactage de l'historique (tracking/retention.py)
+retention_state_collection = LazyCollection('retention_state')
+
+# Index nécessaires : (collection, clés, options)
+INDEXES = [
+    # position_id départage les positions de même horodatage pour la pagination par clé
+    (positions_collection, [("livreur_id", 1), ("timestamp", -1), ("position_id", -1)], {}),
+    (position_buckets_collection, [("livreur_id", 1), ("debut", -1)], {}),
+    (latest_positions_collection, [("livreur_id", 1)], {"unique": True}),
+    (latest_positions_collection, [("location", "2dsphere")], {}),
+    # Synchronisation incrémentale (?since=<sync_seq>)
+    (latest_positions_collection, [("sync_seq", 1)], {}),
+    # Rejeu WebSocket après une reconnexion (?since=<seq>)
+    (latest_positions_collection, [("seq", 1)], {}),
+    (positions_minute_collection, [("livreur_id", 1), ("timestamp", -1), ("position_id", -1)], {}),
+    (positions_daily_collection, [("livreur_id", 1), ("jour", -1)], {"unique": True}),
+    (trip_stats_collection, [("livreur_id", 1), ("jour", -1)], {}),
+    (livreurs_collection, [("livreur_id", 1)], {}),
+]
+
 
-# Création des index nécessaires
-positions_collection.create_index([("livreur_id", 1), ("timestamp", -1)])
\ No newline at end of file
+def ensure_indexes():
+    """Crée les index manquants ; retourne les noms des index, par collection"""
+    created = []
+    for collection, keys, options in INDEXES:
+        created.append((collection.name, collection.create_index(keys, **options)))
+    return created
@@ -0,0 +1,244 @@
+# tracking/retention.py
+"""Rétention et compactage de l'historique des positions.
+
+L'historique est conservé sur trois paliers :
+
+- pleine résolution pendant TRACKING_RETENTION_RAW_DAYS jours (stockage de
+  tracking/storage.py) ;
+- une position par livreur et par minute pendant
+  TRACKING_RETENTION_MINUTE_DAYS jours (`positions_minute`) ;
+- au-delà, un résumé par livreur et par jour (`positions_daily`) : nombre de
+  points, distance, temps actif et zone couverte.
+
+Le compactage avance jour par jour et livreur par livreur ; chaque morceau
+(livreur, jour) est écrit de façon idempotente avant la suppression des
+positions brutes, et l'avancement est enregistré dans `retention_state`. Une
+exécution interrompue reprend donc là où elle s'était arrêtée, et chaque
+opération ne touche qu'un petit volume de données à la fois.
+"""
+import datetime
+import threading
+import time
+from django.conf import settings
+from pymongo import UpdateOne
+from .mongodb import (
+    latest_positions_collection, positions_minute_collection,
+    positions_daily_collection, retention_state_collection,
+)
+from .spatial import haversine
+from .storage import DocumentStorage, get_position_storage
+
+# Un livreur est considéré actif entre deux positions s'il roule à plus de
+# ACTIVE_SPEED m/s et que l'écart entre elles ne dépasse pas MAX_ACTIVE_GAP
+ACTIVE_SPEED = 0.5
+MAX_ACTIVE_GAP = datetime.timedelta(minutes=5)
+# Deux positions à moins de MIN_SEGMENT_SECONDS d'écart ne forment pas un
+# segment : la suivante est mesurée depuis la première (le bruit GPS sur un
+# intervalle très court donne des vitesses absurdes). Un segment plus rapide
+# que MAX_SPEED m/s (saut GPS) n'est pas compté.
+MIN_SEGMENT_SECONDS = 1.0
+MAX_SPEED = 70.0
+
+STATE_ID = "positions"
+
+minute_storage = DocumentStorage(positions_minute_collection)
+
+
+def start_of_day(timestamp):
+    return datetime.datetime.combine(timestamp.date(), datetime.time())
+
+
+class CompactionBoundary:
+    """Date avant laquelle l'historique brut a été compacté, mise en cache
+    quelques secondes pour ne pas relire `retention_state` à chaque requête"""
+
+    def __init__(self, ttl=60):
+        self.ttl = ttl
+        self._value = None
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        with self._lock:
+            if self._loaded_at is not None and time.monotonic() - self._loaded_at < self.ttl:
+                return self._value
+        state = retention_state_collection.find_one({"_id": STATE_ID}) or {}
+        with self._lock:
+            self._value = state.get("compacted_until")
+            self._loaded_at = time.monotonic()
+            return self._value
+
+    def invalidate(self):
+        with self._lock:
+            self._loaded_at = None
+
+
+compaction_boundary = CompactionBoundary()
+
+
+def track_segment(previous, current):
+    """Bilan du trajet entre deux positions consécutives d'un livreur :
+    (distance en m, secondes actives, secondes inactives, vitesse en m/s si
+    actif). Au-delà de MAX_ACTIVE_GAP, le temps écoulé n'est pas compté ;
+    au-delà de MAX_SPEED, rien n'est compté. Retourne None si les positions
+    sont trop proches dans le temps : `current` est alors fusionnée avec
+    `previous`, qui reste le point de départ du segment suivant."""
+    elapsed = current["timestamp"] - previous["timestamp"]
+    seconds = elapsed.total_seconds()
+    if seconds < MIN_SEGMENT_SECONDS:
+        return None
+    step = haversine(previous["latitude"], previous["longitude"], current["latitude"], current["longitude"])
+    speed = step / seconds
+    if speed > MAX_SPEED:
+        return 0.0, 0.0, 0.0, None
+    if elapsed > MAX_ACTIVE_GAP:
+        return step, 0.0, 0.0, None
+    if speed >= ACTIVE_SPEED:
+        return step, seconds, 0.0, speed
+    return step, 0.0, seconds, None
+
+
+def summarize_track(positions):
+    """Résumé d'une suite de positions triées par date : nombre de points,
+    distance (m), temps actif et inactif (s), vitesse maximale (m/s),
+    première/dernière date et zone couverte"""
+    distance = 0.0
+    active_seconds = 0.0
+    idle_seconds = 0.0
+    max_speed = 0.0
+    previous = positions[0]
+    for current in positions[1:]:
+        segment = track_segment(previous, current)
+        if segment is None:
+            continue
+        previous = current
+        step, active, idle, speed = segment
+        distance += step
+        active_seconds += active
+        idle_seconds += idle
+        if speed is not None:
+            max_speed = max(max_speed, speed)
+    return {
+        "points": len(positions),
+        "distance": distance,
+        "duree_active": active_seconds,
+        "duree_inactive": idle_seconds,
+        "vitesse_max": max_speed,
+        "premier": positions[0]["timestamp"],
+        "dernier": positions[-1]["timestamp"],
+        "zone": {
+            "sud": min(p["latitude"] for p in positions),
+            "ouest": min(p["longitude"] for p in positions),
+            "nord": max(p["latitude"] for p in positions),
+            "est": max(p["longitude"] for p in positions),
+        },
+    }
+
+
+def downsample_per_minute(positions):
+    """Première position de chaque minute"""
+    kept = {}
+    for position in positions:
+        minute = position["timestamp"].replace(second=0, microsecond=0)
+        kept.setdefault(minute, position)
+    return list(kept.values())
+
+
+def compact_chunk(storage, livreur_id, day):
+    """Compacte les positions brutes d'un livreur pour une journée ; retourne
+    le nombre de positions brutes traitées (0 si la journée est déjà faite)"""
+    end = day + datetime.timedelta(days=1)
+    positions = list(storage.iter_range(livreur_id, day, end))
+    if not positions:
+        return 0
+
+    requests = [
+        UpdateOne(
+            {"livreur_id": livreur_id, "timestamp": p["timestamp"], "position_id": p["position_id"]},
+            {"$setOnInsert": p},
+            upsert=True
+        )
+        for p in downsample_per_minute(positions)
+    ]
+    positions_minute_collection.bulk_write(requests, ordered=False)
+    positions_daily_collection.update_one(
+        {"livreur_id": livreur_id, "jour": day},
+        {"$set": summarize_track(positions)},
+        upsert=True
+    )
+    storage.delete_range(livreur_id, day, end)
+    return len(positions)
+
+
+def compact(now=None, max_chunks=None, pause=0.0, log=None):
+    """Déplace l'historique brut trop ancien vers les paliers minute et jour,
+    puis purge le palier minute. Retourne un bilan des opérations.
+
+    `max_chunks` limite le nombre de morceaux (livreur, jour) traités par
+    exécution et `pause` (secondes) espace les morceaux pour laisser la base
+    à l'ingestion.
+    """
+    log = log or (lambda message: None)
+    raw_days = getattr(settings, 'TRACKING_RETENTION_RAW_DAYS', 7)
+    minute_days = getattr(settings, 'TRACKING_RETENTION_MINUTE_DAYS', 90)
+    now = now or datetime.datetime.now()
+    storage = get_position_storage()
+    raw_cutoff = start_of_day(now - datetime.timedelta(days=raw_days))
+    minute_cutoff = start_of_day(now - datetime.timedelta(days=minute_days))
+
+    state = retention_state_collection.find_one({"_id": STATE_ID}) or {}
+    livreur_ids = [doc["livreur_id"] for doc in latest_positions_collection.find({}, {"livreur_id": 1})]
+    report = {"chunks": 0, "positions": 0, "minute_deleted": 0, "complete": True}
+
+    day = state.get("compacted_until")
+    if day is None:
+        oldest = [t for t in (storage.oldest_timestamp(l) for l in livreur_ids) if t is not None]
+        day = start_of_day(min(oldest)) if oldest else raw_cutoff
+
+    while day < raw_cutoff:
+        log(f"Compactage du {day.date()}")
+        for livreur_id in livreur_ids:
+            if max_chunks is not None and report["chunks"] >= max_chunks:
+                report["complete"] = False
+                return report
+            count = compact_chunk(storage, livreur_id, day)
+            if count:
+                report["chunks"] += 1
+                report["positions"] += count
+                if pause:
+                    time.sleep(pause)
+        day += datetime.timedelta(days=1)
+        retention_state_collection.update_one(
+            {"_id": STATE_ID}, {"$set": {"compacted_until": day}}, upsert=True
+        )
+        compaction_boundary.invalidate()
+
+    # Purge du palier minute, une journée à la fois
+    purged_until = state.get("minute_purged_until")
+    if purged_until is None:
+        oldest = positions_minute_collection.find_one({}, sort=[("timestamp", 1)])
+        purged_until = start_of_day(oldest["timestamp"]) if oldest else minute_cutoff
+    while purged_until < minute_cutoff:
+        next_day = purged_until + datetime.timedelta(days=1)
+        report["minute_deleted"] += positions_minute_collection.delete_many(
+            {"timestamp": {"$lt": next_day}}
+        ).deleted_count
+        purged_until = next_day
+        retention_state_collection.update_one(
+            {"_id": STATE_ID}, {"$set": {"minute_purged_until": purged_until}}, upsert=True
+        )
+        if pause:
+            time.sleep(pause)
+    return report
+
+
+def get_daily_summaries(livreur_id, start=None, end=None):
+    query = {"livreur_id": livreur_id}
+    day_range = {}
+    if start is not None:
+        day_range["$gte"] = start_of_day(start)
+    if end is not None:
+        day_range["$lte"] = end
+    if day_range:
+        query["jour"] = day_range
+    return list(positions_daily_collection.find(query, {"_id": 0}).sort("jour", -1))
@@ -0,0 +1,102 @@
+# tracking/simplify.py
+"""Simplification des trajets (Douglas–Peucker) pour l'historique des livreurs."""
+import heapq
+import numpy as np
+from .spatial import METRES_PER_DEGREE
+
+
+def project(latitudes, longitudes):
+    """Projection équirectangulaire locale en mètres, suffisante à l'échelle d'une tournée"""
+    cos_latitude = np.cos(np.radians(latitudes.mean()))
+    return longitudes * METRES_PER_DEGREE * cos_latitude, latitudes * METRES_PER_DEGREE
+
+
+def point_importance(latitudes, longitudes, tolerance=0.0, max_points=None):
+    """Importance de chaque point selon Douglas–Peucker.
+
+    L'importance d'un point est l'écart (en mètres) à partir duquel
+    l'algorithme le conserve : garder les points d'importance supérieure à
+    une tolérance donne le tracé simplifié à cette tolérance, et garder les N
+    plus importants donne le tracé à N points. Les extrémités ont une
+    importance infinie.
+
+    Les segments sont découpés par ordre d'écart décroissant, et les
+    distances point-segment sont calculées en bloc pour chaque segment. Le
+    découpage s'arrête dès que l'écart maximal restant est inférieur à
+    `tolerance` ou que `max_points` points ont été retenus ; les points non
+    départagés gardent une importance nulle.
+    """
+    latitudes = np.asarray(latitudes, dtype=float)
+    longitudes = np.asarray(longitudes, dtype=float)
+    count = len(latitudes)
+    importance = np.zeros(count)
+    if count == 0:
+        return importance
+    importance[0] = importance[-1] = np.inf
+    if count < 3:
+        return importance
+
+    x, y = project(latitudes, longitudes)
+
+    def farthest(start, end):
+        """Point le plus éloigné du segment [start, end] et son écart"""
+        px, py = x[start + 1:end], y[start + 1:end]
+        sx, sy = x[end] - x[start], y[end] - y[start]
+        length = sx * sx + sy * sy
+        if length == 0:
+            # Segment de longueur nulle (retour au point de départ)
+            distances = np.hypot(px - x[start], py - y[start])
+        else:
+            t = np.clip(((px - x[start]) * sx + (py - y[start]) * sy) / length, 0.0, 1.0)
+            distances = np.hypot(px - (x[start] + t * sx), py - (y[start] + t * sy))
+        offset = int(np.argmax(distances))
+        return start + 1 + offset, float(distances[offset])
+
+    # Tas des segments à découper : (-écart, début, fin, point le plus éloigné)
+    split, distance = farthest(0, count - 1)
+    heap = [(-distance, 0, count - 1, split)]
+    selected = 2
+    while heap:
+        negative, start, end, split = heapq.heappop(heap)
+        distance = -negative
+        if distance <= tolerance or (max_points is not None and selected >= max_points):
+            break
+        importance[split] = distance
+        selected += 1
+        for child_start, child_end in ((start, split), (split, end)):
+            if child_end - child_start >= 2:
+                child_split, child_distance = farthest(child_start, child_end)
+                # Un point ne peut pas être plus important que celui qui a ouvert son segment
+                heapq.heappush(heap, (-min(child_distance, distance), child_start, child_end, child_split))
+
+    return importance
+
+
+def simplify_positions(positions, tolerance=None, max_points=None):
+    """Simplifie une liste ordonnée de positions.
+
+    `tolerance` (mètres) écarte les points qui s'écartent moins que cette
+    distance du tracé simplifié ; `max_points` limite le nombre de points
+    conservés aux plus significatifs. L'ordre des positions est préservé.
+    """
+    if len(positions) < 3 or (tolerance is None and max_points is None):
+        return positions
+
+    importance = point_importance(
+        [p["latitude"] for p in positions],
+        [p["longitude"] for p in positions],
+        tolerance=tolerance or 0.0,
+        max_points=max_points,
+    )
+    keep = np.ones(len(positions), dtype=bool)
+    if tolerance is not None:
+        keep &= importance > tolerance
+    if max_points is not None and keep.sum() > max_points:
+        threshold = np.sort(importance[keep])[-max_points]
+        keep &= importance >= threshold
+        # Départager les ex æquo au seuil en gardant les premiers
+        excess = int(keep.sum()) - max_points
+        if excess > 0:
+            ties = np.flatnonzero(keep & (importance == threshold))
+            keep[ties[len(ties) - excess:]] = False
+    return [position for position, kept in zip(positions, keep) if kept]
@@ -0,0 +1,211 @@
+# tracking/spatial.py
+"""Grille géographique utilisée pour router les positions par zone.
+
+La surface est découpée en cellules carrées (en degrés) à deux niveaux de
+finesse. Chaque cellule correspond à un groupe du channel layer : une
+position est publiée dans la cellule qui la contient à chaque niveau, et un
+client abonné à une zone rejoint les cellules qui couvrent sa vue au niveau
+le plus fin possible. Le channel layer sert ainsi d'index cellule → abonnés.
+Chaque niveau coûte un envoi par position : deux niveaux (une ville, une
+région) suffisent, le client filtre ensuite sur les limites exactes de sa vue.
+"""
+import heapq
+import math
+from collections import defaultdict, namedtuple
+
+# Taille des cellules (en degrés) de chaque niveau, du plus fin au plus grossier
+GRID_LEVELS = (0.04, 0.64)
+
+# Rayon moyen de la Terre et longueur d'un degré de latitude, en mètres
+EARTH_RADIUS = 6371000
+METRES_PER_DEGREE = math.pi * EARTH_RADIUS / 180
+
+
+def haversine(lat1, lng1, lat2, lng2):
+    """Distance orthodromique entre deux points, en mètres"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lng2 - lng1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS * math.asin(min(1.0, math.sqrt(a)))
+
+
+class BoundingBox(namedtuple("BoundingBox", "south west north east")):
+    """Zone rectangulaire ; west > east désigne une zone à cheval sur l'antiméridien"""
+
+    @classmethod
+    def parse(cls, value):
+        """Construit une zone à partir d'une liste [sud, ouest, nord, est] ou de
+        la chaîne "sud,ouest,nord,est" ; lève ValueError si elle est invalide"""
+        if isinstance(value, str):
+            value = value.split(",")
+        if not isinstance(value, (list, tuple)) or len(value) != 4:
+            raise ValueError("La zone doit contenir sud, ouest, nord et est")
+        try:
+            south, west, north, east = (float(v) for v in value)
+        except (TypeError, ValueError):
+            raise ValueError("Les limites de la zone doivent être numériques")
+        if not (-90 <= south <= north <= 90 and -180 <= west <= 180 and -180 <= east <= 180):
+            raise ValueError("Limites de zone invalides")
+        return cls(south, west, north, east)
+
+    def longitude_ranges(self):
+        if self.west <= self.east:
+            return [(self.west, self.east)]
+        return [(self.west, 180.0), (-180.0, self.east)]
+
+    def contains(self, latitude, longitude):
+        if not self.south <= latitude <= self.north:
+            return False
+        return any(west <= longitude <= east for west, east in self.longitude_ranges())
+
+
+def cell_index(size, value):
+    return math.floor(value / size)
+
+
+def cell_group(level, lat_index, lng_index):
+    return f"tracking_cell_{level}_{lat_index}_{lng_index}"
+
+
+def position_groups(latitude, longitude):
+    """Groupes des cellules contenant une position, un par niveau"""
+    return [
+        cell_group(level, cell_index(size, latitude), cell_index(size, longitude))
+        for level, size in enumerate(GRID_LEVELS)
+    ]
+
+
+def bbox_groups(bbox, max_cells):
+    """Groupes des cellules couvrant une zone, au niveau le plus fin qui en
+    utilise au plus `max_cells` ; None si même le niveau le plus grossier en
+    demande davantage"""
+    for level, size in enumerate(GRID_LEVELS):
+        lat_range = range(cell_index(size, bbox.south), cell_index(size, bbox.north) + 1)
+        lng_ranges = [
+            range(cell_index(size, west), cell_index(size, east) + 1)
+            for west, east in bbox.longitude_ranges()
+        ]
+        count = len(lat_range) * sum(len(r) for r in lng_ranges)
+        if count <= max_cells:
+            return {
+                cell_group(level, lat_index, lng_index)
+                for lat_index in lat_range
+                for lng_range in lng_ranges
+                for lng_index in lng_range
+            }
+    return None
+
+
+class SpatialIndex:
+    """Index en grille des dernières positions, une entrée par livreur.
+
+    Chaque position est rangée dans la cellule de `cell_size` degrés qui la
+    contient ; une mise à jour déplace le livreur d'une cellule à l'autre en
+    O(1). Les recherches de proximité parcourent les cellules en anneaux
+    autour du point demandé et s'arrêtent dès que les anneaux suivants ne
+    peuvent plus contenir de meilleur candidat. L'index n'est pas protégé
+    contre les accès concurrents : l'appelant le verrouille.
+    """
+
+    def __init__(self, cell_size=0.005):
+        self.cell_size = cell_size
+        self._cells = defaultdict(dict)
+        self._cell_of = {}
+
+    def __len__(self):
+        return len(self._cell_of)
+
+    def clear(self):
+        self._cells = defaultdict(dict)
+        self._cell_of = {}
+
+    def cell(self, latitude, longitude):
+        return cell_index(self.cell_size, latitude), cell_index(self.cell_size, longitude)
+
+    def update(self, position):
+        livreur_id = position["livreur_id"]
+        cell = self.cell(position["latitude"], position["longitude"])
+        previous = self._cell_of.get(livreur_id)
+        if previous is not None and previous != cell:
+            del self._cells[previous][livreur_id]
+            if not self._cells[previous]:
+                del self._cells[previous]
+        self._cells[cell][livreur_id] = position
+        self._cell_of[livreur_id] = cell
+
+    def nearby(self, latitude, longitude, radius, k=None, predicate=None):
+        """Positions à moins de `radius` mètres, les plus proches d'abord.
+
+        Retourne au plus `k` couples (distance en mètres, position) ;
+        `predicate` permet d'écarter des positions (ex. trop anciennes).
+        """
+        lat_cell, lng_cell = self.cell(latitude, longitude)
+        cell_height = self.cell_size * METRES_PER_DEGREE
+        max_lat_ring = math.ceil(radius / cell_height)
+        max_lng_ring = math.ceil(radius / max(self._cell_width(latitude, radius), 1e-9))
+
+        # Préfiltre par distance équirectangulaire (bien moins coûteuse que la
+        # formule haversine), avec une marge qui couvre son erreur d'approximation
+        cos_latitude = math.cos(math.radians(latitude))
+        margin = 1.05
+
+        # Tas des meilleurs candidats : (-distance, livreur_id, position)
+        best = []
+        for ring in range(max(max_lat_ring, max_lng_ring) + 1):
+            if k is not None and len(best) >= k and ring > 0:
+                # Distance minimale d'un point situé dans l'anneau `ring`
+                ring_distance = (ring - 1) * min(cell_height, self._cell_width(latitude, radius))
+                if ring_distance > -best[0][0]:
+                    break
+            for cell in self._ring_cells(lat_cell, lng_cell, ring, max_lat_ring, max_lng_ring):
+                for livreur_id, position in self._cells.get(cell, {}).items():
+                    dy = (position["latitude"] - latitude) * METRES_PER_DEGREE
+                    dx = (position["longitude"] - longitude) * METRES_PER_DEGREE * cos_latitude
+                    approximate = math.sqrt(dx * dx + dy * dy)
+                    if approximate > radius * margin:
+                        continue
+                    if k is not None and len(best) >= k and approximate > -best[0][0] * margin:
+                        continue
+                    distance = haversine(latitude, longitude, position["latitude"], position["longitude"])
+                    if distance > radius or (predicate and not predicate(position)):
+                        continue
+                    if k is None or len(best) < k:
+                        heapq.heappush(best, (-distance, livreur_id, position))
+                    elif distance < -best[0][0]:
+                        heapq.heapreplace(best, (-distance, livreur_id, position))
+
+        return [(-negative, position) for negative, _, position in sorted(best, reverse=True)]
+
+    def within(self, bbox, predicate=None):
+        """Positions contenues dans une zone (BoundingBox)"""
+        south, north = cell_index(self.cell_size, bbox.south), cell_index(self.cell_size, bbox.north)
+        results = []
+        for west, east in bbox.longitude_ranges():
+            west, east = cell_index(self.cell_size, west), cell_index(self.cell_size, east)
+            # Pour une grande zone, parcourir les cellules occupées plutôt que toute la grille
+            if (north - south + 1) * (east - west + 1) > len(self._cells):
+                cells = [c for c in self._cells if south <= c[0] <= north and west <= c[1] <= east]
+            else:
+                cells = [(i, j) for i in range(south, north + 1) for j in range(west, east + 1)]
+            for cell in cells:
+                for position in self._cells.get(cell, {}).values():
+                    if bbox.contains(position["latitude"], position["longitude"]) and \
+                            (predicate is None or predicate(position)):
+                        results.append(position)
+        return results
+
+    def _cell_width(self, latitude, radius):
+        # Largeur (en mètres) d'une cellule à la latitude la plus défavorable du rayon
+        worst_latitude = min(89.0, abs(latitude) + radius / METRES_PER_DEGREE + self.cell_size)
+        return self.cell_size * METRES_PER_DEGREE * math.cos(math.radians(worst_latitude))
+
+    @staticmethod
+    def _ring_cells(lat_cell, lng_cell, ring, max_lat_ring, max_lng_ring):
+        if ring == 0:
+            yield lat_cell, lng_cell
+            return
+        for di in range(-min(ring, max_lat_ring), min(ring, max_lat_ring) + 1):
+            for dj in range(-min(ring, max_lng_ring), min(ring, max_lng_ring) + 1):
+                if max(abs(di), abs(dj)) == ring:
+                    yield lat_cell + di, lng_cell + dj
@@ -0,0 +1,282 @@
+# tracking/storage.py
+"""Stockage de l'historique des positions.
+
+Deux organisations sont disponibles (TRACKING_POSITION_STORAGE) :
+
+- "documents" : un document par position dans `positions` ;
+- "buckets" : un document par livreur et par tranche de
+  TRACKING_BUCKET_MINUTES minutes dans `position_buckets`, qui regroupe les
+  horodatages (décalages en millisecondes depuis le début de la tranche),
+  latitudes, longitudes et suffixes d'identifiant dans des tableaux compacts.
+
+Les deux exposent la même interface, utilisée par `Position`.
+"""
+import datetime
+import uuid
+from collections import defaultdict
+from django.conf import settings
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from .mongodb import positions_collection, position_buckets_collection
+
+
+def bulk_write_errors(error):
+    """Index des opérations en échec d'une BulkWriteError et message associé"""
+    return {
+        write_error["index"]: write_error.get("errmsg", "Erreur d'écriture")
+        for write_error in error.details.get("writeErrors", [])
+    }
+
+
+class DocumentStorage:
+    name = "documents"
+
+    def __init__(self, collection=None):
+        self.collection = positions_collection if collection is None else collection
+
+    def new_position_id(self, livreur_id, timestamp):
+        return str(uuid.uuid4())
+
+    def insert_many(self, positions):
+        """Écrit un lot en un seul insert_many non ordonné ; retourne les
+        erreurs indexées par position dans le lot"""
+        if not positions:
+            return {}
+        # Le numéro de séquence ne concerne que le flux des dernières positions
+        docs = [{k: v for k, v in position.items() if k != "seq"} for position in positions]
+        try:
+            self.collection.insert_many(docs, ordered=False)
+        except BulkWriteError as e:
+            return bulk_write_errors(e)
+        return {}
+
+    def find(self, livreur_id, limit=100, start=None, end=None, after=None):
+        query = {"livreur_id": livreur_id}
+        time_range = {}
+        if start is not None:
+            time_range["$gte"] = start
+        if end is not None:
+            time_range["$lte"] = end
+        if time_range:
+            query["timestamp"] = time_range
+        if after is not None:
+            timestamp, position_id = after
+            query["$or"] = [
+                {"timestamp": {"$lt": timestamp}},
+                {"timestamp": timestamp, "position_id": {"$lt": position_id}},
+            ]
+        positions = self.collection.find(query, {"_id": 0}).sort(
+            [("timestamp", -1), ("position_id", -1)]
+        ).limit(limit)
+        return list(positions)
+
+    def iter_range(self, livreur_id, start, end):
+        """Positions d'un livreur dans [start, end), de la plus ancienne à la plus récente"""
+        return self.collection.find(
+            {"livreur_id": livreur_id, "timestamp": {"$gte": start, "$lt": end}},
+            {"_id": 0}
+        ).sort([("timestamp", 1), ("position_id", 1)])
+
+    def delete_range(self, livreur_id, start, end):
+        return self.collection.delete_many(
+            {"livreur_id": livreur_id, "timestamp": {"$gte": start, "$lt": end}}
+        ).deleted_count
+
+    def oldest_timestamp(self, livreur_id):
+        doc = self.collection.find_one({"livreur_id": livreur_id}, sort=[("timestamp", 1)])
+        return doc["timestamp"] if doc else None
+
+    def latest_per_driver(self):
+        """Dernière position de chaque livreur, calculée sur tout l'historique"""
+        pipeline = [
+            # Le tri suit l'index (livreur_id, timestamp) au lieu de trier toute la collection
+            {"$sort": {"livreur_id": 1, "timestamp": -1}},
+            {"$group": {
+                "_id": "$livreur_id",
+                "position_id": {"$first": "$position_id"},
+                "latitude": {"$first": "$latitude"},
+                "longitude": {"$first": "$longitude"},
+                "timestamp": {"$first": "$timestamp"}
+            }},
+            {"$project": {
+                "_id": 0,
+                "livreur_id": "$_id",
+                "position_id": 1,
+                "latitude": 1,
+                "longitude": 1,
+                "timestamp": 1
+            }},
+        ]
+        return self.collection.aggregate(pipeline, allowDiskUse=True)
+
+
+class BucketStorage:
+    name = "buckets"
+
+    def __init__(self, bucket_minutes=10, max_bucket_size=1000):
+        self.span = datetime.timedelta(minutes=bucket_minutes)
+        self.max_bucket_size = max_bucket_size
+
+    def bucket_start(self, timestamp):
+        epoch = datetime.datetime(1970, 1, 1, tzinfo=timestamp.tzinfo)
+        return timestamp - (timestamp - epoch) % self.span
+
+    def new_position_id(self, livreur_id, timestamp):
+        # Identifiant dérivé de l'horodatage (à la milliseconde, précision de Mongo) ;
+        # un suffixe aléatoire, seul stocké dans le bucket (tableau `s`), départage
+        # les positions d'une même milliseconde pour la pagination par clé
+        return f"{livreur_id}:{timestamp.isoformat(timespec='milliseconds')}:{uuid.uuid4().hex[:8]}"
+
+    @staticmethod
+    def position_suffix(position):
+        return position["position_id"].rsplit(":", 1)[1]
+
+    def insert_many(self, positions):
+        """Ajoute les positions à leurs buckets avec un upsert par bucket.
+
+        Un bucket plein (max_bucket_size positions) n'est plus sélectionné
+        par le filtre : l'upsert ouvre alors un bucket de débordement.
+        """
+        if not positions:
+            return {}
+        groups = defaultdict(list)
+        for index, position in enumerate(positions):
+            key = (position["livreur_id"], self.bucket_start(position["timestamp"]))
+            groups[key].append(index)
+
+        requests = []
+        request_indexes = []
+        for (livreur_id, start), indexes in groups.items():
+            # Découper les gros lots pour respecter la taille maximale d'un bucket
+            for offset in range(0, len(indexes), self.max_bucket_size):
+                chunk = indexes[offset:offset + self.max_bucket_size]
+                points = [positions[i] for i in chunk]
+                requests.append(UpdateOne(
+                    {
+                        "livreur_id": livreur_id,
+                        "debut": start,
+                        "count": {"$lte": self.max_bucket_size - len(chunk)},
+                    },
+                    {
+                        "$push": {
+                            "t": {"$each": [self.offset(start, p["timestamp"]) for p in points]},
+                            "lat": {"$each": [p["latitude"] for p in points]},
+                            "lng": {"$each": [p["longitude"] for p in points]},
+                            "s": {"$each": [self.position_suffix(p) for p in points]},
+                        },
+                        "$inc": {"count": len(points)},
+                        "$min": {"premier": min(p["timestamp"] for p in points)},
+                        "$max": {"dernier": max(p["timestamp"] for p in points)},
+                    },
+                    upsert=True
+                ))
+                request_indexes.append(chunk)
+
+        try:
+            position_buckets_collection.bulk_write(requests, ordered=False)
+        except BulkWriteError as e:
+            return {
+                index: message
+                for request_index, message in bulk_write_errors(e).items()
+                for index in request_indexes[request_index]
+            }
+        return {}
+
+    @staticmethod
+    def offset(start, timestamp):
+        return int((timestamp - start) / datetime.timedelta(milliseconds=1))
+
+    def unpack(self, bucket):
+        livreur_id, start = bucket["livreur_id"], bucket["debut"]
+        # Les buckets écrits avant l'ajout des suffixes n'en ont pas pour leurs
+        # premières positions : l'identifiant se limite alors à l'horodatage
+        suffixes = bucket.get("s", [])
+        suffixes = [None] * (len(bucket["t"]) - len(suffixes)) + suffixes
+        for offset, latitude, longitude, suffix in zip(bucket["t"], bucket["lat"], bucket["lng"], suffixes):
+            timestamp = start + datetime.timedelta(milliseconds=offset)
+            position_id = f"{livreur_id}:{timestamp.isoformat(timespec='milliseconds')}"
+            yield {
+                "position_id": position_id if suffix is None else f"{position_id}:{suffix}",
+                "livreur_id": livreur_id,
+                "latitude": latitude,
+                "longitude": longitude,
+                "timestamp": timestamp,
+            }
+
+    def find(self, livreur_id, limit=100, start=None, end=None, after=None):
+        query = {"livreur_id": livreur_id}
+        bucket_range = {}
+        if start is not None:
+            # Un bucket commencé avant `start` peut contenir des positions postérieures
+            bucket_range["$gt"] = start - self.span
+        upper = min((t for t in (end, after and after[0]) if t is not None), default=None)
+        if upper is not None:
+            bucket_range["$lte"] = upper
+        if bucket_range:
+            query["debut"] = bucket_range
+
+        def selected(position):
+            key = (position["timestamp"], position["position_id"])
+            return (start is None or position["timestamp"] >= start) and \
+                (end is None or position["timestamp"] <= end) and \
+                (after is None or key < after)
+
+        results = []
+        buckets = position_buckets_collection.find(query).sort("debut", -1)
+        group, group_start = [], None
+        # Les buckets d'une même tranche (débordements) sont fusionnés avant tri
+        for bucket in buckets:
+            if bucket["debut"] != group_start and group:
+                results.extend(self._sorted(group, selected))
+                if len(results) >= limit:
+                    return results[:limit]
+                group = []
+            group_start = bucket["debut"]
+            group.extend(self.unpack(bucket))
+        results.extend(self._sorted(group, selected))
+        return results[:limit]
+
+    @staticmethod
+    def _sorted(positions, selected):
+        return sorted(
+            (p for p in positions if selected(p)),
+            key=lambda p: (p["timestamp"], p["position_id"]),
+            reverse=True
+        )
+
+    def iter_range(self, livreur_id, start, end):
+        query = {"livreur_id": livreur_id, "debut": {"$gt": start - self.span, "$lt": end}}
+        positions = [
+            position
+            for bucket in position_buckets_collection.find(query)
+            for position in self.unpack(bucket)
+            if start <= position["timestamp"] < end
+        ]
+        return sorted(positions, key=lambda p: (p["timestamp"], p["position_id"]))
+
+    def delete_range(self, livreur_id, start, end):
+        # Seuls les buckets entièrement compris dans [start, end) sont supprimés
+        return position_buckets_collection.delete_many(
+            {"livreur_id": livreur_id, "debut": {"$gte": start, "$lte": end - self.span}}
+        ).deleted_count
+
+    def oldest_timestamp(self, livreur_id):
+        bucket = position_buckets_collection.find_one({"livreur_id": livreur_id}, sort=[("debut", 1)])
+        return bucket["premier"] if bucket else None
+
+    def latest_per_driver(self):
+        pipeline = [
+            {"$sort": {"livreur_id": 1, "dernier": -1}},
+            {"$group": {"_id": "$livreur_id", "bucket": {"$first": "$$ROOT"}}},
+        ]
+        for group in position_buckets_collection.aggregate(pipeline, allowDiskUse=True):
+            yield max(self.unpack(group["bucket"]), key=lambda p: p["timestamp"])
+
+
+def get_position_storage():
+    if getattr(settings, 'TRACKING_POSITION_STORAGE', 'documents') == 'buckets':
+        return BucketStorage(
+            bucket_minutes=getattr(settings, 'TRACKING_BUCKET_MINUTES', 10),
+            max_bucket_size=getattr(settings, 'TRACKING_BUCKET_MAX_SIZE', 1000),
+        )
+    return DocumentStorage()
@@ -0,0 +1,58 @@
+# tracking/tests/base.py
+"""Outils communs aux tests : Mongo en mémoire (mongomock), channel layer en
+mémoire et positions de test"""
+import datetime
+import json
+import unittest
+
+from django.test import SimpleTestCase, override_settings
+
+from tracking import mongodb
+from tracking.models import LatestPosition, get_driver_cache
+from tracking.retention import compaction_boundary
+
+try:
+    import mongomock
+except ImportError:
+    mongomock = None
+
+DAY = datetime.datetime(2025, 1, 15)
+
+
+def point(livreur_id, seconds, latitude=48.85, longitude=2.35, day=DAY):
+    return {
+        "livreur_id": livreur_id,
+        "latitude": latitude,
+        "longitude": longitude,
+        "timestamp": day + datetime.timedelta(hours=10, seconds=seconds),
+    }
+
+
+def read_json(response):
+    if response.streaming:
+        return json.loads(b"".join(response.streaming_content))
+    return json.loads(response.content)
+
+
+@unittest.skipIf(mongomock is None, "mongomock n'est pas installé (requirements-dev.txt)")
+@override_settings(
+    TRACKING_WRITE_BEHIND=False,
+    TRACKING_POSITION_STORAGE="documents",
+    TRACKING_DRIVER_CACHE_INVALIDATION=False,
+    CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}},
+)
+class MongoTestCase(SimpleTestCase):
+    """Base Mongo en mémoire, vidée avant chaque test"""
+
+    def setUp(self):
+        mongodb.set_client(mongomock.MongoClient(), "tracking_tests")
+        for collection, keys, options in mongodb.INDEXES:
+            try:
+                collection.create_index(keys, **options)
+            except Exception:
+                # mongomock ne gère pas les index 2dsphere
+                pass
+        LatestPosition.cache.invalidate()
+        get_driver_cache().invalidate()
+        compaction_boundary.invalidate()
+        self.addCleanup(mongodb.set_client, None)
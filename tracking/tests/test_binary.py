@@ -0,0 +1,78 @@
+# tracking/tests/test_binary.py
+import datetime
+import struct
+import unittest
+
+from tracking.binary import (
+    COORD_SCALE, DICTIONARY_FRAME, DICTIONARY_HEADER, MAX_OFFSET, POSITION_RECORD, POSITIONS_FRAME,
+    POSITIONS_HEADER, BinaryEncoder, epoch_ms,
+)
+from .base import DAY, point
+
+
+def decode(frames, dictionary=None):
+    """Décodeur de référence : positions (livreur, lat, lng, ms, seq) de chaque trame"""
+    dictionary = {} if dictionary is None else dictionary
+    decoded = []
+    for frame in frames:
+        if frame[0] == DICTIONARY_FRAME:
+            _, first, count = DICTIONARY_HEADER.unpack_from(frame)
+            offset = DICTIONARY_HEADER.size
+            for index in range(first, first + count):
+                (length,) = struct.unpack_from("<H", frame, offset)
+                dictionary[index] = frame[offset + 2:offset + 2 + length].decode()
+                offset += 2 + length
+            continue
+        _, count, base_time, base_lat, base_lng, base_seq = POSITIONS_HEADER.unpack_from(frame)
+        positions = []
+        for i in range(count):
+            index, lat, lng, time, seq = POSITION_RECORD.unpack_from(frame, POSITIONS_HEADER.size + i * POSITION_RECORD.size)
+            positions.append((
+                dictionary[index],
+                (base_lat + lat) / COORD_SCALE,
+                (base_lng + lng) / COORD_SCALE,
+                base_time + time,
+                None if seq == 0 else base_seq + seq - 1,
+            ))
+        decoded.append(positions)
+    return decoded
+
+
+class BinaryEncoderTests(unittest.TestCase):
+
+    def test_positions_round_trip(self):
+        positions = [
+            {**point("A", 0, latitude=48.851234, longitude=2.351234), "seq": 7},
+            {**point("Livreur é", 1.5, latitude=-33.9, longitude=-151.2), "seq": 5},
+            point("A", 3),
+        ]
+        frames = BinaryEncoder().encode(positions)
+        self.assertEqual([frame[0] for frame in frames], [DICTIONARY_FRAME, POSITIONS_FRAME])
+        self.assertEqual(decode(frames), [[
+            ("A", 48.851234, 2.351234, epoch_ms(positions[0]["timestamp"]), 7),
+            ("Livreur é", -33.9, -151.2, epoch_ms(positions[1]["timestamp"]), 5),
+            ("A", 48.85, 2.35, epoch_ms(positions[2]["timestamp"]), None),
+        ]])
+
+    def test_dictionary_is_only_extended_with_new_drivers(self):
+        encoder = BinaryEncoder()
+        dictionary = {}
+        decode(encoder.encode([point("A", 0)]), dictionary)
+        frames = encoder.encode([point("A", 1), point("B", 1)])
+        self.assertEqual(DICTIONARY_HEADER.unpack_from(frames[0]), (DICTIONARY_FRAME, 1, 1))
+        self.assertEqual([p[0] for p in decode(frames, dictionary)[0]], ["A", "B"])
+        self.assertEqual(len(encoder.encode([point("B", 2)])), 1)
+
+    def test_long_time_span_is_split_into_frames(self):
+        stale = point("A", 0, day=DAY - datetime.timedelta(days=60))
+        positions = [point("B", 0), stale, point("C", 10)]
+        frames = BinaryEncoder().encode(positions)
+        decoded = decode(frames)
+        self.assertEqual([[p[0] for p in frame] for frame in decoded], [["A"], ["B", "C"]])
+        self.assertEqual(decoded[0][0][3], epoch_ms(stale["timestamp"]))
+
+    def test_wide_seq_span_is_split_into_frames(self):
+        positions = [{**point("A", 0), "seq": 1}, {**point("B", 1), "seq": MAX_OFFSET + 1}, point("C", 2)]
+        decoded = decode(BinaryEncoder().encode(positions))
+        self.assertEqual([[(p[0], p[4]) for p in frame] for frame in decoded],
+                         [[("A", 1)], [("B", MAX_OFFSET + 1), ("C", None)]])
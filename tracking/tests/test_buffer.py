@@ -0,0 +1,168 @@
+# tracking/tests/test_buffer.py
+import unittest
+from unittest import mock
+
+from pymongo.errors import BulkWriteError, ServerSelectionTimeoutError
+
+from tracking.buffer import PositionWriteBuffer, WriteInterrupted, run_steps
+from tracking.models import LatestPosition
+from tracking.mongodb import latest_positions_collection
+from .base import MongoTestCase, point
+
+
+def make_buffer(writer, **options):
+    buffer = PositionWriteBuffer(writer, **options)
+    buffer._thread = object()  # pas de thread de fond : écritures par flush()
+    return buffer
+
+
+class WriteBufferTests(unittest.TestCase):
+
+    def test_flush_writes_batches_in_order(self):
+        batches = []
+        buffer = make_buffer(lambda batch: batches.append(batch) or {}, batch_size=2)
+        self.assertEqual(buffer.put_many([1, 2, 3]), 3)
+        buffer.flush()
+        self.assertEqual(batches, [[1, 2], [3]])
+        self.assertEqual(buffer.stats()["flushed"], 3)
+        self.assertEqual(buffer.stats()["depth"], 0)
+
+    def test_full_queue_drops_positions(self):
+        buffer = make_buffer(lambda batch: {}, max_size=2)
+        self.assertEqual(buffer.put_many([1, 2, 3]), 2)
+        self.assertEqual(buffer.stats()["dropped"], 1)
+
+    def test_rejected_positions_count_as_dropped(self):
+        buffer = make_buffer(lambda batch: {0: "E11000"})
+        buffer.put_many([1, 2])
+        with self.assertLogs("tracking.buffer", "WARNING"):
+            buffer.flush()
+        stats = buffer.stats()
+        self.assertEqual((stats["flushed"], stats["dropped"]), (1, 1))
+
+    def test_failed_flush_backs_off_and_retries_same_batch(self):
+        calls = []
+
+        def writer(batch):
+            calls.append(list(batch))
+            if len(calls) < 3:
+                raise ConnectionError("Mongo indisponible")
+            return {}
+
+        buffer = make_buffer(writer, flush_interval=0.5)
+        buffer.put_many([1, 2])
+        with self.assertLogs("tracking.buffer", "ERROR"):
+            buffer.flush()
+        self.assertEqual(buffer.stats()["retry_delay_s"], 0.5)
+        buffer.put_many([3])
+        with self.assertLogs("tracking.buffer", "ERROR"):
+            buffer.flush()
+        stats = buffer.stats()
+        self.assertEqual(stats["retry_delay_s"], 1.0)
+        self.assertEqual((stats["failed_flushes"], stats["depth"]), (2, 3))
+        buffer.flush()
+        # Le lot en échec passe avant les positions arrivées entre-temps
+        self.assertEqual(calls, [[1, 2], [1, 2], [1, 2], [3]])
+        stats = buffer.stats()
+        self.assertEqual((stats["flushed"], stats["depth"], stats["retry_delay_s"]), (3, 0, 0.0))
+
+    def test_interrupted_write_resumes_at_failed_step(self):
+        runs = []
+        failures = [ConnectionError("Mongo indisponible")]
+
+        def first():
+            runs.append("first")
+
+        def second():
+            runs.append("second")
+            if failures:
+                raise failures.pop()
+
+        with self.assertRaises(WriteInterrupted) as raised:
+            run_steps([first, second], lambda: {})
+        self.assertEqual(raised.exception.step, 1)
+        self.assertEqual(raised.exception.resume(), {})
+        self.assertEqual(runs, ["first", "second", "second"])
+
+
+class RetryLimitTests(unittest.TestCase):
+
+    def fail_flushes(self, buffer, times):
+        with self.assertLogs("tracking.buffer", "ERROR"):
+            for _ in range(times):
+                buffer.flush()
+
+    def test_failing_batch_is_split_after_max_attempts(self):
+        calls = []
+
+        def writer(batch):
+            calls.append(list(batch))
+            if 2 in batch:
+                raise ValueError("position invalide")
+            return {}
+
+        buffer = make_buffer(writer, max_attempts=3)
+        buffer.put_many([1, 2, 3])
+        self.fail_flushes(buffer, 3)
+        # Trois essais du lot, puis une écriture par position
+        self.assertEqual(calls, [[1, 2, 3]] * 3 + [[1], [2], [3]])
+        self.assertEqual(buffer.dead_letters(), [2])
+        stats = buffer.stats()
+        self.assertEqual((stats["flushed"], stats["dropped"], stats["dead_lettered"]), (2, 1, 1))
+        self.assertEqual((stats["depth"], stats["retry_delay_s"]), (0, 0.0))
+
+    def test_later_batches_are_written_after_dead_letter(self):
+        written = []
+
+        def writer(batch):
+            if 1 in batch:
+                raise ServerSelectionTimeoutError("Mongo injoignable")
+            written.extend(batch)
+            return {}
+
+        buffer = make_buffer(writer, batch_size=2, max_attempts=2)
+        buffer.put_many([1, 2, 3])
+        self.fail_flushes(buffer, 2)
+        # Mongo injoignable : le lot n'est pas découpé, il est écarté en entier
+        self.assertEqual(buffer.dead_letters(), [1, 2])
+        self.assertEqual(written, [3])
+
+    def test_partly_written_batch_is_not_split(self):
+        calls = []
+
+        def writer(batch):
+            calls.append(list(batch))
+
+            def update_latest():
+                raise ValueError("latest_positions indisponible")
+
+            return run_steps([lambda: None, update_latest], lambda: {})
+
+        buffer = make_buffer(writer, max_attempts=2)
+        buffer.put_many([1, 2])
+        self.fail_flushes(buffer, 2)
+        # Seule l'étape en échec est rejouée, et l'historique n'est pas réécrit
+        self.assertEqual(calls, [[1, 2]])
+        self.assertEqual(buffer.dead_letters(), [1, 2])
+        self.assertEqual(buffer.stats()["dead_lettered"], 2)
+
+
+class LatestWriteErrorTests(MongoTestCase):
+
+    def test_other_write_errors_are_logged_not_raised(self):
+        """Une position refusée par latest_positions n'empêche pas le lot
+        d'aboutir : les autres sont écrites (ordered=False)"""
+        real_bulk_write = latest_positions_collection.bulk_write
+
+        def failing_bulk_write(requests, ordered=True):
+            real_bulk_write(requests[1:], ordered=ordered)
+            raise BulkWriteError({"writeErrors": [{"index": 0, "code": 2, "errmsg": "invalide"}]})
+
+        with mock.patch("tracking.models.latest_positions_collection") as collection:
+            collection.bulk_write.side_effect = failing_bulk_write
+            with self.assertLogs("tracking.models", "ERROR"):
+                LatestPosition.upsert_many([
+                    {**point("A", 0), "position_id": "a", "seq": 1},
+                    {**point("B", 0), "position_id": "b", "seq": 2},
+                ])
+        self.assertEqual([p["livreur_id"] for p in latest_positions_collection.find()], ["B"])
@@ -0,0 +1,184 @@
+# tracking/tests/test_consumers.py
+import json
+
+from channels.layers import get_channel_layer
+from channels.testing import WebsocketCommunicator
+
+from tracking.broadcast import TRACKING_GROUP, fleet_group, livreur_group, publish_positions
+from tracking.consumers import TrackingConsumer
+from tracking.binary import BINARY_SUBPROTOCOL, DICTIONARY_FRAME, POSITIONS_FRAME
+from tracking.models import LatestPosition, Position
+from tracking.mongodb import latest_positions_collection
+from .base import MongoTestCase, point
+
+
+class ConsumerTestCase(MongoTestCase):
+
+    async def connect(self, query):
+        communicator = WebsocketCommunicator(TrackingConsumer.as_asgi(), f"/ws/tracking/?{query}")
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        return communicator
+
+    def joined_groups(self):
+        """Groupes du channel layer en mémoire qui ont au moins un membre"""
+        return {group for group, channels in get_channel_layer().groups.items() if channels}
+
+    async def receive_ids(self, communicator):
+        positions = json.loads(await communicator.receive_from())
+        return sorted(p["livreur_id"] for p in positions)
+
+
+class SubscriptionTests(ConsumerTestCase):
+
+    async def test_driver_subscription_skips_full_feed(self):
+        communicator = await self.connect("livreur=A&rate=0&snapshot=false")
+        self.assertEqual(self.joined_groups(), {livreur_group("A")})
+        await publish_positions([point("A", 0), point("B", 0)])
+        self.assertEqual(await self.receive_ids(communicator), ["A"])
+        self.assertTrue(await communicator.receive_nothing())
+        await communicator.disconnect()
+
+    async def test_fleet_subscription_receives_fleet_positions(self):
+        communicator = await self.connect("flotte=nord&rate=0&snapshot=false")
+        await publish_positions([point("A", 0), point("B", 0), point("C", 0)], {"A": "nord", "B": "sud"})
+        self.assertEqual(await self.receive_ids(communicator), ["A"])
+        self.assertTrue(await communicator.receive_nothing())
+        await communicator.disconnect()
+
+    async def test_subscribe_messages_update_groups(self):
+        communicator = await self.connect("rate=0&snapshot=false")
+        self.assertEqual(self.joined_groups(), {TRACKING_GROUP})
+        await communicator.send_json_to({"action": "subscribe", "flotte": "nord"})
+        await communicator.send_json_to({"action": "subscribe", "livreur_id": "B"})
+        await communicator.send_json_to({"action": "unsubscribe", "flotte": "nord"})
+        await communicator.receive_nothing()
+        self.assertEqual(self.joined_groups(), {livreur_group("B")})
+        await communicator.disconnect()
+        self.assertEqual(self.joined_groups(), set())
+
+    def test_group_names_are_sanitized(self):
+        self.assertEqual(livreur_group("LIV001"), "tracking_livreur_LIV001")
+        group = fleet_group("Île de France")
+        self.assertRegex(group, r"^tracking_flotte_[0-9a-f]{40}$")
+
+
+class ViewportTests(ConsumerTestCase):
+
+    async def test_updates_outside_viewport_are_filtered(self):
+        communicator = await self.connect("bbox=48.84,2.34,48.86,2.36&rate=0&snapshot=false")
+        await publish_positions([point("A", 0), point("B", 0, latitude=48.87)])
+        self.assertEqual(await self.receive_ids(communicator), ["A"])
+        self.assertTrue(await communicator.receive_nothing())
+        await communicator.disconnect()
+
+    async def test_subscribe_bbox_sends_viewport_snapshot(self):
+        Position.create_many([point("A", 0), point("B", 0, latitude=45.75, longitude=4.85)])
+        communicator = await self.connect("bbox=48.84,2.34,48.86,2.36&rate=0&snapshot=false")
+        await communicator.send_json_to({"action": "subscribe_bbox", "bbox": [45.7, 4.8, 45.8, 4.9]})
+        message = await communicator.receive_json_from()
+        self.assertEqual(message["type"], "snapshot")
+        self.assertEqual([p["livreur_id"] for p in message["positions"]], ["B"])
+        await publish_positions([point("A", 10), point("B", 10, latitude=45.76, longitude=4.85)])
+        self.assertEqual(await self.receive_ids(communicator), ["B"])
+        await communicator.disconnect()
+
+    async def test_invalid_bbox_keeps_subscription(self):
+        communicator = await self.connect("bbox=48.84,2.34,48.86,2.36&rate=0&snapshot=false")
+        groups = self.joined_groups()
+        await communicator.send_json_to({"action": "subscribe_bbox", "bbox": [1, 2]})
+        self.assertIn("error", await communicator.receive_json_from())
+        self.assertEqual(self.joined_groups(), groups)
+        await communicator.disconnect()
+
+
+class ConflationTests(ConsumerTestCase):
+
+    async def test_updates_are_conflated_per_driver(self):
+        communicator = await self.connect("rate=10&snapshot=false")
+        await publish_positions([point("A", 0, latitude=1.0), point("B", 0)])
+        await publish_positions([point("A", 10, latitude=2.0)])
+        await publish_positions([point("A", 5, latitude=3.0)])
+        positions = json.loads(await communicator.receive_from())
+        # Une seule trame, avec la position la plus récente de chaque livreur
+        self.assertEqual({p["livreur_id"]: p["latitude"] for p in positions}, {"A": 2.0, "B": 48.85})
+        self.assertTrue(await communicator.receive_nothing())
+        await communicator.disconnect()
+
+    async def test_rate_zero_sends_each_batch(self):
+        communicator = await self.connect("rate=0&snapshot=false")
+        await publish_positions([point("A", 0)])
+        await publish_positions([point("A", 10)])
+        self.assertEqual(await self.receive_ids(communicator), ["A"])
+        self.assertEqual(await self.receive_ids(communicator), ["A"])
+        await communicator.disconnect()
+
+    async def test_set_rate_zero_flushes_pending(self):
+        communicator = await self.connect("rate=0.1&snapshot=false")
+        await publish_positions([point("A", 0)])
+        self.assertTrue(await communicator.receive_nothing())
+        await communicator.send_json_to({"action": "set_rate", "rate": 0})
+        self.assertEqual(await self.receive_ids(communicator), ["A"])
+        await communicator.disconnect()
+
+    def test_rate_is_bounded(self):
+        consumer = TrackingConsumer()
+        with self.settings(TRACKING_WS_DEFAULT_RATE=2, TRACKING_WS_MAX_RATE=10):
+            self.assertEqual(consumer.parse_rate("50"), 10)
+            self.assertEqual(consumer.parse_rate("abc"), 2)
+            self.assertEqual(consumer.parse_rate("-1"), 0)
+
+
+class SnapshotResumeTests(ConsumerTestCase):
+
+    async def test_snapshot_is_read_from_latest_positions(self):
+        Position.create_many([point("A", 0), point("B", 0)])
+        # Position écrite par un autre worker : absente du cache de ce processus
+        latest_positions_collection.insert_one({**point("C", 0), "position_id": "c", "seq": 50})
+        communicator = await self.connect("rate=0")
+        message = await communicator.receive_json_from()
+        self.assertEqual(message["type"], "snapshot")
+        self.assertEqual(sorted(p["livreur_id"] for p in message["positions"]), ["A", "B", "C"])
+        self.assertEqual(message["seq"], 50)
+        await communicator.disconnect()
+
+    async def test_resume_replays_latest_missed_update_per_driver(self):
+        Position.create_many([point("A", 0), point("B", 0)])
+        since = max(p["seq"] for p in LatestPosition.load_all())
+        Position.create_many([point("A", 10), point("A", 20, latitude=48.9), point("C", 0)])
+        communicator = await self.connect(f"since={since}&rate=0")
+        message = await communicator.receive_json_from()
+        self.assertEqual(message["type"], "replay")
+        positions = {p["livreur_id"]: p for p in message["positions"]}
+        self.assertEqual(set(positions), {"A", "C"})
+        self.assertEqual(positions["A"]["latitude"], 48.9)
+        self.assertEqual(message["seq"], since + 3)
+        await communicator.disconnect()
+
+    async def test_resume_without_missed_updates_is_empty(self):
+        Position.create_many([point("A", 0)])
+        since = LatestPosition.load_all()[0]["seq"]
+        communicator = await self.connect(f"since={since}&rate=0")
+        self.assertEqual(await communicator.receive_json_from(), {"type": "replay", "seq": since, "positions": []})
+        await communicator.disconnect()
+
+    async def test_unknown_seq_falls_back_to_snapshot(self):
+        Position.create_many([point("A", 0)])
+        communicator = await self.connect("since=1000000&rate=0")
+        message = await communicator.receive_json_from()
+        self.assertEqual(message["type"], "snapshot")
+        self.assertEqual(len(message["positions"]), 1)
+        await communicator.disconnect()
+
+    async def test_binary_snapshot_sends_header_then_frames(self):
+        Position.create_many([point("A", 0), point("B", 0)])
+        communicator = WebsocketCommunicator(
+            TrackingConsumer.as_asgi(), "/ws/tracking/?rate=0", subprotocols=[BINARY_SUBPROTOCOL]
+        )
+        connected, subprotocol = await communicator.connect()
+        self.assertEqual((connected, subprotocol), (True, BINARY_SUBPROTOCOL))
+        header = await communicator.receive_json_from()
+        self.assertEqual((header["type"], header["count"]), ("snapshot", 2))
+        frames = [await communicator.receive_from(), await communicator.receive_from()]
+        self.assertEqual([frame[0] for frame in frames], [DICTIONARY_FRAME, POSITIONS_FRAME])
+        await communicator.disconnect()
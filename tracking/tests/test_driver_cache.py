@@ -0,0 +1,91 @@
+# tracking/tests/test_driver_cache.py
+import asyncio
+import unittest
+
+from channels.layers import get_channel_layer
+
+from tracking import invalidation
+from tracking.cache import DriverCache
+from tracking.models import Livreur, get_driver_cache
+from tracking.mongodb import livreurs_collection
+from .base import MongoTestCase
+
+
+class DriverCacheTests(unittest.TestCase):
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = DriverCache(max_size=2, ttl=60)
+        cache.put_many({"A": {"nom": "a"}, "B": {"nom": "b"}})
+        cache.get_many(["A"])
+        cache.put_many({"C": {"nom": "c"}})
+        found, missing = cache.get_many(["A", "B", "C"])
+        self.assertEqual((set(found), missing), ({"A", "C"}, ["B"]))
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+    def test_expired_entries_are_missing(self):
+        cache = DriverCache(max_size=10, ttl=0)
+        cache.put_many({"A": {"nom": "a"}})
+        self.assertEqual(cache.get_many(["A"]), ({}, ["A"]))
+
+    def test_unknown_driver_is_cached_as_none(self):
+        cache = DriverCache(max_size=10, ttl=60)
+        cache.put_many({"X": None})
+        self.assertEqual(cache.get_many(["X"]), ({"X": None}, []))
+
+    def test_read_racing_an_invalidation_is_not_cached(self):
+        cache = DriverCache(max_size=10, ttl=60)
+        generation = cache.generation
+        cache.invalidate("A")
+        cache.put_many({"A": {"nom": "ancien"}}, generation)
+        cache.set_all([{"livreur_id": "A"}], generation)
+        self.assertEqual(cache.get_many(["A"]), ({}, ["A"]))
+        self.assertIsNone(cache.get_all())
+
+    def test_list_larger_than_cache_is_not_kept(self):
+        cache = DriverCache(max_size=1, ttl=60)
+        cache.set_all([{"livreur_id": "A"}, {"livreur_id": "B"}], cache.generation)
+        self.assertIsNone(cache.get_all())
+
+    def test_stats_report_hit_rate(self):
+        cache = DriverCache(max_size=10, ttl=60)
+        cache.put_many({"A": {}})
+        cache.get_many(["A", "B"])
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["hit_rate"]), (1, 1, 0.5))
+
+
+class LivreurCacheTests(MongoTestCase):
+
+    def test_reads_are_served_from_cache_until_update(self):
+        Livreur.create("A", "Alice", "0600000000", flotte="nord")
+        self.assertEqual(Livreur.get_by_id("A")["flotte"], "nord")
+        livreurs_collection.update_one({"livreur_id": "A"}, {"$set": {"flotte": "sud"}})
+        self.assertEqual(Livreur.get_fleets(["A"]), {"A": "nord"})
+        Livreur.update("A", {"nom": "Alicia"})
+        self.assertEqual(Livreur.get_by_id("A")["flotte"], "sud")
+
+    def test_list_is_cached_and_invalidated_by_create(self):
+        Livreur.create("A", "Alice", "0600000000")
+        self.assertEqual([l["livreur_id"] for l in Livreur.get_all()], ["A"])
+        self.assertIsNotNone(get_driver_cache().get_all())
+        Livreur.create("B", "Bob", "0600000001")
+        self.assertEqual(sorted(l["livreur_id"] for l in Livreur.get_all()), ["A", "B"])
+
+    async def test_remote_invalidation_evicts_entry(self):
+        cache = DriverCache(max_size=10, ttl=60)
+        cache.put_many({"A": {"nom": "a"}, "B": {"nom": "b"}})
+        listener = asyncio.create_task(invalidation.receive_invalidations(cache))
+        try:
+            channel_layer = get_channel_layer()
+            while not channel_layer.groups.get(invalidation.DRIVER_CACHE_GROUP):
+                await asyncio.sleep(0.01)
+            for livreur_id, origin in (("B", invalidation.ORIGIN), ("A", "autre-worker")):
+                await channel_layer.group_send(invalidation.DRIVER_CACHE_GROUP, {
+                    "type": "driver.invalidate", "livreur_id": livreur_id, "origin": origin,
+                })
+            while cache.stats()["invalidations"] == 0:
+                await asyncio.sleep(0.01)
+        finally:
+            listener.cancel()
+        # Les messages du processus lui-même sont ignorés
+        self.assertEqual(cache.get_many(["A", "B"]), ({"B": {"nom": "b"}}, ["A"]))
@@ -0,0 +1,51 @@
+# tracking/tests/test_encoding.py
+import datetime
+import json
+import unittest
+
+from bson import ObjectId
+from django.test import RequestFactory
+
+from tracking import views
+from tracking.encoding import NDJSON_CONTENT_TYPE, dumps, iter_json_chunks, streaming_json_response
+from tracking.models import Position
+from .base import MongoTestCase, point
+
+
+class EncodingTests(unittest.TestCase):
+
+    def test_dumps_converts_mongo_types(self):
+        oid = ObjectId()
+        data = {"_id": oid, "timestamp": datetime.datetime(2025, 1, 15, 10, 0, 1)}
+        self.assertEqual(json.loads(dumps(data)), {"_id": str(oid), "timestamp": "2025-01-15T10:00:01"})
+
+    def test_array_chunks_form_valid_json(self):
+        for count in (0, 1, 2, 5):
+            with self.subTest(count=count):
+                items = ({"i": i} for i in range(count))
+                body = b"".join(iter_json_chunks(items, chunk_size=2))
+                self.assertEqual(json.loads(body), [{"i": i} for i in range(count)])
+
+    def test_ndjson_chunks_have_one_line_per_item(self):
+        body = b"".join(iter_json_chunks([{"i": i} for i in range(3)], ndjson=True, chunk_size=2))
+        self.assertEqual([json.loads(line) for line in body.decode().splitlines()], [{"i": 0}, {"i": 1}, {"i": 2}])
+        self.assertEqual(b"".join(iter_json_chunks([], ndjson=True)), b"")
+
+    def test_ndjson_is_negotiated(self):
+        factory = RequestFactory()
+        for request in (factory.get("/", {"format": "ndjson"}),
+                        factory.get("/", HTTP_ACCEPT=NDJSON_CONTENT_TYPE)):
+            self.assertEqual(streaming_json_response(request, [])["Content-Type"], NDJSON_CONTENT_TYPE)
+        self.assertEqual(streaming_json_response(factory.get("/"), [])["Content-Type"], "application/json")
+
+
+class StreamedHistoryTests(MongoTestCase):
+
+    def test_history_streams_ndjson(self):
+        Position.create_many([point("A", seconds) for seconds in range(3)])
+        request = RequestFactory().get("/api/livreurs/A/positions/", {"format": "ndjson"})
+        response = views.livreur_positions_view(request, "A")
+        self.assertTrue(response.streaming)
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(line)["timestamp"] for line in lines],
+                         ["2025-01-15T10:00:02", "2025-01-15T10:00:01", "2025-01-15T10:00:00"])
@@ -0,0 +1,55 @@
+# tracking/tests/test_history.py
+import datetime
+
+from django.test import RequestFactory
+
+from tracking import views
+from tracking.models import Position
+from .base import DAY, MongoTestCase, point, read_json
+
+
+class HistoryPaginationTests(MongoTestCase):
+
+    def get(self, **params):
+        request = RequestFactory().get("/api/livreurs/A/positions/", params)
+        return views.livreur_positions_view(request, "A")
+
+    def page(self, cursor=None, limit=2):
+        params = {"limit": limit}
+        if cursor:
+            params["cursor"] = cursor
+        response = self.get(**params)
+        return read_json(response), response.get("X-Next-Cursor")
+
+    def test_cursor_walks_history_without_gaps(self):
+        # Deux positions partagent chaque horodatage
+        Position.create_many([point("A", seconds // 2) for seconds in range(5)])
+        seen, cursor = [], None
+        while True:
+            page, cursor = self.page(cursor)
+            seen.extend(page)
+            if not cursor:
+                break
+        self.assertEqual(len(seen), 5)
+        self.assertEqual(len({p["position_id"] for p in seen}), 5)
+        keys = [(p["timestamp"], p["position_id"]) for p in seen]
+        self.assertEqual(keys, sorted(keys, reverse=True))
+
+    def test_next_page_link_keeps_query(self):
+        Position.create_many([point("A", seconds) for seconds in range(3)])
+        response = self.get(limit=2, to=(DAY + datetime.timedelta(hours=11)).isoformat())
+        self.assertIn("cursor=", response["Link"])
+        self.assertIn("to=", response["Link"])
+        self.assertTrue(response["Link"].endswith('rel="next"'))
+
+    def test_time_range_filters_history(self):
+        Position.create_many([point("A", seconds * 60) for seconds in range(10)])
+        start = DAY + datetime.timedelta(hours=10, minutes=2)
+        end = DAY + datetime.timedelta(hours=10, minutes=4)
+        positions = read_json(self.get(**{"from": start.isoformat(), "to": end.isoformat()}))
+        self.assertEqual(len(positions), 3)
+
+    def test_invalid_parameters_return_400(self):
+        for params in ({"cursor": "!!"}, {"limit": 0}, {"limit": "x"}, {"from": "hier"}):
+            with self.subTest(params=params):
+                self.assertEqual(self.get(**params).status_code, 400)
@@ -0,0 +1,114 @@
+# tracking/tests/test_ingest.py
+import datetime
+import json
+
+from asgiref.sync import async_to_sync
+from django.test import RequestFactory
+
+from tracking import async_views, views
+from tracking.mongodb import latest_positions_collection, positions_collection
+from .base import MongoTestCase, read_json
+
+
+class BatchIngestTests(MongoTestCase):
+
+    def post(self, body, content_type="application/json"):
+        request = RequestFactory().post("/api/positions/", body, content_type=content_type)
+        return views.positions_view(request)
+
+    def test_json_batch_with_invalid_points_returns_207(self):
+        body = json.dumps([
+            {"livreur": "A", "latitude": 48.85, "longitude": 2.35},
+            {"livreur": "B", "latitude": 95, "longitude": 2.35},
+            {"latitude": 48.85, "longitude": 2.35},
+        ])
+        response = self.post(body)
+        self.assertEqual(response.status_code, 207)
+        data = read_json(response)
+        self.assertEqual((data["accepted"], data["rejected"]), (1, 2))
+        self.assertEqual([r["status"] for r in data["results"]], ["ok", "error", "error"])
+        self.assertEqual(positions_collection.count_documents({}), 1)
+
+    def test_ndjson_batch_reports_invalid_lines(self):
+        body = '{"livreur": "A", "latitude": 48.85, "longitude": 2.35}\nnot json\n\n' \
+               '{"livreur": "B", "latitude": 48.86, "longitude": 2.36}\n'
+        response = self.post(body, "application/x-ndjson")
+        self.assertEqual(response.status_code, 207)
+        results = read_json(response)["results"]
+        self.assertEqual([r["status"] for r in results], ["ok", "error", "ok"])
+        self.assertIn("JSON invalide", results[1]["error"])
+
+    def test_valid_batch_returns_200(self):
+        body = json.dumps([{"livreur": "A", "latitude": 48.85, "longitude": 2.35}])
+        self.assertEqual(self.post(body).status_code, 200)
+
+    def test_oversized_batch_returns_413(self):
+        body = json.dumps([{"livreur": "A", "latitude": 48.85, "longitude": 2.35}] * 3)
+        with self.settings(TRACKING_MAX_BATCH_SIZE=2):
+            self.assertEqual(self.post(body).status_code, 413)
+        self.assertEqual(positions_collection.count_documents({}), 0)
+
+    def test_async_view_returns_207(self):
+        body = json.dumps([{"livreur": "A", "latitude": 48.85, "longitude": 2.35}, {"livreur": "B"}])
+        request = RequestFactory().post("/api/positions/", body, content_type="application/json")
+        response = async_to_sync(async_views.positions_view)(request)
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual(read_json(response)["accepted"], 1)
+
+
+class SinglePointIngestTests(MongoTestCase):
+
+    def post(self, data, view=views.positions_view):
+        request = RequestFactory().post("/api/positions/", json.dumps(data), content_type="application/json")
+        if view is async_views.positions_view:
+            return async_to_sync(view)(request)
+        return view(request)
+
+    def test_valid_point_is_written(self):
+        response = self.post({"livreur": "A", "latitude": 48.85, "longitude": 2.35})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(read_json(response)["livreur_id"], "A")
+        self.assertEqual(positions_collection.count_documents({}), 1)
+
+    def test_invalid_points_return_400(self):
+        for view in (views.positions_view, async_views.positions_view):
+            for data in (
+                {"livreur": "B", "latitude": 500, "longitude": 2.35},
+                {"livreur": "B", "longitude": 2.35},
+                {"latitude": 48.85, "longitude": 2.35},
+                42,
+            ):
+                with self.subTest(view=view.__module__, data=data):
+                    response = self.post(data, view)
+                    self.assertEqual(response.status_code, 400)
+                    self.assertIn("error", read_json(response))
+        self.assertEqual(positions_collection.count_documents({}), 0)
+
+
+class TimestampSkewTests(MongoTestCase):
+
+    def post(self, data):
+        request = RequestFactory().post("/api/positions/", json.dumps(data), content_type="application/json")
+        return views.positions_view(request)
+
+    def point(self, offset, latitude=48.85):
+        timestamp = datetime.datetime.now() + datetime.timedelta(seconds=offset)
+        return {"livreur": "A", "latitude": latitude, "longitude": 2.35, "timestamp": timestamp.isoformat()}
+
+    def test_future_timestamp_is_rejected(self):
+        response = self.post(self.point(2 * 24 * 3600, latitude=1.0))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.post(self.point(0)).status_code, 200)
+        self.assertEqual(latest_positions_collection.find_one({"livreur_id": "A"})["latitude"], 48.85)
+
+    def test_old_timestamp_is_rejected_in_batches(self):
+        response = self.post([self.point(-3 * 24 * 3600), self.point(-60)])
+        self.assertEqual(response.status_code, 207)
+        results = read_json(response)["results"]
+        self.assertEqual([r["status"] for r in results], ["error", "ok"])
+
+    def test_window_is_configurable(self):
+        with self.settings(TRACKING_MAX_FUTURE_SKEW=None, TRACKING_MAX_TIMESTAMP_AGE=None):
+            self.assertEqual(self.post(self.point(-3 * 24 * 3600)).status_code, 200)
+        with self.settings(TRACKING_MAX_FUTURE_SKEW=1):
+            self.assertEqual(self.post(self.point(30)).status_code, 400)
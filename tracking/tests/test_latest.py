@@ -0,0 +1,60 @@
+# tracking/tests/test_latest.py
+from unittest import mock
+
+from pymongo.errors import BulkWriteError
+
+from tracking import mongodb
+from tracking.models import DUPLICATE_KEY_ERROR, LatestPosition, Position
+from tracking.mongodb import latest_positions_collection
+from .base import MongoTestCase, point
+
+
+class LatestPositionTests(MongoTestCase):
+
+    def latest(self, livreur_id):
+        return latest_positions_collection.find_one({"livreur_id": livreur_id})
+
+    def test_newest_fix_wins_across_batches(self):
+        Position.create_many([point("A", 0), point("A", 20, latitude=48.9), point("B", 0)])
+        Position.create_many([point("A", 10, latitude=1.0)])
+        self.assertEqual(latest_positions_collection.count_documents({}), 2)
+        self.assertEqual(self.latest("A")["latitude"], 48.9)
+        Position.create_many([point("A", 30, latitude=49.0)])
+        self.assertEqual(self.latest("A")["latitude"], 49.0)
+
+    def test_get_all_returns_one_position_per_driver(self):
+        Position.create_many([point("A", 0), point("A", 10), point("B", 0)])
+        positions = LatestPosition.get_all()
+        self.assertEqual(sorted(p["livreur_id"] for p in positions), ["A", "B"])
+        self.assertTrue(all("location" not in p and "sync_seq" not in p for p in positions))
+
+    def test_unique_index_is_created_when_missing(self):
+        mongodb.get_db().drop_collection("latest_positions")
+        Position.create_many([point("A", 0)])
+        Position.create_many([point("A", -10)])
+        unique = [index for index in latest_positions_collection.index_information().values() if index.get("unique")]
+        self.assertEqual([index["key"] for index in unique], [[("livreur_id", 1)]])
+        self.assertEqual(latest_positions_collection.count_documents({}), 1)
+
+    def test_newer_fix_survives_concurrent_creation(self):
+        """Deux lots créent le même livreur : l'upsert perdant (11000) est
+        rejoué sans upsert et sa position, plus récente, est appliquée"""
+        real_bulk_write = latest_positions_collection.bulk_write
+        calls = []
+
+        def racing_bulk_write(requests, ordered=True):
+            calls.append(requests)
+            if len(calls) == 1:
+                # L'autre lot crée le document avec une position plus ancienne
+                latest_positions_collection.insert_one({**point("A", -10, latitude=1.0), "seq": 0})
+                raise BulkWriteError({"writeErrors": [
+                    {"index": 0, "code": DUPLICATE_KEY_ERROR, "errmsg": "E11000 duplicate key"}
+                ]})
+            return real_bulk_write(requests, ordered=ordered)
+
+        with mock.patch("tracking.models.latest_positions_collection") as collection:
+            collection.bulk_write.side_effect = racing_bulk_write
+            LatestPosition.upsert_many([{**point("A", 0, latitude=48.9), "position_id": "p", "seq": 1}])
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(latest_positions_collection.count_documents({}), 1)
+        self.assertEqual(self.latest("A")["latitude"], 48.9)
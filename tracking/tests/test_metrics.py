@@ -0,0 +1,103 @@
+# tracking/tests/test_metrics.py
+from types import SimpleNamespace
+from unittest import mock
+
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase
+from django.urls import resolve
+
+from tracking import metrics, views
+from tracking.broadcast import group_send
+from tracking.middleware import MetricsMiddleware
+from tracking.mongodb import CommandStats
+
+
+class MetricTestCase(SimpleTestCase):
+
+    def metric(self, cls, *args, **kwargs):
+        """Métrique de test, retirée du registre du processus à la fin du test"""
+        metric = cls(*args, **kwargs)
+        self.addCleanup(metrics.REGISTRY.remove, metric)
+        return metric
+
+
+class ExpositionTests(MetricTestCase):
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = self.metric(metrics.Histogram, "test_seconds", "Durée", ("route",), buckets=(0.1, 1))
+        for value in (0.05, 0.5, 0.1, 3):
+            histogram.observe(value, "a")
+        self.assertEqual(histogram.render(), [
+            "# HELP test_seconds Durée",
+            "# TYPE test_seconds histogram",
+            'test_seconds_bucket{route="a",le="0.1"} 2',
+            'test_seconds_bucket{route="a",le="1"} 3',
+            'test_seconds_bucket{route="a",le="+Inf"} 4',
+            'test_seconds_sum{route="a"} 3.65',
+            'test_seconds_count{route="a"} 4',
+        ])
+
+    def test_counter_labels_are_escaped(self):
+        counter = self.metric(metrics.Counter, "test_total", "Total", ("path",))
+        counter.inc('a"b\\c')
+        counter.inc('a"b\\c', amount=2)
+        self.assertEqual(counter.render()[-1], 'test_total{path="a\\"b\\\\c"} 3')
+
+    def test_gauge_callback_is_read_at_exposition(self):
+        values = {("open",): 1}
+        gauge = self.metric(metrics.Gauge, "test_connections", "Connexions", ("state",), callback=lambda: values)
+        values[("open",)] = 4
+        self.assertIn('test_connections{state="open"} 4', metrics.render())
+
+
+class InstrumentationTests(SimpleTestCase):
+
+    def samples(self, metric):
+        return dict(metric.samples())
+
+    def test_middleware_is_removed_when_disabled(self):
+        with mock.patch.object(metrics, "ENABLED", False):
+            with self.assertRaises(MiddlewareNotUsed):
+                MetricsMiddleware(lambda request: HttpResponse())
+
+    def test_middleware_labels_requests_by_route(self):
+        request = RequestFactory().get("/livreurs/A/")
+        request.resolver_match = resolve("/livreurs/A/")
+        route = 'method="GET",route="livreurs/<str:livreur_id>/"'
+        before = self.samples(metrics.http_request_duration).get("{" + route + ',status="200"}')
+        with mock.patch.object(metrics, "ENABLED", True):
+            middleware = MetricsMiddleware(lambda request: HttpResponse(b"ok"))
+        middleware(request)
+        after = self.samples(metrics.http_request_duration)["{" + route + ',status="200"}']
+        self.assertEqual(after[2], (before[2] if before else 0) + 1)
+        self.assertIn(f"tracking_http_response_size_bytes_sum{{{route}}}", metrics.render())
+
+    def test_command_listener_times_commands_per_collection(self):
+        stats = CommandStats()
+        event = SimpleNamespace(connection_id=("localhost", 27017), request_id=1, command_name="find",
+                                command={"find": "positions_test"}, duration_micros=2500)
+        stats.started(event)
+        stats.failed(event)
+        labels = '{collection="positions_test",command="find"}'
+        self.assertEqual(self.samples(metrics.mongo_command_duration)[labels][2], 1)
+        self.assertEqual(self.samples(metrics.mongo_command_failures)[labels], 1)
+        self.assertEqual(stats._collections, {})
+
+    async def test_group_send_is_timed_when_enabled(self):
+        channel_layer = mock.AsyncMock()
+        before = self.samples(metrics.channel_layer_send_duration).get('{operation="group_send"}')
+        with mock.patch.object(metrics, "ENABLED", True):
+            await group_send(channel_layer, "tracking", {"type": "test"})
+        channel_layer.group_send.assert_awaited_once_with("tracking", {"type": "test"})
+        after = self.samples(metrics.channel_layer_send_duration)['{operation="group_send"}']
+        self.assertEqual(after[2], (before[2] if before else 0) + 1)
+
+    def test_metrics_view(self):
+        request = RequestFactory().get("/metrics")
+        with mock.patch.object(metrics, "ENABLED", False):
+            self.assertEqual(views.metrics_view(request).status_code, 404)
+        with mock.patch.object(metrics, "ENABLED", True):
+            response = views.metrics_view(request)
+        self.assertEqual(response["Content-Type"], metrics.CONTENT_TYPE)
+        self.assertIn(b"# TYPE tracking_websocket_connections gauge", response.content)
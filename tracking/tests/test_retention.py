@@ -0,0 +1,56 @@
+# tracking/tests/test_retention.py
+import datetime
+
+from tracking.models import Position
+from tracking.mongodb import (
+    latest_positions_collection, positions_collection, positions_daily_collection, positions_minute_collection,
+)
+from tracking.retention import compact, downsample_per_minute, get_daily_summaries
+from .base import DAY, MongoTestCase, point
+
+OLD_DAY = DAY - datetime.timedelta(days=30)
+NOON = DAY + datetime.timedelta(hours=12)
+
+
+class RetentionTests(MongoTestCase):
+
+    def test_compaction_moves_old_history_to_summaries(self):
+        Position.create_many(
+            [point("A", seconds, latitude=48.85 + seconds * 1e-5, day=OLD_DAY) for seconds in range(0, 300, 10)]
+            + [point("A", 0, day=DAY)]
+        )
+        report = compact(now=NOON)
+        self.assertEqual((report["chunks"], report["positions"], report["complete"]), (1, 30, True))
+        self.assertEqual(positions_collection.count_documents({}), 1)
+        # Une position par minute
+        self.assertEqual(positions_minute_collection.count_documents({"livreur_id": "A"}), 5)
+        summary = positions_daily_collection.find_one({"livreur_id": "A", "jour": OLD_DAY})
+        self.assertEqual(summary["points"], 30)
+        self.assertGreater(summary["distance"], 0)
+        self.assertEqual([s["points"] for s in get_daily_summaries("A")], [30])
+
+        # Une seconde exécution ne refait rien
+        self.assertEqual(compact(now=NOON)["chunks"], 0)
+
+    def test_history_reads_continue_into_minute_tier(self):
+        Position.create_many([point("A", seconds, day=OLD_DAY) for seconds in range(0, 180, 10)] + [point("A", 0)])
+        compact(now=NOON)
+        history = Position.get_livreur_positions("A", limit=10)
+        self.assertEqual(len(history), 4)
+        self.assertEqual(history[0]["timestamp"].date(), DAY.date())
+        timestamps = [p["timestamp"] for p in history]
+        self.assertEqual(timestamps, sorted(timestamps, reverse=True))
+
+    def test_interrupted_compaction_resumes(self):
+        old_days = [DAY - datetime.timedelta(days=days) for days in (30, 29)]
+        Position.create_many([point(livreur_id, 0, day=day) for day in old_days for livreur_id in ("A", "B")])
+        self.assertFalse(compact(now=DAY, max_chunks=3)["complete"])
+        report = compact(now=DAY)
+        self.assertEqual((report["chunks"], report["complete"]), (1, True))
+        self.assertEqual(positions_daily_collection.count_documents({}), 4)
+        self.assertEqual(latest_positions_collection.count_documents({}), 2)
+
+    def test_downsample_keeps_first_position_of_each_minute(self):
+        positions = [point("A", seconds) for seconds in (0, 20, 59, 60, 125)]
+        kept = downsample_per_minute(positions)
+        self.assertEqual([p["timestamp"].second for p in kept], [0, 0, 5])
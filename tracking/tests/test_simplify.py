@@ -0,0 +1,98 @@
+# tracking/tests/test_simplify.py
+import math
+import random
+import unittest
+
+import numpy as np
+from django.test import RequestFactory
+
+from tracking import views
+from tracking.models import Position
+from tracking.simplify import point_importance, project, simplify_positions
+from .base import MongoTestCase, point, read_json
+
+
+def reference_douglas_peucker(x, y, tolerance):
+    """Douglas–Peucker récursif classique, indices des points conservés"""
+    def segment_distance(i, start, end):
+        sx, sy = x[end] - x[start], y[end] - y[start]
+        length = sx * sx + sy * sy
+        t = 0.0 if length == 0 else max(0.0, min(1.0, ((x[i] - x[start]) * sx + (y[i] - y[start]) * sy) / length))
+        return math.hypot(x[i] - (x[start] + t * sx), y[i] - (y[start] + t * sy))
+
+    def simplify(start, end):
+        if end - start < 2:
+            return []
+        distance, split = max((segment_distance(i, start, end), i) for i in range(start + 1, end))
+        if distance <= tolerance:
+            return []
+        return simplify(start, split) + [split] + simplify(split, end)
+
+    return [0] + simplify(0, len(x) - 1) + [len(x) - 1]
+
+
+def random_track(count, seed=1):
+    rng = random.Random(seed)
+    latitude, longitude = 48.85, 2.35
+    positions = []
+    for i in range(count):
+        latitude += rng.uniform(-0.0005, 0.0005)
+        longitude += rng.uniform(-0.0005, 0.0005)
+        positions.append({"livreur_id": "A", "latitude": latitude, "longitude": longitude, "i": i})
+    return positions
+
+
+class SimplifyTests(unittest.TestCase):
+
+    def test_tolerance_matches_recursive_douglas_peucker(self):
+        positions = random_track(500)
+        latitudes = np.array([p["latitude"] for p in positions])
+        longitudes = np.array([p["longitude"] for p in positions])
+        x, y = project(latitudes, longitudes)
+        for tolerance in (1.0, 10.0, 50.0):
+            with self.subTest(tolerance=tolerance):
+                expected = reference_douglas_peucker(list(x), list(y), tolerance)
+                kept = simplify_positions(positions, tolerance=tolerance)
+                self.assertEqual([p["i"] for p in kept], expected)
+
+    def test_max_points_keeps_endpoints_and_order(self):
+        positions = random_track(300)
+        kept = simplify_positions(positions, max_points=20)
+        self.assertEqual(len(kept), 20)
+        indices = [p["i"] for p in kept]
+        self.assertEqual(indices, sorted(indices))
+        self.assertEqual((indices[0], indices[-1]), (0, 299))
+
+    def test_straight_line_collapses_to_endpoints(self):
+        positions = [{"latitude": 48.85 + i * 0.001, "longitude": 2.35} for i in range(50)]
+        self.assertEqual(simplify_positions(positions, tolerance=0.5), [positions[0], positions[-1]])
+
+    def test_closed_loop_keeps_far_point(self):
+        positions = [{"latitude": 48.85, "longitude": 2.35}, {"latitude": 48.86, "longitude": 2.35},
+                     {"latitude": 48.85, "longitude": 2.35}]
+        self.assertEqual(len(simplify_positions(positions, tolerance=10)), 3)
+        self.assertGreater(point_importance([48.85, 48.86, 48.85], [2.35, 2.35, 2.35])[1], 1000)
+
+    def test_short_or_unparameterized_input_is_unchanged(self):
+        positions = random_track(10)
+        self.assertIs(simplify_positions(positions), positions)
+        self.assertEqual(simplify_positions(positions[:2], tolerance=100), positions[:2])
+
+
+class SimplifiedHistoryTests(MongoTestCase):
+
+    def get(self, **params):
+        request = RequestFactory().get("/api/livreurs/A/positions/", params)
+        return views.livreur_positions_view(request, "A")
+
+    def test_history_is_simplified(self):
+        Position.create_many([point("A", i, latitude=48.85 + i * 0.001) for i in range(30)])
+        positions = read_json(self.get(tolerance=5))
+        self.assertEqual(len(positions), 2)
+        self.assertEqual(len(read_json(self.get(max_points=5))), 5)
+        self.assertEqual(len(read_json(self.get())), 30)
+
+    def test_invalid_parameters_return_400(self):
+        for params in ({"tolerance": -1}, {"max_points": 1}, {"tolerance": "x"}):
+            with self.subTest(params=params):
+                self.assertEqual(self.get(**params).status_code, 400)
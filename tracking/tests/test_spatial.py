@@ -0,0 +1,118 @@
+# tracking/tests/test_spatial.py
+import datetime
+import random
+import unittest
+
+from django.test import RequestFactory
+
+from tracking import views
+from tracking.models import LatestPosition, Position
+from tracking.spatial import (
+    GRID_LEVELS, BoundingBox, SpatialIndex, bbox_groups, cell_group, haversine, position_groups,
+)
+from .base import MongoTestCase, point, read_json
+
+
+class GridGroupTests(unittest.TestCase):
+
+    def test_position_is_published_to_one_cell_per_level(self):
+        groups = position_groups(48.85, 2.35)
+        self.assertEqual(len(groups), len(GRID_LEVELS))
+        self.assertLessEqual(len(groups), 2)
+        self.assertEqual(groups[0], cell_group(0, 1221, 58))
+
+    def test_viewport_uses_finest_level_within_limit(self):
+        city = BoundingBox(48.80, 2.25, 48.90, 2.45)
+        groups = bbox_groups(city, max_cells=64)
+        self.assertTrue(all(group.startswith("tracking_cell_0_") for group in groups))
+        self.assertIn(position_groups(48.85, 2.35)[0], groups)
+        region = BoundingBox(47.0, 0.0, 50.0, 4.0)
+        self.assertTrue(all(group.startswith("tracking_cell_1_") for group in bbox_groups(region, 64)))
+
+    def test_oversized_viewport_falls_back_to_full_feed(self):
+        self.assertIsNone(bbox_groups(BoundingBox(-60, -120, 60, 120), max_cells=64))
+
+    def test_antimeridian_viewport_covers_both_sides(self):
+        groups = bbox_groups(BoundingBox(0.4, 179.9, 0.6, -179.9), max_cells=64)
+        self.assertIn(position_groups(0.5, 179.95)[0], groups)
+        self.assertIn(position_groups(0.5, -179.95)[0], groups)
+
+
+class SpatialIndexTests(unittest.TestCase):
+
+    def setUp(self):
+        rng = random.Random(1)
+        self.positions = [
+            {"livreur_id": f"L{i}", "latitude": 48.8 + rng.random() * 0.1, "longitude": 2.3 + rng.random() * 0.1}
+            for i in range(300)
+        ]
+        self.index = SpatialIndex()
+        for position in self.positions:
+            self.index.update(position)
+
+    def brute_force(self, latitude, longitude, radius):
+        distances = [
+            (haversine(latitude, longitude, p["latitude"], p["longitude"]), p["livreur_id"])
+            for p in self.positions
+        ]
+        return sorted(d for d in distances if d[0] <= radius)
+
+    def test_nearby_matches_brute_force(self):
+        for radius, k in ((500, None), (2000, 5), (20000, 10)):
+            with self.subTest(radius=radius, k=k):
+                expected = self.brute_force(48.85, 2.35, radius)[:k]
+                results = self.index.nearby(48.85, 2.35, radius, k)
+                self.assertEqual([p["livreur_id"] for _, p in results], [livreur for _, livreur in expected])
+
+    def test_update_moves_driver_between_cells(self):
+        self.index.update({"livreur_id": "L0", "latitude": 10.0, "longitude": 10.0})
+        self.assertEqual(len(self.index), 300)
+        results = self.index.nearby(10.0, 10.0, 100)
+        self.assertEqual([p["livreur_id"] for _, p in results], ["L0"])
+
+    def test_within_matches_contains(self):
+        bbox = BoundingBox(48.82, 2.32, 48.84, 2.36)
+        expected = sorted(p["livreur_id"] for p in self.positions if bbox.contains(p["latitude"], p["longitude"]))
+        self.assertEqual(sorted(p["livreur_id"] for p in self.index.within(bbox)), expected)
+
+    def test_predicate_excludes_positions(self):
+        results = self.index.nearby(48.85, 2.35, 20000, predicate=lambda p: p["livreur_id"] == "L7")
+        self.assertEqual([p["livreur_id"] for _, p in results], ["L7"])
+
+
+class SpatialQueryTests(MongoTestCase):
+
+    def get(self, view, **params):
+        return view(RequestFactory().get("/", params))
+
+    def test_nearby_returns_closest_drivers_with_distance(self):
+        Position.create_many([point("A", 0), point("B", 0, latitude=48.86), point("C", 0, latitude=45.0)])
+        response = self.get(views.nearby_positions_view, lat=48.85, lng=2.35, radius=5000)
+        self.assertEqual(response.status_code, 200)
+        positions = read_json(response)
+        self.assertEqual([p["livreur_id"] for p in positions], ["A", "B"])
+        self.assertLess(positions[0]["distance"], 1)
+
+    def test_max_age_excludes_stale_drivers(self):
+        now = datetime.datetime.now()
+        Position.create_many([
+            {**point("A", 0), "timestamp": now},
+            {**point("B", 0), "timestamp": now - datetime.timedelta(hours=1)},
+        ])
+        positions = LatestPosition.nearby(48.85, 2.35, 1000, max_age=60)
+        self.assertEqual([p["livreur_id"] for p in positions], ["A"])
+
+    def test_within_view(self):
+        Position.create_many([point("A", 0), point("B", 0, latitude=45.0)])
+        response = self.get(views.within_positions_view, bbox="48.8,2.3,48.9,2.4")
+        self.assertEqual([p["livreur_id"] for p in read_json(response)], ["A"])
+
+    def test_invalid_queries_return_400(self):
+        for view, params in (
+            (views.nearby_positions_view, {"lat": 48.85}),
+            (views.nearby_positions_view, {"lat": 48.85, "lng": 2.35, "radius": 10 ** 9}),
+            (views.within_positions_view, {}),
+            (views.within_positions_view, {"bbox": "1,2,3"}),
+        ):
+            with self.subTest(params=params):
+                self.assertEqual(self.get(view, **params).status_code, 400)
@@ -0,0 +1,70 @@
+# tracking/tests/test_storage.py
+import datetime
+
+from tracking import mongodb
+from tracking.models import Position
+from tracking.mongodb import positions_collection
+from tracking.storage import BucketStorage, DocumentStorage
+from .base import DAY, MongoTestCase, point
+
+
+class DocumentStorageTests(MongoTestCase):
+
+    def test_insert_errors_are_indexed_by_position(self):
+        storage = DocumentStorage()
+        positions_collection.create_index("position_id", unique=True)
+        first = dict(point("A", 0), position_id="p1")
+        errors = storage.insert_many([first, dict(point("A", 1), position_id="p2"), dict(first)])
+        self.assertEqual(list(errors), [2])
+
+
+class BucketStorageTests(MongoTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.storage = BucketStorage(bucket_minutes=10, max_bucket_size=3)
+
+    def insert(self, positions):
+        for position in positions:
+            position["position_id"] = self.storage.new_position_id(position["livreur_id"], position["timestamp"])
+        self.assertEqual(self.storage.insert_many(positions), {})
+        return positions
+
+    def test_overflow_buckets_are_merged_when_paging(self):
+        positions = self.insert([point("A", seconds * 60) for seconds in range(8)])
+        self.assertEqual(mongodb.position_buckets_collection.count_documents({}), 3)
+        seen, after = [], None
+        while True:
+            page = self.storage.find("A", limit=3, after=after)
+            if not page:
+                break
+            seen.extend(page)
+            after = (page[-1]["timestamp"], page[-1]["position_id"])
+        self.assertEqual(
+            [p["position_id"] for p in seen],
+            [p["position_id"] for p in reversed(positions)]
+        )
+
+    def test_same_millisecond_positions_get_distinct_ids(self):
+        positions = self.insert([point("A", 0, latitude=48.85 + i * 1e-3) for i in range(3)])
+        self.assertEqual(len({p["position_id"] for p in positions}), 3)
+        first = self.storage.find("A", limit=1)
+        rest = self.storage.find("A", limit=5, after=(first[0]["timestamp"], first[0]["position_id"]))
+        self.assertEqual(len(first + rest), 3)
+
+    def test_time_range_is_applied_inside_buckets(self):
+        self.insert([point("A", seconds * 60) for seconds in range(8)])
+        start = DAY + datetime.timedelta(hours=10, minutes=2)
+        end = DAY + datetime.timedelta(hours=10, minutes=5)
+        found = self.storage.find("A", start=start, end=end)
+        self.assertEqual(len(found), 4)
+        self.assertTrue(all(start <= p["timestamp"] <= end for p in found))
+
+    def test_bucket_layout_serves_ingest_and_latest(self):
+        with self.settings(TRACKING_POSITION_STORAGE="buckets"):
+            Position.create_many([point("A", 0), point("A", 30, latitude=48.9), point("B", 0)])
+            history = Position.get_livreur_positions("A", limit=10)
+            latest = {p["livreur_id"]: p["latitude"] for p in self.storage.latest_per_driver()}
+        self.assertEqual(positions_collection.count_documents({}), 0)
+        self.assertEqual([p["latitude"] for p in history], [48.9, 48.85])
+        self.assertEqual(latest, {"A": 48.9, "B": 48.85})
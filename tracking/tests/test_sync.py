@@ -0,0 +1,94 @@
+# tracking/tests/test_sync.py
+import datetime
+import json
+from unittest import mock
+
+from django.test import RequestFactory
+from pymongo.errors import ServerSelectionTimeoutError
+
+from tracking import views
+from tracking.models import LatestPosition, Position, begin_sync_write, end_sync_write, sync_watermark
+from tracking.mongodb import counters_collection
+from .base import DAY, MongoTestCase, point
+
+
+class DeltaSyncTests(MongoTestCase):
+
+    def ids(self, positions):
+        return [p["livreur_id"] for p in positions]
+
+    def test_cursor_follows_write_order(self):
+        Position.create_many([point("A", 0)])
+        positions, cursor = LatestPosition.changed_since(0)
+        self.assertEqual(self.ids(positions), ["A"])
+        self.assertNotIn("sync_seq", positions[0])
+        # Numérotée à l'ingestion avant B, mais écrite après
+        late = Position.build("C", 48.85, 2.35, DAY)
+        late["seq"] = 0
+        Position.create_many([point("B", 0)])
+        Position.write_many([late])
+        positions, cursor = LatestPosition.changed_since(cursor)
+        self.assertEqual(self.ids(positions), ["B", "C"])
+        # Un nouvel appel ne renvoie rien de déjà reçu
+        self.assertEqual(LatestPosition.changed_since(cursor), ([], cursor))
+
+    def test_write_in_flight_holds_cursor_back(self):
+        Position.create_many([point("A", 0)])
+        _, cursor = LatestPosition.changed_since(0)
+        # Un autre worker a réservé son numéro mais n'a pas encore écrit
+        first, token = begin_sync_write(1)
+        Position.create_many([point("B", 0)])
+        positions, held = LatestPosition.changed_since(cursor)
+        self.assertEqual((positions, held), ([], cursor))
+        LatestPosition.write_latest({"C": {**point("C", 0), "position_id": "c", "seq": 99}}, first)
+        end_sync_write(token)
+        positions, cursor = LatestPosition.changed_since(held)
+        self.assertEqual(self.ids(positions), ["C", "B"])
+        self.assertEqual(counters_collection.find_one({"_id": "latest_positions"})["inflight"], [])
+
+    def test_stale_write_in_flight_is_ignored(self):
+        Position.create_many([point("A", 0)])
+        begin_sync_write(1)
+        watermark = sync_watermark()
+        counters_collection.update_one(
+            {"_id": "latest_positions"},
+            {"$set": {"inflight.0.at": datetime.datetime.now() - datetime.timedelta(minutes=5)}},
+        )
+        self.assertGreater(sync_watermark(), watermark)
+        self.assertEqual(counters_collection.find_one({"_id": "latest_positions"})["inflight"], [])
+
+    def test_failed_write_is_not_left_in_flight(self):
+        Position.create_many([point("A", 0)])
+        with mock.patch("tracking.models.latest_positions_collection") as collection:
+            collection.bulk_write.side_effect = ServerSelectionTimeoutError("Mongo injoignable")
+            with self.assertRaises(ServerSelectionTimeoutError):
+                LatestPosition.upsert_many([{**point("B", 0), "position_id": "b", "seq": 1}])
+        self.assertEqual(counters_collection.find_one({"_id": "latest_positions"})["inflight"], [])
+        _, cursor = LatestPosition.changed_since(0)
+        self.assertEqual(cursor, sync_watermark())
+
+    def test_since_endpoint_returns_cursor_and_etag(self):
+        Position.create_many([point("A", 0), point("B", 0)])
+        response = views.positions_view(RequestFactory().get("/api/positions/", {"since": 0}))
+        data = json.loads(response.content)
+        self.assertEqual(sorted(self.ids(data["positions"])), ["A", "B"])
+        request = RequestFactory().get(
+            "/api/positions/", {"since": data["cursor"]}, HTTP_IF_NONE_MATCH=response["ETag"]
+        )
+        self.assertEqual(views.positions_view(request).status_code, 200)
+        again = RequestFactory().get("/api/positions/", {"since": data["cursor"]})
+        etag = views.positions_view(again)["ETag"]
+        request = RequestFactory().get("/api/positions/", {"since": data["cursor"]}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(views.positions_view(request).status_code, 304)
+        self.assertEqual(views.positions_view(RequestFactory().get("/api/positions/", {"since": -1})).status_code, 400)
+
+    def test_cache_keeps_newer_positions_across_refreshes(self):
+        Position.create_many([point("A", 0)])
+        self.assertEqual(len(LatestPosition.get_all()), 1)
+        newer = dict(point("A", 60, latitude=48.9), position_id="x", seq=99)
+        LatestPosition.cache.update([newer])
+        LatestPosition.cache._loaded_at = None  # forcer le rafraîchissement
+        Position.create_many([point("B", 0)])
+        latest = {p["livreur_id"]: p for p in LatestPosition.get_all()}
+        self.assertEqual(set(latest), {"A", "B"})
+        self.assertEqual(latest["A"]["latitude"], 48.9)
@@ -0,0 +1,87 @@
+# tracking/tests/test_trips.py
+import datetime
+import unittest
+
+from django.test import RequestFactory
+
+from tracking import views
+from tracking.models import Position
+from tracking.mongodb import trip_stats_collection
+from tracking.retention import summarize_track
+from tracking.trips import accumulate
+from .base import DAY, MongoTestCase, point, read_json
+
+
+class TripStatsTests(unittest.TestCase):
+
+    def test_segments_are_accumulated_per_driver_and_day(self):
+        positions = [point("A", 0), point("A", 10, latitude=48.851), point("A", 20, latitude=48.852)]
+        totals = accumulate(positions, {})
+        total = totals[("A", DAY)]
+        self.assertEqual(total["points"], 3)
+        self.assertAlmostEqual(total["distance"], 222.4, places=0)
+        self.assertEqual(total["duree_active"], 20.0)
+        self.assertAlmostEqual(total["vitesse_max"], 11.1, places=1)
+
+    def test_previous_position_starts_the_first_segment(self):
+        totals = accumulate([point("A", 10, latitude=48.851)], {"A": point("A", 0)})
+        self.assertEqual(totals[("A", DAY)]["duree_active"], 10.0)
+
+    def test_previous_day_does_not_start_a_segment(self):
+        previous = point("A", 0, day=DAY - datetime.timedelta(days=1))
+        total = accumulate([point("A", 0, latitude=48.851)], {"A": previous})[("A", DAY)]
+        self.assertEqual((total["points"], total["distance"]), (1, 0.0))
+
+    def test_sub_second_fix_is_merged_and_jump_is_ignored(self):
+        positions = [
+            point("A", 0),
+            point("A", 0.005, latitude=48.851),   # 5 ms plus tard : fusionnée
+            point("A", 10, latitude=48.8505),
+            point("A", 20, latitude=49.5),        # saut GPS de 72 km
+            point("A", 30, latitude=49.5005),
+        ]
+        total = accumulate(positions, {})[("A", DAY)]
+        self.assertEqual(total["points"], 5)
+        self.assertAlmostEqual(total["distance"], 111.2, places=0)
+        self.assertLess(total["vitesse_max"], 10)
+        # Mêmes règles que le résumé journalier du compactage
+        summary = summarize_track(positions)
+        self.assertAlmostEqual(summary["distance"], total["distance"])
+        self.assertEqual(summary["vitesse_max"], total["vitesse_max"])
+
+    def test_late_fix_counts_as_point_only(self):
+        total = accumulate([point("A", 0, latitude=48.9)], {"A": point("A", 60)})[("A", DAY)]
+        self.assertEqual((total["points"], total["distance"]), (1, 0.0))
+
+
+class TripStatsIngestTests(MongoTestCase):
+
+    def get(self, params):
+        request = RequestFactory().get("/livreurs/A/stats/", params)
+        return views.livreur_trip_stats_view(request, "A")
+
+    def test_trip_stats_are_recorded_at_ingest(self):
+        Position.create_many([point("A", 0), point("A", 10, latitude=48.851)])
+        Position.create_many([point("A", 20, latitude=48.852)])
+        stats = Position.get_trip_stats("A", DAY)
+        self.assertEqual(stats["points"], 3)
+        self.assertAlmostEqual(stats["distance"], 222.4, places=0)
+        self.assertAlmostEqual(stats["vitesse_moyenne"], stats["distance"] / 20)
+        self.assertEqual(trip_stats_collection.count_documents({}), 1)
+
+    def test_unknown_day_is_empty(self):
+        stats = Position.get_trip_stats("A", DAY)
+        self.assertEqual((stats["points"], stats["vitesse_moyenne"]), (0, 0.0))
+
+    def test_view_returns_day_and_range(self):
+        Position.create_many([point("A", 0), point("A", 10, latitude=48.851)])
+        Position.create_many([point("A", 0, day=DAY + datetime.timedelta(days=1))])
+        data = read_json(self.get({"date": DAY.isoformat()}))
+        self.assertEqual(data["points"], 2)
+        response = self.get({"from": DAY.isoformat(), "to": (DAY + datetime.timedelta(days=2)).isoformat()})
+        self.assertEqual([stats["points"] for stats in read_json(response)], [1, 2])
+
+    def test_invalid_range_returns_400(self):
+        response = self.get({"from": DAY.isoformat(), "to": (DAY - datetime.timedelta(days=1)).isoformat()})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("error", read_json(response))
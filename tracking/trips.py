@@ -0,0 +1,124 @@
+# tracking/trips.py
+"""Statistiques de trajet par livreur et par jour, tenues à jour à l'ingestion.
+
+Chaque position écrite est comparée à la précédente du même livreur (sa
+dernière position connue, puis les positions du lot dans l'ordre des dates)
+avec les règles des résumés journaliers du compactage (`track_segment`,
+tracking/retention.py) : seuls les couples d'une même journée comptent, et
+une position plus ancienne que la précédente ne compte que comme point. Les
+totaux (`trip_stats`, un document par livreur et par jour) sont incrémentés
+avec un seul bulk_write par lot ; une journée se lit donc en un accès, et
+correspond au résumé que produira son compactage.
+
+Un point fusionné avec le précédent (segment trop court) reste en revanche
+la position précédente du lot suivant, la seule que garde latest_positions.
+
+Les positions d'un même livreur sont supposées arriver en séquence : deux
+lots concurrents du même livreur peuvent fausser le segment qui les relie.
+"""
+from pymongo import UpdateOne
+from .mongodb import latest_positions_collection, positions_daily_collection, trip_stats_collection
+from .retention import start_of_day, track_segment
+
+STATS_FIELDS = ("points", "distance", "duree_active", "duree_inactive", "vitesse_max", "premier", "dernier")
+
+
+def trip_stats_id(livreur_id, day):
+    return f"{livreur_id}:{day.date().isoformat()}"
+
+
+def accumulate(positions, previous_by_driver):
+    """Totaux à ajouter par (livreur, jour) pour un lot de positions"""
+    totals = {}
+    by_driver = {}
+    for position in positions:
+        by_driver.setdefault(position["livreur_id"], []).append(position)
+
+    for livreur_id, driver_positions in by_driver.items():
+        previous = previous_by_driver.get(livreur_id)
+        for position in sorted(driver_positions, key=lambda p: p["timestamp"]):
+            day = start_of_day(position["timestamp"])
+            total = totals.get((livreur_id, day))
+            if total is None:
+                total = totals[(livreur_id, day)] = {
+                    "points": 0, "distance": 0.0, "duree_active": 0.0, "duree_inactive": 0.0,
+                    "vitesse_max": 0.0, "premier": position["timestamp"], "dernier": position["timestamp"],
+                }
+            total["points"] += 1
+            total["dernier"] = position["timestamp"]
+            if previous is not None and previous["timestamp"] > position["timestamp"]:
+                # Position en retard : le trajet a déjà été compté sans elle
+                continue
+            if previous is not None and start_of_day(previous["timestamp"]) == day:
+                segment = track_segment(previous, position)
+                if segment is None:
+                    # Trop proche de la précédente, qui reste le point de départ
+                    continue
+                step, active, idle, speed = segment
+                total["distance"] += step
+                total["duree_active"] += active
+                total["duree_inactive"] += idle
+                if speed is not None:
+                    total["vitesse_max"] = max(total["vitesse_max"], speed)
+            previous = position
+    return totals
+
+
+def record(positions):
+    """Met à jour les statistiques avec un lot de positions écrites, avant la
+    mise à jour de latest_positions (qui fournit la position précédente)"""
+    if not positions:
+        return
+    livreur_ids = list({position["livreur_id"] for position in positions})
+    previous_by_driver = {
+        doc["livreur_id"]: doc
+        for doc in latest_positions_collection.find(
+            {"livreur_id": {"$in": livreur_ids}},
+            {"_id": 0, "livreur_id": 1, "latitude": 1, "longitude": 1, "timestamp": 1}
+        )
+    }
+    requests = [
+        UpdateOne(
+            {"_id": trip_stats_id(livreur_id, day)},
+            {
+                "$setOnInsert": {"livreur_id": livreur_id, "jour": day},
+                "$inc": {field: total[field] for field in ("points", "distance", "duree_active", "duree_inactive")},
+                "$max": {"vitesse_max": total["vitesse_max"], "dernier": total["dernier"]},
+                "$min": {"premier": total["premier"]},
+            },
+            upsert=True
+        )
+        for (livreur_id, day), total in accumulate(positions, previous_by_driver).items()
+    ]
+    trip_stats_collection.bulk_write(requests, ordered=False)
+
+
+def with_average_speed(stats):
+    """Ajoute la vitesse moyenne en mouvement (m/s)"""
+    active = stats.get("duree_active") or 0
+    stats["vitesse_moyenne"] = stats["distance"] / active if active else 0.0
+    return stats
+
+
+def get_trip_stats(livreur_id, day):
+    """Statistiques d'une journée (un accès par _id) ; à défaut, le résumé
+    journalier du compactage, puis une journée vide"""
+    day = start_of_day(day)
+    stats = trip_stats_collection.find_one({"_id": trip_stats_id(livreur_id, day)}, {"_id": 0})
+    if stats is None:
+        stats = positions_daily_collection.find_one({"livreur_id": livreur_id, "jour": day}, {"_id": 0, "zone": 0})
+    if stats is None:
+        stats = {"livreur_id": livreur_id, "jour": day, "points": 0, "distance": 0.0,
+                 "duree_active": 0.0, "duree_inactive": 0.0, "vitesse_max": 0.0,
+                 "premier": None, "dernier": None}
+    return with_average_speed(stats)
+
+
+def get_trip_stats_range(livreur_id, start, end):
+    """Statistiques des journées de `start` à `end` incluses, de la plus
+    récente à la plus ancienne ; les journées antérieures aux statistiques
+    d'ingestion sont complétées par les résumés du compactage"""
+    query = {"livreur_id": livreur_id, "jour": {"$gte": start_of_day(start), "$lte": end}}
+    days = {stats["jour"]: stats for stats in positions_daily_collection.find(query, {"_id": 0, "zone": 0})}
+    days.update({stats["jour"]: stats for stats in trip_stats_collection.find(query, {"_id": 0})})
+    return [with_average_speed(days[day]) for day in sorted(days, reverse=True)]
@@ -1,10 +1,22 @@
 # tracking/urls.py
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import views, async_views
+
+# Vues asynchrones (ASGI) par défaut ; TRACKING_ASYNC_VIEWS = False rétablit les vues synchrones
+api_views = async_views if getattr(settings, 'TRACKING_ASYNC_VIEWS', True) else views
 
 urlpatterns = [
-    path('livreurs/', views.livreurs_view, name='livreurs'),
-    path('livreurs/<str:livreur_id>/', views.livreur_detail_view, name='livreur_detail'),
-    path('positions/', views.positions_view, name='positions'),
-    path('livreurs/<str:livreur_id>/positions/', views.livreur_positions_view, name='livreur_positions'),
+    path('livreurs/', api_views.livreurs_view, name='livreurs'),
+    path('livreurs/<str:livreur_id>/', api_views.livreur_detail_view, name='livreur_detail'),
+    path('positions/', api_views.positions_view, name='positions'),
+    path('positions/nearby/', api_views.nearby_positions_view, name='positions_nearby'),
+    path('positions/within/', api_views.within_positions_view, name='positions_within'),
+    path('livreurs/<str:livreur_id>/positions/', api_views.livreur_positions_view, name='livreur_positions'),
+    path('livreurs/<str:livreur_id>/summaries/', api_views.livreur_summaries_view, name='livreur_summaries'),
+    path('livreurs/<str:livreur_id>/stats/', api_views.livreur_trip_stats_view, name='livreur_trip_stats'),
+    path('ingest/buffer/', api_views.write_buffer_stats_view, name='write_buffer_stats'),
+    path('health/live/', api_views.health_live_view, name='health_live'),
+    path('health/ready/', api_views.health_ready_view, name='health_ready'),
+    path('cache/livreurs/', api_views.driver_cache_stats_view, name='driver_cache_stats'),
 ]
\ No newline at end of file
@@ -1,36 +1,32 @@
 # tracking/views.py
-from django.http import JsonResponse
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse
+from django.utils.cache import get_conditional_response
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
+import base64
 import json
-from .models import Livreur, Position
-from channels.layers import get_channel_layer
+from .models import Livreur, Position, LatestPosition, get_write_buffer, get_driver_cache
+from . import invalidation, metrics, mongodb
+from .buffer import WriteBufferFull
+from .broadcast import publish_position, publish_positions
+from .spatial import BoundingBox
+from .simplify import simplify_positions
+from .encoding import mongo_json_response, streaming_json_response
 from asgiref.sync import async_to_sync
-from bson import ObjectId
-from datetime import datetime
-
-# Classe pour encoder les types MongoDB en JSON
-class MongoJSONEncoder(json.JSONEncoder):
-    def default(self, obj):
-        if isinstance(obj, ObjectId):
-            return str(obj)
-        if isinstance(obj, datetime):
-            return obj.isoformat()
-        return super().default(obj)
-
-# Fonction helper pour renvoyer des réponses JSON
-def mongo_json_response(data, **kwargs):
-    return JsonResponse(
-        json.loads(json.dumps(data, cls=MongoJSONEncoder)),
-        **kwargs
-    )
+from datetime import datetime, timedelta
+
+# Étendue maximale d'une plage de statistiques de trajet
+MAX_TRIP_STATS_RANGE = timedelta(days=366)
+
+# Types de contenu acceptés pour l'envoi de positions au format NDJSON
+NDJSON_CONTENT_TYPES = ("application/x-ndjson", "application/jsonl", "application/ndjson")
 
 @csrf_exempt
 @require_http_methods(["GET", "POST"])
 def livreurs_view(request):
     if request.method == "GET":
-        livreurs = Livreur.get_all()
-        return mongo_json_response(livreurs, safe=False)
+        return streaming_json_response(request, Livreur.iter_all())
     
     elif request.method == "POST":
         data = json.loads(request.body)
@@ -38,7 +34,8 @@ def livreurs_view(request):
             data.get('livreur_id'),
             data.get('nom'),
             data.get('telephone'),
-            data.get('actif', True)
+            data.get('actif', True),
+            data.get('flotte')
         )
         return mongo_json_response(livreur, safe=False)
 
@@ -56,41 +53,450 @@ def livreur_detail_view(request, livreur_id):
         livreur = Livreur.update(livreur_id, data)
         return mongo_json_response(livreur, safe=False)
 
+def parse_positions_payload(request):
+    """Décode le corps d'un POST de positions.
+
+    Retourne (points, lot) : un objet JSON unique donne lot=False, un tableau
+    JSON ou un corps NDJSON donne la liste des points et lot=True. Une ligne
+    NDJSON invalide est conservée sous forme d'exception pour être signalée
+    dans le statut du point correspondant.
+    """
+    if request.content_type in NDJSON_CONTENT_TYPES:
+        points = []
+        for line in request.body.splitlines():
+            if not line.strip():
+                continue
+            try:
+                points.append(json.loads(line))
+            except ValueError as e:
+                points.append(e)
+        return points, True
+
+    data = json.loads(request.body)
+    if isinstance(data, list):
+        return data, True
+    return data, False
+
+def parse_timestamp(value):
+    """Décode un horodatage ISO 8601 ; lève ValueError s'il est invalide"""
+    try:
+        timestamp = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise ValueError("Horodatage ISO 8601 invalide")
+    # Les horodatages sont stockés en heure locale naïve, comme datetime.now()
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone().replace(tzinfo=None)
+    return timestamp
+
+def check_timestamp_skew(timestamp):
+    """Refuse un horodatage trop éloigné de l'heure du serveur : un point daté
+    dans le futur bloquerait la mise à jour de la dernière position du livreur
+    (et ses statistiques de trajet) jusqu'à ce que l'horloge le rattrape"""
+    now = datetime.now()
+    max_future = getattr(settings, 'TRACKING_MAX_FUTURE_SKEW', 60)
+    max_age = getattr(settings, 'TRACKING_MAX_TIMESTAMP_AGE', 24 * 3600)
+    if max_future is not None and timestamp > now + timedelta(seconds=max_future):
+        raise ValueError("Horodatage dans le futur")
+    if max_age is not None and timestamp < now - timedelta(seconds=max_age):
+        raise ValueError("Horodatage trop ancien")
+    return timestamp
+
+def validate_position_point(point):
+    """Valide un point reçu et le normalise pour Position.create_many"""
+    if isinstance(point, Exception):
+        raise ValueError(f"JSON invalide: {point}")
+    if not isinstance(point, dict):
+        raise ValueError("Chaque position doit être un objet JSON")
+
+    livreur_id = point.get('livreur') or point.get('livreur_id')
+    if not livreur_id:
+        raise ValueError("Champ 'livreur' manquant")
+
+    try:
+        latitude = float(point.get('latitude'))
+        longitude = float(point.get('longitude'))
+    except (TypeError, ValueError):
+        raise ValueError("Latitude et longitude doivent être numériques")
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        raise ValueError("Coordonnées hors limites")
+
+    timestamp = point.get('timestamp')
+    if timestamp is not None:
+        timestamp = check_timestamp_skew(parse_timestamp(timestamp))
+
+    return {
+        "livreur_id": livreur_id,
+        "latitude": latitude,
+        "longitude": longitude,
+        "timestamp": timestamp,
+    }
+
+def check_batch_size(points):
+    """Retourne une réponse 413 si le lot dépasse TRACKING_MAX_BATCH_SIZE, sinon None"""
+    max_batch_size = getattr(settings, 'TRACKING_MAX_BATCH_SIZE', 1000)
+    if len(points) > max_batch_size:
+        return JsonResponse(
+            {"error": f"Lot trop volumineux (maximum {max_batch_size} positions)"},
+            status=413
+        )
+    return None
+
+def validate_positions_batch(points):
+    """Valide chaque point d'un lot.
+
+    Retourne (résultats, points valides, index des points valides dans le lot) ;
+    les résultats des points invalides sont déjà renseignés.
+    """
+    results = [None] * len(points)
+    valid_points = []
+    valid_indexes = []
+    for index, point in enumerate(points):
+        try:
+            valid_points.append(validate_position_point(point))
+            valid_indexes.append(index)
+        except ValueError as e:
+            results[index] = {"index": index, "status": "error", "error": str(e)}
+    return results, valid_points, valid_indexes
+
+def complete_positions_batch(results, valid_indexes, positions, errors):
+    """Complète les statuts après insertion ; retourne (positions acceptées, réponse)"""
+    accepted = []
+    for batch_index, (index, position) in enumerate(zip(valid_indexes, positions)):
+        if batch_index in errors:
+            results[index] = {"index": index, "status": "error", "error": errors[batch_index]}
+        else:
+            results[index] = {"index": index, "status": "ok", "position_id": position["position_id"]}
+            accepted.append(position)
+
+    rejected = len(results) - len(accepted)
+    response = mongo_json_response(
+        {"accepted": len(accepted), "rejected": rejected, "results": results},
+        status=207 if rejected else 200
+    )
+    return accepted, response
+
+def positions_batch_response(points):
+    """Valide, insère et diffuse un lot de positions.
+
+    Les points valides sont écrits avec un seul insert_many et diffusés en un
+    seul message WebSocket ; la réponse contient un statut par point.
+    """
+    too_large = check_batch_size(points)
+    if too_large:
+        return too_large
+
+    results, valid_points, valid_indexes = validate_positions_batch(points)
+    positions, errors = Position.create_many(valid_points)
+    accepted, response = complete_positions_batch(results, valid_indexes, positions, errors)
+
+    # Notifier via WebSocket : un seul message par groupe pour tout le lot
+    if accepted:
+        fleets = Livreur.get_fleets({p["livreur_id"] for p in accepted})
+        async_to_sync(publish_positions)(accepted, fleets)
+    return response
+
+def parse_since(value):
+    """Curseur de synchronisation : numéro de séquence (vide ou 0 : tout)"""
+    try:
+        since = int(value or 0)
+    except ValueError:
+        raise ValueError("Paramètre 'since' : curseur numérique attendu")
+    if since < 0:
+        raise ValueError("Paramètre 'since' : curseur positif attendu")
+    return since
+
+def positions_etag(positions, cursor=None):
+    """ETag d'une liste de dernières positions : toute mise à jour reçoit un
+    numéro de séquence supérieur aux précédents"""
+    max_seq = max((p.get("seq") or 0 for p in positions), default=0)
+    prefix = f"{cursor}-" if cursor is not None else ""
+    return f'"{prefix}{max_seq}-{len(positions)}"'
+
+def etag_response(request, etag, make_response):
+    """Réponse 304 si le client a déjà cette version (If-None-Match), sinon
+    la réponse construite par `make_response` ; l'ETag est ajouté dans les deux cas"""
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = make_response()
+    response['ETag'] = etag
+    return response
+
+def latest_positions_response(request, positions, wrap=None):
+    return etag_response(
+        request, positions_etag(positions),
+        lambda: streaming_json_response(request, positions, wrap)
+    )
+
+def changed_positions_response(request, positions, cursor):
+    """Positions modifiées depuis le curseur reçu et curseur de l'appel suivant"""
+    return etag_response(
+        request, positions_etag(positions, cursor),
+        lambda: mongo_json_response({"positions": positions, "cursor": cursor})
+    )
+
 @csrf_exempt
 @require_http_methods(["GET", "POST"])
 def positions_view(request):
     if request.method == "GET":
+        if 'since' in request.GET:
+            try:
+                since = parse_since(request.GET['since'])
+            except ValueError as e:
+                return JsonResponse({"error": str(e)}, status=400)
+            positions, cursor = Position.get_changed_positions(since)
+            return changed_positions_response(request, positions, cursor)
         if request.GET.get('latest') == 'true':
-            positions = Position.get_latest_positions()
-        else:
-            positions = []
-        return mongo_json_response(positions, safe=False)
+            return latest_positions_response(request, Position.get_latest_positions())
+        return streaming_json_response(request, [])
     
     elif request.method == "POST":
-        data = json.loads(request.body)
-        position = Position.create(
-            data.get('livreur'),
-            data.get('latitude'),
-            data.get('longitude')
-        )
+        try:
+            data, is_batch = parse_positions_payload(request)
+        except ValueError:
+            return JsonResponse({"error": "Corps JSON invalide"}, status=400)
+        if is_batch:
+            return positions_batch_response(data)
+
+        try:
+            point = validate_position_point(data)
+        except ValueError as e:
+            return JsonResponse({"error": str(e)}, status=400)
+        try:
+            position = Position.create(
+                point['livreur_id'],
+                point['latitude'],
+                point['longitude'],
+                point['timestamp']
+            )
+        except WriteBufferFull as e:
+            return JsonResponse({"error": str(e)}, status=503)
         
         # Notifier via WebSocket
-        channel_layer = get_channel_layer()
-        async_to_sync(channel_layer.group_send)(
-            "tracking_updates",
-            {
-                "type": "position_update",
-                "livreur_id": position["livreur_id"],
-                "latitude": position["latitude"],
-                "longitude": position["longitude"],
-                "timestamp": position["timestamp"].isoformat(),
-            }
-        )
+        fleets = Livreur.get_fleets([position["livreur_id"]])
+        async_to_sync(publish_position)(position, fleets)
         
         return mongo_json_response(position, safe=False)
 
+def parse_max_age(params):
+    max_age = params.get('max_age')
+    if max_age is None:
+        return None
+    try:
+        max_age = float(max_age)
+    except ValueError:
+        raise ValueError("Paramètre 'max_age' invalide")
+    if max_age <= 0:
+        raise ValueError("Paramètre 'max_age' invalide")
+    return max_age
+
+def parse_nearby_query(params):
+    """Paramètres de GET /api/positions/nearby/ ; lève ValueError s'ils sont invalides"""
+    try:
+        latitude = float(params['lat'])
+        longitude = float(params['lng'])
+    except (KeyError, ValueError):
+        raise ValueError("Paramètres 'lat' et 'lng' numériques requis")
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        raise ValueError("Coordonnées hors limites")
+
+    max_radius = getattr(settings, 'TRACKING_NEARBY_MAX_RADIUS', 50000)
+    max_k = getattr(settings, 'TRACKING_NEARBY_MAX_RESULTS', 1000)
+    try:
+        radius = float(params.get('radius', 2000))
+        k = int(params.get('k', 10))
+    except ValueError:
+        raise ValueError("Paramètres 'radius' et 'k' numériques attendus")
+    if not (0 < radius <= max_radius):
+        raise ValueError(f"Le rayon doit être compris entre 0 et {max_radius} mètres")
+    if not (0 < k <= max_k):
+        raise ValueError(f"'k' doit être compris entre 1 et {max_k}")
+
+    return {
+        "latitude": latitude,
+        "longitude": longitude,
+        "radius": radius,
+        "k": k,
+        "max_age": parse_max_age(params),
+    }
+
+def parse_within_query(params):
+    """Paramètres de GET /api/positions/within/ ; lève ValueError s'ils sont invalides"""
+    if 'bbox' not in params:
+        raise ValueError("Paramètre 'bbox=sud,ouest,nord,est' requis")
+    return {"bbox": BoundingBox.parse(params['bbox']), "max_age": parse_max_age(params)}
+
+@require_http_methods(["GET"])
+def nearby_positions_view(request):
+    try:
+        query = parse_nearby_query(request.GET)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    positions = LatestPosition.nearby(**query)
+    return mongo_json_response(positions, safe=False)
+
+@require_http_methods(["GET"])
+def within_positions_view(request):
+    try:
+        query = parse_within_query(request.GET)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    positions = LatestPosition.within(**query)
+    return mongo_json_response(positions, safe=False)
+
+def parse_simplify_query(params):
+    """Paramètres de simplification de l'historique (`tolerance` en mètres,
+    `max_points`) ; lève ValueError s'ils sont invalides"""
+    try:
+        tolerance = float(params['tolerance']) if 'tolerance' in params else None
+        max_points = int(params['max_points']) if 'max_points' in params else None
+    except ValueError:
+        raise ValueError("Paramètres 'tolerance' et 'max_points' numériques attendus")
+    if tolerance is not None and tolerance < 0:
+        raise ValueError("'tolerance' doit être positive")
+    if max_points is not None and max_points < 2:
+        raise ValueError("'max_points' doit valoir au moins 2")
+    return {"tolerance": tolerance, "max_points": max_points}
+
+def history_limit(simplify):
+    # Un tracé simplifié couvre toute la tournée : on lit bien plus de points bruts
+    if simplify["tolerance"] is None and simplify["max_points"] is None:
+        return 100
+    return getattr(settings, 'TRACKING_HISTORY_MAX_RAW_POINTS', 20000)
+
+def encode_cursor(position):
+    """Curseur opaque désignant la dernière position d'une page"""
+    key = json.dumps([position["timestamp"].isoformat(), position["position_id"]])
+    return base64.urlsafe_b64encode(key.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor):
+    try:
+        timestamp, position_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return datetime.fromisoformat(timestamp), str(position_id)
+    except (TypeError, ValueError):
+        raise ValueError("Curseur invalide")
+
+def parse_history_query(params):
+    """Paramètres de l'historique d'un livreur : `from`/`to` (ISO 8601),
+    `limit` (taille de page), `cursor` et paramètres de simplification.
+    Retourne (critères pour get_livreur_positions, simplification)."""
+    simplify = parse_simplify_query(params)
+    default_limit = history_limit(simplify)
+    max_limit = max(default_limit, getattr(settings, 'TRACKING_HISTORY_MAX_PAGE_SIZE', 1000))
+    try:
+        limit = int(params.get('limit', default_limit))
+    except ValueError:
+        raise ValueError("Paramètre 'limit' numérique attendu")
+    if not (0 < limit <= max_limit):
+        raise ValueError(f"'limit' doit être compris entre 1 et {max_limit}")
+
+    return {
+        "limit": limit,
+        "start": parse_timestamp(params['from']) if 'from' in params else None,
+        "end": parse_timestamp(params['to']) if 'to' in params else None,
+        "after": decode_cursor(params['cursor']) if 'cursor' in params else None,
+    }, simplify
+
+def history_response(request, positions, limit, simplify, wrap=None):
+    """Réponse paginée : la page (éventuellement simplifiée) diffusée dans le
+    corps, le curseur de la page suivante dans les en-têtes X-Next-Cursor et Link"""
+    # Une position de plus que la page a été lue pour savoir s'il en reste
+    has_next = len(positions) > limit
+    positions = positions[:limit]
+    next_cursor = encode_cursor(positions[-1]) if has_next else None
+
+    response = streaming_json_response(request, simplify_positions(positions, **simplify), wrap)
+    if next_cursor:
+        params = request.GET.copy()
+        params['cursor'] = next_cursor
+        response['X-Next-Cursor'] = next_cursor
+        response['Link'] = f'<{request.build_absolute_uri(request.path)}?{params.urlencode()}>; rel="next"'
+    return response
+
 @csrf_exempt
 @require_http_methods(["GET"])
 def livreur_positions_view(request, livreur_id):
-    positions = Position.get_livreur_positions(livreur_id)
-    return mongo_json_response(positions, safe=False)
\ No newline at end of file
+    try:
+        query, simplify = parse_history_query(request.GET)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    positions = Position.get_livreur_positions(livreur_id, **{**query, "limit": query["limit"] + 1})
+    return history_response(request, positions, query["limit"], simplify)
+
+def parse_summaries_query(params):
+    """Bornes `from`/`to` (ISO 8601) des résumés journaliers"""
+    return {
+        "start": parse_timestamp(params['from']) if 'from' in params else None,
+        "end": parse_timestamp(params['to']) if 'to' in params else None,
+    }
+
+@csrf_exempt
+@require_http_methods(["GET"])
+def livreur_summaries_view(request, livreur_id):
+    try:
+        query = parse_summaries_query(request.GET)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    return mongo_json_response(Position.get_daily_summaries(livreur_id, **query), safe=False)
+
+def parse_trip_stats_query(params):
+    """Journée `date` (aujourd'hui par défaut), ou plage `from`/`to` (ISO 8601)"""
+    if 'from' not in params:
+        return {"day": parse_timestamp(params['date']) if 'date' in params else datetime.now()}
+    start = parse_timestamp(params['from'])
+    end = parse_timestamp(params['to']) if 'to' in params else datetime.now()
+    if end < start:
+        raise ValueError("'to' doit être postérieur à 'from'")
+    if end - start > MAX_TRIP_STATS_RANGE:
+        raise ValueError(f"Plage limitée à {MAX_TRIP_STATS_RANGE.days} jours")
+    return {"start": start, "end": end}
+
+@csrf_exempt
+@require_http_methods(["GET"])
+def livreur_trip_stats_view(request, livreur_id):
+    try:
+        query = parse_trip_stats_query(request.GET)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    if "day" in query:
+        return mongo_json_response(Position.get_trip_stats(livreur_id, query["day"]))
+    return mongo_json_response(Position.get_trip_stats_range(livreur_id, query["start"], query["end"]), safe=False)
+
+@require_http_methods(["GET"])
+def write_buffer_stats_view(request):
+    write_buffer = get_write_buffer()
+    if write_buffer is None:
+        return JsonResponse({"enabled": False})
+    return JsonResponse({"enabled": True, **write_buffer.stats()})
+
+@require_http_methods(["GET"])
+def driver_cache_stats_view(request):
+    return JsonResponse({
+        **get_driver_cache().stats(),
+        "remote_invalidations": invalidation.remote_invalidations,
+    })
+
+@require_http_methods(["GET"])
+def metrics_view(request):
+    """Métriques du processus au format Prometheus ; 404 si elles sont désactivées"""
+    if not metrics.ENABLED:
+        return HttpResponse(status=404)
+    return HttpResponse(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+@require_http_methods(["GET"])
+def health_live_view(request):
+    """Le processus répond ; aucun accès à Mongo"""
+    return JsonResponse({"status": "ok", "pool": mongodb.pool_stats.snapshot()})
+
+def readiness_response(latency=None, error=None):
+    """Réponse de disponibilité : 200 si le ping Mongo a réussi, 503 sinon"""
+    pool = mongodb.pool_stats.snapshot()
+    if error is not None:
+        return JsonResponse({"status": "unavailable", "error": str(error), "pool": pool}, status=503)
+    return JsonResponse({"status": "ok", "mongo_latency_ms": latency, "pool": pool})
+
+@require_http_methods(["GET"])
+def health_ready_view(request):
+    try:
+        return readiness_response(latency=mongodb.ping())
+    except Exception as e:
+        return readiness_response(error=e)